@@ -0,0 +1,155 @@
+"""
+Prueba de carga de las rutas de IA sin red
+
+Lanza peticiones concurrentes a una ruta de /api/ai con el cliente de pruebas
+de Flask y muestra latencias (p50/p95/p99), códigos de respuesta y el estado
+del planificador de cuota. Las respuestas salen del Gemini local
+(AI_FAKE_GEMINI) o, con --cassette, de respuestas reales grabadas.
+
+Uso:
+    python benchmarks/bench_ai_routes.py [--route analyze-full] [--requests 100]
+        [--concurrency 10] [--latency 1.5] [--rate-limit 0.05] [--errors 0.02]
+        [--truncation 0.05] [--rpm 60] [--cache]
+    python benchmarks/bench_ai_routes.py --cassette data/ai_cassette.jsonl [--replay-latency]
+
+Con --rpm 0 se desactiva el planificador de cuota. Con --cassette cada tarea
+reutiliza en orden circular las respuestas grabadas para ella.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Añadir el directorio raíz al path para imports
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+SAMPLE_JOKES = [
+    "Mi madre me llama cada domingo para preguntarme si he comido. "
+    "Tengo 38 años y una hipoteca, mamá.",
+    "He empezado a correr por las mañanas. Bueno, a correr detrás del autobús.",
+    "Mi jefe dice que su puerta siempre está abierta. Porque se llevó el pomo a casa.",
+    "En mi gimnasio hay una máquina de snacks. Es la que más uso.",
+]
+
+ROUTES = {
+    'analyze': lambda i: {'joke_text': SAMPLE_JOKES[i % len(SAMPLE_JOKES)] + f" ({i})"},
+    'analyze-full': lambda i: {'joke_text': SAMPLE_JOKES[i % len(SAMPLE_JOKES)] + f" ({i})"},
+    'tags': lambda i: {'joke_text': SAMPLE_JOKES[i % len(SAMPLE_JOKES)] + f" ({i})"},
+    'brainstorm': lambda i: {'topic': f"tema {i}", 'num_ideas': 5},
+    'variations': lambda i: {'joke_text': SAMPLE_JOKES[i % len(SAMPLE_JOKES)] + f" ({i})"},
+}
+
+
+def configure_env(args):
+    """Variables de entorno del Gemini local; deben fijarse antes de importar la app"""
+    state_dir = tempfile.mkdtemp(prefix='bench_ai_')
+    os.environ.update({
+        'AI_FAKE_GEMINI': 'True',
+        'AI_FAKE_LATENCY': args.distribution,
+        'AI_FAKE_LATENCY_MEAN': str(args.latency),
+        'AI_FAKE_LATENCY_STDDEV': str(args.stddev),
+        'AI_FAKE_RATE_LIMIT_RATE': str(args.rate_limit),
+        'AI_FAKE_ERROR_RATE': str(args.errors),
+        'AI_FAKE_TRUNCATION_RATE': str(args.truncation),
+        'AI_FAKE_SEED': str(args.seed),
+        'AI_CACHE_ENABLED': str(args.cache),
+        'AI_CACHE_DIR': os.path.join(state_dir, 'ai_cache'),
+        'AI_SCHEDULER_ENABLED': str(args.rpm > 0),
+        'AI_SCHEDULER_DB': os.path.join(state_dir, 'scheduler.sqlite3'),
+        'AI_RPM_LIMIT': str(max(args.rpm, 1)),
+        'JOBS_DB': os.path.join(state_dir, 'jobs.sqlite3'),
+    })
+    if args.cassette:
+        os.environ.update({
+            'AI_FAKE_GEMINI': 'False',
+            'AI_CASSETTE_MODE': 'replay',
+            'AI_CASSETTE_PATH': args.cassette,
+            'AI_CASSETTE_MATCH': 'task',
+            'AI_CASSETTE_REPLAY_LATENCY': str(args.replay_latency),
+        })
+    # Las rutas probadas no tocan la BD, pero la app exige configuración de Supabase
+    os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de rutas de IA con Gemini local")
+    parser.add_argument('--route', choices=sorted(ROUTES), default='analyze')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--distribution', default='lognormal',
+                        choices=['fixed', 'uniform', 'normal', 'lognormal'])
+    parser.add_argument('--latency', type=float, default=0.5, help='Latencia media (s)')
+    parser.add_argument('--stddev', type=float, default=0.2, help='Desviación típica (s)')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Probabilidad de 429')
+    parser.add_argument('--errors', type=float, default=0.0, help='Probabilidad de 500')
+    parser.add_argument('--truncation', type=float, default=0.0,
+                        help='Probabilidad de respuesta truncada')
+    parser.add_argument('--rpm', type=int, default=0, help='Límite RPM (0 = sin planificador)')
+    parser.add_argument('--cache', action='store_true', help='Activar la caché de respuestas')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cassette', help='Responder desde una cassette grabada')
+    parser.add_argument('--replay-latency', action='store_true',
+                        help='Con --cassette, reproducir la latencia grabada')
+    args = parser.parse_args()
+
+    configure_env(args)
+
+    import logging
+    from src.app import app
+    from src.services.ai_agent import ai_agent
+    logging.disable(logging.CRITICAL)
+
+    build_body = ROUTES[args.route]
+    endpoint = f'/api/ai/{args.route}'
+
+    def send(i):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post(endpoint, json=build_body(i))
+        return time.perf_counter() - start, response.status_code
+
+    source = (f"cassette {args.cassette}" if args.cassette else
+              f"latencia {args.distribution} {args.latency}±{args.stddev}s")
+    print(f"🚀 {args.requests} peticiones a {endpoint} "
+          f"(concurrencia {args.concurrency}, {source})")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    codes = Counter(code for _, code in results)
+
+    print("-" * 60)
+    print(f"Tiempo total:   {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"Latencia media: {statistics.mean(latencies):.3f}s")
+    print(f"p50 / p95 / p99: {percentile(latencies, 50):.3f}s / "
+          f"{percentile(latencies, 95):.3f}s / {percentile(latencies, 99):.3f}s")
+    print(f"Códigos HTTP:   {dict(sorted(codes.items()))}")
+    if ai_agent.fake:
+        print(f"Gemini local:   {ai_agent.fake.get_stats()}")
+    if ai_agent.cassette:
+        print(f"Cassette:       {ai_agent.cassette.get_stats()}")
+
+    scheduler = ai_agent.get_scheduler_stats()
+    if scheduler.get('enabled'):
+        print(f"Planificador:   espera media {scheduler['avg_wait']}s, "
+              f"máx {scheduler['max_wait']}s, reintentos {scheduler['retries']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Micro-benchmark del parser JSON tolerante a fallos
+
+Compara el parseo original (quitar ``` + json.loads) con parse_json sobre un
+corpus de respuestas del modelo: tasa de éxito, reparaciones aplicadas y coste
+por llamada. También mide el modo incremental usado en streaming.
+
+Uso:
+    python benchmarks/bench_json_repair.py [corpus.jsonl] [--repeat N]
+    python benchmarks/bench_json_repair.py --cassette data/ai_cassette.jsonl
+
+El corpus por defecto (corpus/gemini_responses.jsonl) es sintético: respuestas
+escritas a mano imitando las de Gemini, con un defecto conocido en cada una.
+Sirve para comprobar las reparaciones, no como muestra de la frecuencia real
+de fallos; para eso, pasar con --cassette una grabación real (AI_CASSETTE_MODE
+=record), cuyas respuestas se usan tal cual con defect "recorded".
+
+Cada línea del corpus es {"task": ..., "text": ...} (campo "defect" opcional).
+Las respuestas con defect "truncated*" deben detectarse como truncadas (no se
+cachean); si alguna no lo está, el benchmark termina con error.
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+# Añadir el directorio raíz al path para imports
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.utils.json_repair import TRUNCATION_REPAIRS, IncrementalJSONParser, parse_json
+
+DEFAULT_CORPUS = Path(__file__).parent / 'corpus' / 'gemini_responses.jsonl'
+STREAM_CHUNK_SIZE = 40
+
+
+def load_corpus(path: str):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_cassette(path: str):
+    """Respuestas de una cassette grabada, en el formato del corpus"""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Línea a medio escribir
+            entries.append({'task': entry['t'], 'defect': 'recorded', 'text': entry['r']})
+    return entries
+
+
+def legacy_parse(text: str):
+    """Parseo anterior de ComedyAIAgent._parse_json_response"""
+    cleaned = text.strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[7:]
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    return json.loads(cleaned.strip())
+
+
+def stream_parse(text: str):
+    """Parseo incremental con snapshot tras cada trozo (como un consumidor SSE)"""
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), STREAM_CHUNK_SIZE):
+        parser.feed(text[i:i + STREAM_CHUNK_SIZE])
+        parser.snapshot()
+    return parser.finish()
+
+
+def succeeds(func, text: str) -> bool:
+    try:
+        func(text)
+        return True
+    except ValueError:
+        return False
+
+
+def time_per_call(func, text: str, repeat: int) -> float:
+    """Microsegundos por llamada (mejor de 3 rondas)"""
+    timer = timeit.Timer(lambda: succeeds(func, text))
+    return min(timer.repeat(repeat=3, number=repeat)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', nargs='?', default=str(DEFAULT_CORPUS))
+    parser.add_argument('--cassette', help='Usar las respuestas de una cassette grabada')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    source = args.cassette or args.corpus
+    entries = load_cassette(source) if args.cassette else load_corpus(source)
+
+    print(f"📚 Corpus: {source} ({len(entries)} respuestas)")
+    print("-" * 96)
+    print(f"{'tarea':<22}{'defecto':<16}{'bytes':>7}{'legacy':>8}{'nuevo':>7}"
+          f"{'legacy µs':>11}{'nuevo µs':>10}{'stream µs':>11}  reparaciones")
+
+    legacy_ok = new_ok = 0
+    undetected = []
+    totals = {'legacy': 0.0, 'new': 0.0, 'stream': 0.0}
+
+    for entry in entries:
+        text = entry['text']
+        ok_legacy = succeeds(legacy_parse, text)
+        ok_new = succeeds(parse_json, text)
+        legacy_ok += ok_legacy
+        new_ok += ok_new
+
+        repairs = parse_json(text)[1] if ok_new else ['ERROR']
+        if entry.get('defect', '').startswith('truncated') and not TRUNCATION_REPAIRS.intersection(repairs):
+            undetected.append(entry.get('task', '?'))
+        t_legacy = time_per_call(legacy_parse, text, args.repeat)
+        t_new = time_per_call(parse_json, text, args.repeat)
+        t_stream = time_per_call(stream_parse, text, args.repeat)
+        totals['legacy'] += t_legacy
+        totals['new'] += t_new
+        totals['stream'] += t_stream
+
+        print(f"{entry.get('task', '?'):<22}{entry.get('defect', '-'):<16}{len(text):>7}"
+              f"{'✓' if ok_legacy else '✗':>8}{'✓' if ok_new else '✗':>7}"
+              f"{t_legacy:>11.1f}{t_new:>10.1f}{t_stream:>11.1f}  {', '.join(repairs)}")
+
+    n = len(entries) or 1
+    print("-" * 96)
+    print(f"✅ Parseadas: legacy {legacy_ok}/{len(entries)} | nuevo {new_ok}/{len(entries)}")
+    print(f"⏱️  Media por respuesta: legacy {totals['legacy'] / n:.1f} µs | "
+          f"nuevo {totals['new'] / n:.1f} µs | streaming {totals['stream'] / n:.1f} µs")
+    if undetected:
+        print(f"❌ Truncadas sin detectar: {', '.join(undetected)}")
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,104 @@
+"""
+Benchmark del índice vectorial de similitud
+
+Construye un SimilarityIndex con textos sintéticos (frases de chistes
+combinadas al azar) y mide el tiempo de construcción, la memoria de la matriz
+y la latencia de las consultas top-k por texto y por id, además de upserts
+incrementales. No necesita Supabase ni Gemini.
+
+Uso:
+    python benchmarks/bench_similarity.py [--items 20000] [--queries 200] [--dim 512]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio raíz al path para imports
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.services.similarity_index import SimilarityIndex
+
+SETUPS = [
+    "Mi madre me llama cada domingo", "En el gimnasio hay un señor", "Mi novia dice",
+    "Los lunes por la mañana", "En la oficina tenemos una impresora", "Mi abuelo usa WhatsApp",
+    "Fui al médico", "En las bodas siempre", "El casero me ha subido el alquiler",
+    "Los anuncios de colonia",
+]
+TWISTS = [
+    "para preguntarme si he comido", "que lleva diez años en la misma máquina",
+    "que soy muy despistado", "nadie sabe por qué", "que solo imprime los viernes",
+    "para mandar audios de cuarenta minutos", "y me recetó paciencia",
+    "alguien acaba llorando en el baño", "porque ahora el piso tiene vistas a su coche",
+    "no explican nunca a qué huelen",
+]
+PUNCHES = [
+    "Tengo 38 años y una hipoteca, mamá.", "Creo que la máquina ya es suya.",
+    "O eso creo, no me acuerdo.", "Yo tampoco.", "Y los viernes no viene nadie.",
+    "El último era para decir que sí.", "Se la tomo con agua.",
+    "Normalmente el novio.", "Su coche es precioso.", "Yo creo que a dinero.",
+]
+
+
+def synthetic_texts(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield f"joke-{i}", " ".join((rng.choice(SETUPS), rng.choice(TWISTS),
+                                      rng.choice(PUNCHES), f"({rng.randint(0, 10 ** 6)})"))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de similitud")
+    parser.add_argument('--items', type=int, default=20000, help='Textos en el índice')
+    parser.add_argument('--queries', type=int, default=200, help='Consultas a medir')
+    parser.add_argument('--dim', type=int, default=512, help='Columnas del hashing trick')
+    parser.add_argument('--k', type=int, default=10, help='Resultados por consulta')
+    args = parser.parse_args()
+
+    index = SimilarityIndex('bench', lambda: synthetic_texts(args.items), dim=args.dim,
+                            refresh_seconds=0)
+    index.load()
+    stats = index.get_stats()
+    print(f"🏗️  Construcción: {stats['size']} textos en {stats['build_seconds']:.2f}s "
+          f"({stats['memory_mb']:.1f} MB, dim={stats['dim']})")
+
+    rng = random.Random(7)
+    texts = [text for _, text in synthetic_texts(args.queries, seed=99)]
+
+    by_text = []
+    for text in texts:
+        start = time.perf_counter()
+        index.query(text, k=args.k)
+        by_text.append((time.perf_counter() - start) * 1000)
+
+    by_id = []
+    for _ in range(args.queries):
+        item_id = f"joke-{rng.randrange(args.items)}"
+        start = time.perf_counter()
+        index.query_id(item_id, k=args.k)
+        by_id.append((time.perf_counter() - start) * 1000)
+
+    upserts = []
+    for i, text in enumerate(texts):
+        start = time.perf_counter()
+        index.upsert(f"new-{i}", text)
+        upserts.append((time.perf_counter() - start) * 1000)
+
+    print()
+    print(f"{'Operación':<18} {'p50 (ms)':>10} {'p95 (ms)':>10} {'media (ms)':>11}")
+    print("-" * 52)
+    for name, values in (('query (texto)', by_text), ('query_id', by_id), ('upsert', upserts)):
+        print(f"{name:<18} {percentile(values, 0.50):>10.2f} {percentile(values, 0.95):>10.2f} "
+              f"{statistics.mean(values):>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Informe de arranque en frío
+
+Cada medición se hace en un proceso nuevo, como en un spin-up de Render:
+
+1. Módulos que más tardan en importarse al cargar src.app (python -X importtime)
+2. Tiempo de import de la app y latencia de las primeras peticiones
+   (/health, la PWA y el manifest), que no deben inicializar Gemini ni Supabase
+3. Lo que cuesta crear cada singleton perezoso en su primer uso
+
+No hace llamadas de red: crear los clientes no conecta todavía.
+
+Uso:
+    python benchmarks/cold_start_report.py [--runs 3] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Directorio raíz del proyecto
+root_dir = Path(__file__).resolve().parent.parent
+
+# Se ejecuta en un proceso nuevo; imprime los tiempos como JSON
+MEASURE_SCRIPT = r"""
+import json, logging, time
+start = time.perf_counter()
+from src.app import app
+timings = {'import_app': time.perf_counter() - start}
+logging.disable(logging.CRITICAL)
+
+client = app.test_client()
+for name, path in (('first_health', '/health'), ('first_index', '/'),
+                   ('first_manifest', '/manifest.json')):
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    timings[name] = time.perf_counter() - t
+    timings[name + '_status'] = status
+
+from src.services.ai_agent import ai_agent
+from src.services import supabase_client
+timings['ai_initialized_after_health'] = ai_agent.initialized
+
+if ai_agent:
+    t = time.perf_counter()
+    ai_agent.routes
+    timings['init_ai_agent'] = time.perf_counter() - t
+
+t = time.perf_counter()
+supabase_client.jokes_repo.table
+timings['init_jokes_repo'] = time.perf_counter() - t
+
+print(json.dumps(timings))
+"""
+
+
+def child_env():
+    """Entorno del proceso hijo; sin .env se usan valores de relleno"""
+    env = dict(os.environ)
+    env.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    env.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.report')
+    if not env.get('GEMINI_API_KEY'):
+        env['GEMINI_API_KEY'] = 'cold-start-report'
+    return env
+
+
+def import_times(top: int):
+    """Módulos con más tiempo acumulado de import al cargar src.app (incluye anidados)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import src.app'],
+        cwd=root_dir, env=child_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us) / 1e6, int(self_us) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure(runs: int):
+    """Ejecuta MEASURE_SCRIPT en procesos nuevos y devuelve la mediana de cada métrica"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', MEASURE_SCRIPT],
+            cwd=root_dir, env=child_env(), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    report = {}
+    for key, value in samples[0].items():
+        if isinstance(value, bool) or key.endswith('_status'):
+            report[key] = value
+        else:
+            report[key] = statistics.median(s[key] for s in samples)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de arranque en frío")
+    parser.add_argument('--runs', type=int, default=3, help='Procesos por medición')
+    parser.add_argument('--top', type=int, default=15, help='Módulos a mostrar')
+    args = parser.parse_args()
+
+    print("📦 Imports más lentos al cargar src.app")
+    print("-" * 60)
+    for cumulative, own, name in import_times(args.top):
+        print(f"{cumulative * 1000:9.1f} ms  (propio {own * 1000:7.1f} ms)  {name}")
+
+    report = measure(args.runs)
+    print()
+    print(f"🧊 Arranque en frío (mediana de {args.runs} procesos)")
+    print("-" * 60)
+    print(f"Import de la app:     {report['import_app'] * 1000:8.1f} ms")
+    for name, label in (('first_health', '/health'), ('first_index', '/ (PWA)'),
+                        ('first_manifest', '/manifest.json')):
+        print(f"1ª petición {label:<15} {report[name] * 1000:8.1f} ms "
+              f"(HTTP {report[name + '_status']})")
+    print(f"IA inicializada tras /health: {'sí' if report['ai_initialized_after_health'] else 'no'}")
+
+    print()
+    print("⏳ Primer uso de los singletons perezosos")
+    print("-" * 60)
+    if 'init_ai_agent' in report:
+        print(f"ai_agent:             {report['init_ai_agent'] * 1000:8.1f} ms")
+    print(f"jokes_repo (Supabase):{report['init_jokes_repo'] * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
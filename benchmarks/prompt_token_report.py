@@ -0,0 +1,134 @@
+"""
+Informe de tokens de entrada por template de prompt
+
+Para cada tarea de PROMPT_TASKS muestra los tokens de la system instruction
+(estática, fijada una vez por modelo) y los de la parte variable por llamada,
+formateada con una entrada de ejemplo.
+
+Uso:
+    python benchmarks/prompt_token_report.py            # estimación local (~4 chars/token)
+    python benchmarks/prompt_token_report.py --api      # count_tokens de Gemini
+    python benchmarks/prompt_token_report.py --live     # + latencia real: system
+                                                        #   instruction vs prompt único
+
+--api y --live necesitan GEMINI_API_KEY y consumen cuota (--live hace 2
+llamadas por tarea).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio raíz al path para imports
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.config import config
+from src.utils.prompts import PROMPT_TASKS
+
+SAMPLE_JOKE = ("Mi madre me llama cada domingo para preguntarme si he comido. "
+               "Tengo 38 años y una hipoteca, mamá.")
+
+SAMPLE_INPUTS = {
+    'analyze_joke': {'joke_text': SAMPLE_JOKE},
+    'suggest_improvements': {
+        'joke_text': SAMPLE_JOKE,
+        'analysis_summary': "Puntos fuertes: situación reconocible\n"
+                            "Puntos débiles: setup largo\nTécnicas: observacional",
+    },
+    'generate_variations': {'joke_text': SAMPLE_JOKE, 'num_variations': 3},
+    'brainstorm_ideas': {'topic': 'teletrabajo', 'style': 'observacional', 'num_ideas': 5},
+    'identify_patterns': {
+        'num_jokes': 3,
+        'jokes_text': "\n\n---\n\n".join(f"CHISTE {i}:\n{SAMPLE_JOKE}" for i in range(1, 4)),
+    },
+    'merge_patterns': {
+        'num_reports': 2,
+        'num_jokes': 50,
+        'reports_text': "\n\n".join(
+            f"INFORME {i} (25 chistes):\n"
+            '{"temas_recurrentes": ["familia"], "estilo_distintivo": "observacional"}'
+            for i in range(1, 3)
+        ),
+    },
+    'suggest_tags': {'joke_text': SAMPLE_JOKE},
+    'analyze_concepts': {'joke_text': SAMPLE_JOKE},
+    'analyze_rupture': {'joke_text': SAMPLE_JOKE},
+    'analyze_combined': {'joke_text': SAMPLE_JOKE},
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de tokens por template")
+    parser.add_argument('--api', action='store_true', help='Contar tokens con la API de Gemini')
+    parser.add_argument('--live', action='store_true', help='Medir latencia real por llamada')
+    args = parser.parse_args()
+
+    counter = estimate_tokens
+    genai = None
+    if args.api or args.live:
+        if not config.GEMINI_API_KEY:
+            print("❌ Error: GEMINI_API_KEY no configurado en .env")
+            return
+        import google.generativeai as genai
+        genai.configure(api_key=config.GEMINI_API_KEY)
+        base_model = genai.GenerativeModel(config.GEMINI_MODEL)
+
+        def counter(text):
+            return base_model.count_tokens(text).total_tokens
+
+    source = 'API count_tokens' if genai else 'estimación ~4 chars/token'
+    print(f"🔢 Tokens de entrada por template ({source}, modelo {config.GEMINI_MODEL})")
+    print("-" * 72)
+    print(f"{'tarea':<24}{'system':>10}{'por llamada':>14}{'total':>10}{'% estático':>13}")
+
+    totals = [0, 0]
+    for task, (system, template) in PROMPT_TASKS.items():
+        per_call = template.format(**SAMPLE_INPUTS[task])
+        system_tokens = counter(system)
+        call_tokens = counter(per_call)
+        totals[0] += system_tokens
+        totals[1] += call_tokens
+        share = system_tokens / (system_tokens + call_tokens) * 100
+        print(f"{task:<24}{system_tokens:>10}{call_tokens:>14}"
+              f"{system_tokens + call_tokens:>10}{share:>12.0f}%")
+
+    print("-" * 72)
+    print(f"{'TOTAL':<24}{totals[0]:>10}{totals[1]:>14}{sum(totals):>10}")
+    print("ℹ️  Gemini factura la system instruction como entrada en cada llamada;")
+    print("   'por llamada' es lo que cada petición aporta además de la parte estática.")
+
+    if not args.live:
+        return
+
+    generation_config = {"temperature": 0.9, "max_output_tokens": 2048}
+    print()
+    print("⏱️  Latencia y tokens facturados por llamada (system instruction vs prompt único)")
+    print("-" * 72)
+    print(f"{'tarea':<24}{'system s':>10}{'único s':>10}{'entrada sys':>13}{'entrada único':>15}")
+
+    for task, (system, template) in PROMPT_TASKS.items():
+        per_call = template.format(**SAMPLE_INPUTS[task])
+        split_model = genai.GenerativeModel(config.GEMINI_MODEL, generation_config=generation_config,
+                                            system_instruction=system)
+        single_model = genai.GenerativeModel(config.GEMINI_MODEL, generation_config=generation_config)
+
+        start = time.perf_counter()
+        split_response = split_model.generate_content(per_call)
+        split_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        single_response = single_model.generate_content(f"{system}\n{per_call}")
+        single_time = time.perf_counter() - start
+
+        print(f"{task:<24}{split_time:>10.2f}{single_time:>10.2f}"
+              f"{split_response.usage_metadata.prompt_token_count:>13}"
+              f"{single_response.usage_metadata.prompt_token_count:>15}")
+
+
+if __name__ == '__main__':
+    main()
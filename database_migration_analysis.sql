@@ -47,7 +47,7 @@ CREATE TABLE IF NOT EXISTS analisis_chistes (
 -- Índices para búsquedas rápidas
 CREATE INDEX idx_analisis_chistes_comediante ON analisis_chistes(comediante) WHERE NOT eliminado;
 CREATE INDEX idx_analisis_chistes_concepto ON analisis_chistes(concepto_categoria) WHERE NOT eliminado;
-CREATE INDEX idx_analisis_chistes_fecha ON analisis_chistes(fecha_creacion DESC) WHERE NOT eliminado;
+CREATE INDEX idx_analisis_chistes_fecha_id ON analisis_chistes(fecha_creacion DESC, id DESC) WHERE NOT eliminado;
 
 -- Trigger para actualizar fecha_modificacion
 CREATE OR REPLACE FUNCTION update_analisis_chistes_timestamp()
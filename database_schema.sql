@@ -39,7 +39,7 @@ CREATE TABLE IF NOT EXISTS chistes (
 
 -- Índices para chistes
 CREATE INDEX idx_chistes_estado ON chistes(estado) WHERE NOT eliminado;
-CREATE INDEX idx_chistes_fecha ON chistes(fecha_creacion DESC);
+CREATE INDEX idx_chistes_fecha_id ON chistes(fecha_creacion DESC, id DESC) WHERE NOT eliminado;
 CREATE INDEX idx_chistes_calificacion ON chistes(calificacion DESC) WHERE calificacion IS NOT NULL;
 CREATE INDEX idx_chistes_veces_usado ON chistes(veces_usado DESC);
 
@@ -80,11 +80,13 @@ CREATE TABLE IF NOT EXISTS analisis_ia (
 
     -- Metadata del modelo
     modelo_ia VARCHAR(50) DEFAULT 'gemini-1.5-flash',
-    prompt_version VARCHAR(20) DEFAULT '1.0'
+    prompt_version VARCHAR(20) DEFAULT '1.0',
+    huella_contenido VARCHAR(64) -- SHA-256 del texto analizado (normalizado)
 );
 
 -- Índices para análisis
 CREATE INDEX idx_analisis_chiste ON analisis_ia(chiste_id);
+CREATE INDEX idx_analisis_huella ON analisis_ia(chiste_id, huella_contenido, prompt_version, modelo_ia);
 CREATE INDEX idx_analisis_fecha ON analisis_ia(fecha_analisis DESC);
 CREATE INDEX idx_analisis_puntuacion ON analisis_ia(puntuacion_general DESC);
 
@@ -182,7 +184,7 @@ CREATE TABLE IF NOT EXISTS bitacora (
 );
 
 -- Índices para bitácora
-CREATE INDEX idx_bitacora_fecha ON bitacora(fecha DESC) WHERE NOT eliminado;
+CREATE INDEX idx_bitacora_fecha_id ON bitacora(fecha DESC, id DESC) WHERE NOT eliminado;
 CREATE INDEX idx_bitacora_tipo ON bitacora(tipo) WHERE NOT eliminado;
 CREATE INDEX idx_bitacora_chiste ON bitacora(chiste_relacionado_id) WHERE chiste_relacionado_id IS NOT NULL;
 
@@ -0,0 +1,53 @@
+-- ========================================
+-- MIGRACIÓN: Huella de contenido en analisis_ia
+-- ========================================
+-- Ejecutar en Supabase SQL Editor
+-- /api/ai/analyze reutiliza el análisis guardado cuando el chiste, la versión
+-- de prompt y el modelo no han cambiado (salvo "force": true)
+
+-- ========================================
+-- 1. Columna e índice de búsqueda
+-- ========================================
+
+ALTER TABLE analisis_ia
+ADD COLUMN IF NOT EXISTS huella_contenido VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_analisis_huella
+ON analisis_ia(chiste_id, huella_contenido, prompt_version, modelo_ia);
+
+-- ========================================
+-- 2. Retención: colapsar análisis duplicados
+-- ========================================
+-- Deja solo el más reciente de cada (chiste, contenido, prompt, modelo).
+-- Se puede volver a ejecutar en cualquier momento.
+
+DELETE FROM analisis_ia
+WHERE id IN (
+    SELECT id FROM (
+        SELECT
+            id,
+            ROW_NUMBER() OVER (
+                PARTITION BY chiste_id, huella_contenido, prompt_version, modelo_ia
+                ORDER BY fecha_analisis DESC
+            ) AS posicion
+        FROM analisis_ia
+        WHERE huella_contenido IS NOT NULL
+    ) AS ordenados
+    WHERE posicion > 1
+);
+
+-- ========================================
+-- 3. Verificación
+-- ========================================
+
+SELECT
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE table_name = 'analisis_ia'
+AND column_name = 'huella_contenido';
+
+-- ========================================
+-- FIN DE LA MIGRACIÓN
+-- ========================================
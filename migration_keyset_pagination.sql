@@ -0,0 +1,48 @@
+-- ========================================
+-- MIGRACIÓN: Índices para la paginación por cursor
+-- ========================================
+-- Ejecutar en Supabase SQL Editor
+-- Los listados de /api/jokes/, /api/bitacora/ y /api/analisis-chistes/ se
+-- sirven por páginas ordenadas por (fecha, id) descendente. Con estos índices
+-- cada página es un recorrido corto del índice desde el cursor, sin ordenar
+-- la tabla entera, por lejos que esté la página.
+
+-- ========================================
+-- 1. Índices compuestos (fecha, id) sobre filas no eliminadas
+-- ========================================
+
+CREATE INDEX IF NOT EXISTS idx_chistes_fecha_id
+ON chistes(fecha_creacion DESC, id DESC) WHERE NOT eliminado;
+
+CREATE INDEX IF NOT EXISTS idx_bitacora_fecha_id
+ON bitacora(fecha DESC, id DESC) WHERE NOT eliminado;
+
+CREATE INDEX IF NOT EXISTS idx_analisis_chistes_fecha_id
+ON analisis_chistes(fecha_creacion DESC, id DESC) WHERE NOT eliminado;
+
+-- ========================================
+-- 2. Índices de solo fecha que quedan cubiertos por los anteriores
+-- ========================================
+
+DROP INDEX IF EXISTS idx_chistes_fecha;
+DROP INDEX IF EXISTS idx_bitacora_fecha;
+DROP INDEX IF EXISTS idx_analisis_chistes_fecha;
+
+-- ========================================
+-- 3. Verificación
+-- ========================================
+
+SELECT
+    tablename,
+    indexname,
+    indexdef
+FROM pg_indexes
+WHERE indexname IN (
+    'idx_chistes_fecha_id',
+    'idx_bitacora_fecha_id',
+    'idx_analisis_chistes_fecha_id'
+);
+
+-- ========================================
+-- FIN DE LA MIGRACIÓN
+-- ========================================
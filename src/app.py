@@ -49,6 +49,8 @@ def create_app():
     from src.routes.analisis_chistes import analisis_chistes_bp
     from src.routes.categorias import categorias_bp
     from src.routes.auth import auth_bp
+    from src.routes.jobs import jobs_bp
+    from src.routes.search import search_bp
 
     app.register_blueprint(jokes_bp)
     app.register_blueprint(ai_bp)
@@ -56,6 +58,8 @@ def create_app():
     app.register_blueprint(analisis_chistes_bp, url_prefix='/api/analisis-chistes')
     app.register_blueprint(categorias_bp, url_prefix='/api/categorias')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(search_bp)
 
     # Rutas básicas
     @app.route('/')
@@ -65,11 +69,19 @@ def create_app():
 
     @app.route('/health')
     def health():
-        """Health check endpoint"""
+        """Health check endpoint (no inicializa el agente de IA ni Supabase)"""
+        from src.services.ai_agent import ai_agent
+
+        breaker = ai_agent.resilience.breaker if ai_agent.initialized else None
         return jsonify({
             'status': 'healthy',
             'service': 'metodo-comedia',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'ai': {
+                'available': bool(ai_agent),
+                'initialized': ai_agent.initialized,
+                'circuit_breaker': breaker.get_state() if breaker else None
+            }
         }), 200
 
     @app.route('/manifest.json')
@@ -1,6 +1,7 @@
 """
 Configuración de la aplicación
 """
+import json
 import os
 from dotenv import load_dotenv
 
@@ -25,6 +26,112 @@ class Config:
     # Google Gemini AI
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     GEMINI_MODEL = 'gemini-1.5-flash'  # Modelo gratuito
+    GEMINI_FAST_MODEL = os.getenv('GEMINI_FAST_MODEL', 'gemini-1.5-flash-8b')  # Tareas cortas
+    # Cambios de modelo/generation config por tarea, p.ej.
+    # {"suggest_tags": {"model": "gemini-1.5-flash", "max_output_tokens": 512}}
+    AI_MODEL_ROUTES = json.loads(os.getenv('AI_MODEL_ROUTES') or '{}')
+
+    # Sustituto local de Gemini (pruebas sin red y de carga, no consume cuota)
+    AI_FAKE_GEMINI = os.getenv('AI_FAKE_GEMINI', 'False').lower() == 'true'
+    AI_FAKE_LATENCY = os.getenv('AI_FAKE_LATENCY', 'lognormal')  # fixed|uniform|normal|lognormal
+    AI_FAKE_LATENCY_MEAN = float(os.getenv('AI_FAKE_LATENCY_MEAN', 1.5))  # segundos
+    AI_FAKE_LATENCY_STDDEV = float(os.getenv('AI_FAKE_LATENCY_STDDEV', 0.5))  # segundos
+    AI_FAKE_RATE_LIMIT_RATE = float(os.getenv('AI_FAKE_RATE_LIMIT_RATE', 0.0))  # prob. de 429
+    AI_FAKE_ERROR_RATE = float(os.getenv('AI_FAKE_ERROR_RATE', 0.0))  # prob. de 500
+    AI_FAKE_TRUNCATION_RATE = float(os.getenv('AI_FAKE_TRUNCATION_RATE', 0.0))
+    AI_FAKE_SEED = int(os.getenv('AI_FAKE_SEED')) if os.getenv('AI_FAKE_SEED') else None
+
+    # Grabación/reproducción de llamadas a Gemini (off|record|replay)
+    AI_CASSETTE_MODE = os.getenv('AI_CASSETTE_MODE', 'off').lower()
+    AI_CASSETTE_PATH = os.getenv('AI_CASSETTE_PATH', './data/ai_cassette.jsonl')
+    AI_CASSETTE_MATCH = os.getenv('AI_CASSETTE_MATCH', 'exact')  # exact|task
+    AI_CASSETTE_REPLAY_LATENCY = os.getenv('AI_CASSETTE_REPLAY_LATENCY', 'False').lower() == 'true'
+
+    # Sin llamadas reales a Gemini: no hace falta API key
+    AI_OFFLINE = AI_FAKE_GEMINI or AI_CASSETTE_MODE == 'replay'
+
+    # Caché de respuestas de IA (memoria por proceso + disco compartido)
+    AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+    AI_CACHE_DIR = os.getenv('AI_CACHE_DIR', './data/ai_cache')
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 256))
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600))  # segundos
+    AI_CACHE_MAX_DISK_ENTRIES = int(os.getenv('AI_CACHE_MAX_DISK_ENTRIES', 5000))
+
+    # Máximo de llamadas simultáneas al modelo por worker
+    AI_MAX_WORKERS = int(os.getenv('AI_MAX_WORKERS', 4))
+
+    # Planificador de cuota de Gemini (compartido entre workers vía SQLite)
+    AI_SCHEDULER_ENABLED = os.getenv('AI_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    AI_SCHEDULER_DB = os.getenv('AI_SCHEDULER_DB', './data/ai_scheduler.sqlite3')
+    AI_RPM_LIMIT = int(os.getenv('AI_RPM_LIMIT', 15))  # Free tier de gemini-1.5-flash
+    AI_TPM_LIMIT = int(os.getenv('AI_TPM_LIMIT', 1000000))
+    AI_SCHEDULER_MAX_WAIT = float(os.getenv('AI_SCHEDULER_MAX_WAIT', 60))  # segundos
+    AI_RATE_LIMIT_RETRIES = int(os.getenv('AI_RATE_LIMIT_RETRIES', 3))
+    AI_OUTPUT_TOKENS_ESTIMATE = int(os.getenv('AI_OUTPUT_TOKENS_ESTIMATE', 512))
+
+    # Timeouts, reintentos, hedging y circuit breaker de las llamadas a Gemini
+    AI_REQUEST_BUDGET = float(os.getenv('AI_REQUEST_BUDGET', 100))  # segundos por petición HTTP
+    AI_CALL_TIMEOUT = float(os.getenv('AI_CALL_TIMEOUT', 30))  # segundos por intento
+    AI_CALL_RETRIES = int(os.getenv('AI_CALL_RETRIES', 2))
+    AI_RETRY_BACKOFF = float(os.getenv('AI_RETRY_BACKOFF', 0.5))  # segundos
+    AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'False').lower() == 'true'
+    AI_HEDGE_QUANTILE = float(os.getenv('AI_HEDGE_QUANTILE', 0.95))
+    AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', 20))
+    # Cambios por tarea, p.ej. {"identify_patterns": {"timeout": 90, "retries": 1}}
+    AI_CALL_POLICIES = json.loads(os.getenv('AI_CALL_POLICIES') or '{}')
+    AI_BREAKER_ENABLED = os.getenv('AI_BREAKER_ENABLED', 'True').lower() == 'true'
+    AI_BREAKER_ERROR_RATE = float(os.getenv('AI_BREAKER_ERROR_RATE', 0.5))
+    AI_BREAKER_MIN_CALLS = int(os.getenv('AI_BREAKER_MIN_CALLS', 10))
+    AI_BREAKER_WINDOW = int(os.getenv('AI_BREAKER_WINDOW', 20))
+    AI_BREAKER_OPEN_SECONDS = float(os.getenv('AI_BREAKER_OPEN_SECONDS', 30))
+
+    # Métricas por llamada de la IA (agregados en /api/ai/stats y JSONL rotativo)
+    AI_METRICS_ENABLED = os.getenv('AI_METRICS_ENABLED', 'True').lower() == 'true'
+    AI_METRICS_LOG = os.getenv('AI_METRICS_LOG', './data/ai_calls.jsonl')  # vacío = sin log
+    AI_METRICS_LOG_MAX_BYTES = int(os.getenv('AI_METRICS_LOG_MAX_BYTES', 5 * 1024 * 1024))
+    AI_METRICS_LOG_BACKUPS = int(os.getenv('AI_METRICS_LOG_BACKUPS', 3))
+    # USD por millón de tokens (entrada, salida), p.ej. {"gemini-1.5-flash": [0.075, 0.3]}
+    AI_TOKEN_PRICES = json.loads(os.getenv('AI_TOKEN_PRICES') or '{}')
+
+    # /analyze-full en una sola llamada (las secciones inválidas se piden aparte)
+    AI_COMBINED_ANALYSIS = os.getenv('AI_COMBINED_ANALYSIS', 'True').lower() == 'true'
+
+    # Índice vectorial en memoria de chistes y análisis (/similar, /comparar)
+    SIMILARITY_ENABLED = os.getenv('SIMILARITY_ENABLED', 'True').lower() == 'true'
+    SIMILARITY_DIM = int(os.getenv('SIMILARITY_DIM', 512))  # columnas del hashing trick
+
+    # Detección de casi duplicados (MinHash + LSH) en chistes e ideas de bitácora
+    DUPLICATES_ENABLED = os.getenv('DUPLICATES_ENABLED', 'True').lower() == 'true'
+    DUPLICATES_THRESHOLD = float(os.getenv('DUPLICATES_THRESHOLD', 0.5))  # Jaccard estimado
+    DUPLICATES_NUM_PERM = int(os.getenv('DUPLICATES_NUM_PERM', 128))
+    DUPLICATES_BANDS = int(os.getenv('DUPLICATES_BANDS', 32))
+
+    # Búsqueda de texto completo (BM25) en chistes, bitácora y análisis (/api/search)
+    SEARCH_ENABLED = os.getenv('SEARCH_ENABLED', 'True').lower() == 'true'
+
+    # Segundos entre reconstrucciones de los índices en memoria desde Supabase
+    TEXT_INDEX_REFRESH_SECONDS = float(os.getenv('TEXT_INDEX_REFRESH_SECONDS', 600))
+
+    # Clasificador local de tags (train_tag_classifier.py); /api/ai/tags pregunta
+    # a Gemini solo si la confianza no llega al umbral
+    TAG_CLASSIFIER_ENABLED = os.getenv('TAG_CLASSIFIER_ENABLED', 'True').lower() == 'true'
+    TAG_CLASSIFIER_PATH = os.getenv('TAG_CLASSIFIER_PATH', './data/tag_classifier.npz')
+    TAG_CLASSIFIER_THRESHOLD = float(os.getenv('TAG_CLASSIFIER_THRESHOLD', 0.6))
+    TAG_CLASSIFIER_DIM = int(os.getenv('TAG_CLASSIFIER_DIM', 1024))
+
+    # Análisis por lotes
+    AI_BATCH_CONCURRENCY = int(os.getenv('AI_BATCH_CONCURRENCY', 4))
+    AI_BATCH_MAX_CONCURRENCY = int(os.getenv('AI_BATCH_MAX_CONCURRENCY', 8))
+    AI_BATCH_MAX_ITEMS = int(os.getenv('AI_BATCH_MAX_ITEMS', 200))
+
+    # Patrones en colecciones grandes (map-reduce por bloques)
+    AI_PATTERNS_CHUNK_TOKENS = int(os.getenv('AI_PATTERNS_CHUNK_TOKENS', 6000))
+    AI_PATTERNS_CHUNK_JOKES = int(os.getenv('AI_PATTERNS_CHUNK_JOKES', 25))  # tamaño medio
+
+    # Cola de trabajos en segundo plano (estado compartido vía SQLite)
+    JOBS_DB = os.getenv('JOBS_DB', './data/jobs.sqlite3')
+    JOBS_MAX_WORKERS = int(os.getenv('JOBS_MAX_WORKERS', 2))
+    JOBS_TTL = int(os.getenv('JOBS_TTL', 24 * 3600))  # segundos
 
     # Todoist
     TODOIST_TOKEN = os.getenv('TODOIST_TOKEN')
@@ -46,7 +153,7 @@ class Config:
         required = {
             'SUPABASE_URL': cls.SUPABASE_URL,
             'SUPABASE_KEY': cls.SUPABASE_KEY,
-            'GEMINI_API_KEY': cls.GEMINI_API_KEY,
+            'GEMINI_API_KEY': cls.GEMINI_API_KEY or cls.AI_OFFLINE,
         }
 
         missing = [key for key, value in required.items() if not value]
@@ -1,9 +1,16 @@
 """
 Rutas para funcionalidades de IA
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+from src.config import config
 from src.services.ai_agent import ai_agent
-from src.services.supabase_client import jokes_repo, analysis_repo
+from src.services.ai_resilience import reset_deadline, set_deadline
+from src.services.job_queue import job_queue, register_handler
+from src.services.supabase_client import jokes_repo, analysis_repo, tags_repo
+from src.services.tag_classifier import tag_classifier, TAG_CATEGORIES
+from src.utils.prompts import PROMPT_VERSION
+from src.utils.sse import sse_event, sse_response
+from src.utils.text import content_fingerprint
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,9 +18,182 @@ logger = logging.getLogger(__name__)
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
 
+@ai_bp.before_request
+def _start_ai_deadline():
+    """Presupuesto de tiempo de la petición para las llamadas al modelo"""
+    g.ai_deadline = set_deadline(config.AI_REQUEST_BUDGET)
+
+
+@ai_bp.teardown_request
+def _end_ai_deadline(error=None):
+    token = g.pop('ai_deadline', None)
+    if token is not None:
+        reset_deadline(token)
+
+
+def _flag(data: dict, name: str) -> bool:
+    """Lee un flag booleano del body o de la query string (?name=true)"""
+    value = data.get(name, request.args.get(name, False))
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+def _wants_fresh(data: dict) -> bool:
+    """Indica si la petición pide saltarse la caché de IA (body o ?fresh=true)"""
+    return _flag(data, 'fresh')
+
+
+def _wants_force(data: dict) -> bool:
+    """Indica si la petición pide repetir un análisis ya guardado (body o ?force=true)"""
+    # Saltarse la caché implica también no reutilizar lo guardado
+    return _flag(data, 'force') or _wants_fresh(data)
+
+
+def _wants_async(data: dict) -> bool:
+    """Indica si la petición pide ejecutarse como trabajo en segundo plano"""
+    return _flag(data, 'async')
+
+
+def _enqueue(kind: str, params: dict):
+    """Encola un trabajo y responde 202 con las URLs para seguirlo"""
+    job = job_queue.submit(kind, params)
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/jobs/{job['id']}",
+        'events_url': f"/api/jobs/{job['id']}/events"
+    }), 202
+
+
+def _job_handler(runner):
+    """Adapta un runner (params, progress) -> (payload, status) a handler de la cola"""
+    def handler(params: dict, progress):
+        payload, status = runner(params, progress)
+        if status >= 400:
+            raise RuntimeError(payload.get('error', 'Job failed'))
+        return payload
+    return handler
+
+
+def _sse_response(items):
+    """Respuesta SSE que emite un evento 'item' por elemento y 'done' al final"""
+    def generate():
+        count = 0
+        try:
+            for item in items:
+                count += 1
+                yield sse_event('item', item)
+            yield sse_event('done', {'count': count})
+        except Exception as e:
+            logger.error(f"Error while streaming AI response: {e}")
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(generate())
+
+
+def _analysis_model() -> str:
+    """Modelo con el que se genera el análisis de estructura y scores"""
+    return ai_agent.routes['analyze_joke']['model']
+
+
+def _build_analysis_record(joke_id: str, analysis: dict = None, concepts: dict = None,
+                           rupture: dict = None, joke_text: str = None) -> dict:
+    """Construye la fila de analisis_ia a partir de los resultados de la IA"""
+    record = {
+        'chiste_id': joke_id,
+        'modelo_ia': _analysis_model(),
+        'prompt_version': PROMPT_VERSION
+    }
+    if joke_text is not None:
+        record['huella_contenido'] = content_fingerprint(joke_text)
+
+    if analysis:
+        scores = analysis.get('scores', {})
+        record.update({
+            'estructura': analysis.get('estructura'),
+            'tecnicas': analysis.get('tecnicas'),
+            'puntos_fuertes': analysis.get('puntos_fuertes'),
+            'puntos_debiles': analysis.get('puntos_debiles'),
+            'sugerencias': analysis.get('sugerencias'),
+            'puntuacion_estructura': scores.get('estructura'),
+            'puntuacion_originalidad': scores.get('originalidad'),
+            'puntuacion_timing': scores.get('timing'),
+            'puntuacion_general': scores.get('general')
+        })
+
+    if concepts:
+        record.update({
+            'tipo_concepto': concepts.get('tipo_concepto'),
+            'explicacion_tipo_concepto': concepts.get('explicacion_tipo'),
+            'mapa_conceptos': concepts.get('mapa_conceptos')
+        })
+
+    if rupture:
+        record.update({
+            'tipo_ruptura': rupture.get('tipo_ruptura'),
+            'subtipo_ruptura': rupture.get('subtipo_ruptura'),
+            'explicacion_ruptura': rupture.get('explicacion_ruptura')
+        })
+
+    return record
+
+
+def _analysis_from_record(record: dict) -> dict:
+    """Reconstruye la respuesta de analyze_joke a partir de una fila de analisis_ia"""
+    return {
+        'id': record['id'],
+        'estructura': record.get('estructura'),
+        'tecnicas': record.get('tecnicas'),
+        'puntos_fuertes': record.get('puntos_fuertes'),
+        'puntos_debiles': record.get('puntos_debiles'),
+        'sugerencias': record.get('sugerencias'),
+        'scores': {
+            'estructura': record.get('puntuacion_estructura'),
+            'originalidad': record.get('puntuacion_originalidad'),
+            'timing': record.get('puntuacion_timing'),
+            'general': record.get('puntuacion_general')
+        },
+        'fecha_analisis': record.get('fecha_analisis'),
+        'reused': True
+    }
+
+
+def _get_joke_text(data: dict):
+    """
+    Resuelve el texto del chiste a partir de joke_id o joke_text
+
+    Returns:
+        Tupla (joke_text, joke_id, error_response); error_response es None si todo va bien
+    """
+    if not data.get('joke_text') and not data.get('joke_id'):
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'Either joke_text or joke_id is required'
+        }), 400)
+
+    if data.get('joke_id'):
+        joke = jokes_repo.get_joke(data['joke_id'])
+        if not joke:
+            return None, None, (jsonify({
+                'success': False,
+                'error': 'Joke not found'
+            }), 404)
+        return joke['contenido'], data['joke_id'], None
+
+    return data['joke_text'], None, None
+
+
 @ai_bp.route('/analyze', methods=['POST'])
 def analyze_joke():
-    """Analiza un chiste con IA"""
+    """
+    Analiza un chiste con IA
+
+    Con joke_id, si ya hay un análisis del mismo contenido con la misma versión
+    de prompt y el mismo modelo se devuelve ese (con "reused": true) sin llamar
+    a la IA. "force": true (o "fresh") obliga a repetirlo.
+    """
     try:
         data = request.get_json()
 
@@ -37,26 +217,35 @@ def analyze_joke():
             joke_text = data['joke_text']
             joke_id = None
 
+        force = _wants_force(data)
+
+        # Reutilizar el análisis guardado si el chiste no ha cambiado
+        if joke_id and not force:
+            stored = analysis_repo.find_analysis(
+                joke_id, content_fingerprint(joke_text), PROMPT_VERSION, _analysis_model()
+            )
+            if stored and stored.get('puntuacion_general') is not None:
+                return jsonify({
+                    'success': True,
+                    'data': _analysis_from_record(stored)
+                }), 200
+
         # Analizar con IA
-        analysis = ai_agent.analyze_joke(joke_text)
+        analysis = ai_agent.analyze_joke(joke_text, fresh=_wants_fresh(data))
 
         # Si hay joke_id, guardar análisis en BD
         if joke_id and data.get('save', True):
-            analysis_data = {
-                'chiste_id': joke_id,
-                'estructura': analysis.get('estructura'),
-                'tecnicas': analysis.get('tecnicas'),
-                'puntos_fuertes': analysis.get('puntos_fuertes'),
-                'puntos_debiles': analysis.get('puntos_debiles'),
-                'sugerencias': analysis.get('sugerencias'),
-                'puntuacion_estructura': analysis['scores'].get('estructura'),
-                'puntuacion_originalidad': analysis['scores'].get('originalidad'),
-                'puntuacion_timing': analysis['scores'].get('timing'),
-                'puntuacion_general': analysis['scores'].get('general')
-            }
+            analysis_data = _build_analysis_record(joke_id, analysis=analysis, joke_text=joke_text)
             saved_analysis = analysis_repo.create_analysis(analysis_data)
             analysis['id'] = saved_analysis['id']
 
+            # Un análisis forzado sustituye a los anteriores del mismo contenido
+            if force:
+                try:
+                    analysis_repo.collapse_duplicates(joke_id)
+                except Exception as e:
+                    logger.warning(f"Could not collapse analyses for joke {joke_id}: {e}")
+
         return jsonify({
             'success': True,
             'data': analysis
@@ -70,22 +259,262 @@ def analyze_joke():
         }), 500
 
 
-@ai_bp.route('/improve', methods=['POST'])
-def suggest_improvements():
-    """Sugiere mejoras para un chiste"""
+def _run_analyze_full(params: dict, progress=None):
+    """
+    Ejecuta el análisis completo y lo guarda si procede
+
+    Returns:
+        Tupla (payload, status HTTP)
+    """
+    joke_id = params.get('joke_id')
+    result = ai_agent.analyze_full(params['joke_text'], fresh=params.get('fresh', False),
+                                   progress=progress)
+    errors = result.pop('errors')
+
+    if len(errors) == 4:
+        return {
+            'success': False,
+            'error': 'All AI analyses failed',
+            'errors': errors
+        }, 500
+
+    # Persistir todo de una vez
+    if joke_id and params.get('save', True):
+        analysis_data = _build_analysis_record(
+            joke_id,
+            analysis=result['analysis'],
+            concepts=result['concepts'],
+            rupture=result['rupture'],
+            joke_text=params['joke_text']
+        )
+        saved_analysis = analysis_repo.create_analysis(analysis_data)
+        result['analysis_id'] = saved_analysis['id']
+
+        if result['concepts'] and result['concepts'].get('concepto_principal'):
+            jokes_repo.update_joke(joke_id, {
+                'concepto': result['concepts']['concepto_principal']
+            })
+
+    response = {
+        'success': True,
+        'data': result
+    }
+    if errors:
+        response['errors'] = errors
+
+    return response, 200
+
+
+@ai_bp.route('/analyze-full', methods=['POST'])
+def analyze_full():
+    """
+    Análisis completo en paralelo: estructura, conceptos, ruptura y tags
+
+    Obtiene el chiste una sola vez, lanza las cuatro llamadas a la vez y guarda
+    todo en una única fila de analisis_ia (más el concepto en chistes).
+    Con "async": true responde 202 y se ejecuta como trabajo.
+    """
     try:
         data = request.get_json()
 
-        if not data.get('joke_text'):
+        joke_text, joke_id, error = _get_joke_text(data)
+        if error:
+            return error
+
+        params = {
+            'joke_text': joke_text,
+            'joke_id': joke_id,
+            'save': data.get('save', True),
+            'fresh': _wants_fresh(data)
+        }
+        if _wants_async(data):
+            return _enqueue('analyze_full', params)
+
+        payload, status = _run_analyze_full(params)
+        return jsonify(payload), status
+
+    except Exception as e:
+        logger.error(f"Error in full analysis: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def _run_analyze_batch(params: dict, progress=None):
+    """
+    Analiza un lote de chistes y guarda los análisis de los que existen en BD
+
+    Returns:
+        Tupla (payload, status HTTP)
+    """
+    joke_ids = params.get('joke_ids') or []
+    joke_texts = params.get('joke_texts') or []
+
+    # Elementos del lote: (joke_id, joke_text); joke_text None si no existe
+    items = []
+    if joke_ids:
+        jokes_by_id = {j['id']: j for j in jokes_repo.get_jokes_by_ids(joke_ids)}
+        items.extend(
+            (jid, jokes_by_id[jid]['contenido'] if jid in jokes_by_id else None)
+            for jid in joke_ids
+        )
+    items.extend((None, text) for text in joke_texts)
+
+    valid = [(i, text) for i, (_, text) in enumerate(items) if text]
+    analyses = ai_agent.analyze_batch(
+        [text for _, text in valid],
+        concurrency=params.get('concurrency'),
+        fresh=params.get('fresh', False),
+        progress=progress
+    )
+
+    results = [
+        {'index': i, 'joke_id': jid, 'success': False, 'error': 'Joke not found'}
+        for i, (jid, _) in enumerate(items)
+    ]
+    for (i, _), outcome in zip(valid, analyses):
+        results[i].pop('error')
+        results[i].update(outcome)
+
+    # Guardar en bloque los análisis de chistes existentes
+    response = {'success': True}
+    to_save = [r for r in results if r['success'] and r['joke_id']]
+    if to_save and params.get('save', True):
+        try:
+            saved = analysis_repo.create_analyses([
+                _build_analysis_record(r['joke_id'], analysis=r['data'],
+                                       joke_text=items[r['index']][1])
+                for r in to_save
+            ])
+            for r, row in zip(to_save, saved):
+                r['data']['id'] = row['id']
+        except Exception as e:
+            logger.error(f"Error saving batch analyses: {e}")
+            response['save_error'] = str(e)
+
+    succeeded = sum(1 for r in results if r['success'])
+    response.update({
+        'data': results,
+        'count': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded
+    })
+    return response, 200
+
+
+@ai_bp.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analiza muchos chistes en una sola petición
+
+    Body: { "joke_ids": [...] } o { "joke_texts": [...] }, más "concurrency" y
+    "save" opcionales. Cada elemento devuelve su propio success/error.
+    Con "async": true responde 202 y se ejecuta como trabajo.
+    """
+    try:
+        data = request.get_json()
+
+        joke_ids = data.get('joke_ids') or []
+        joke_texts = data.get('joke_texts') or []
+
+        if not joke_ids and not joke_texts:
             return jsonify({
                 'success': False,
-                'error': 'joke_text is required'
+                'error': 'Either joke_ids or joke_texts is required'
             }), 400
 
-        joke_text = data['joke_text']
+        if len(joke_ids) + len(joke_texts) > config.AI_BATCH_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large (max {config.AI_BATCH_MAX_ITEMS} items)'
+            }), 400
+
+        concurrency = data.get('concurrency')
+        if concurrency is not None:
+            try:
+                concurrency = int(concurrency)
+            except (TypeError, ValueError):
+                concurrency = 0
+            if concurrency < 1:
+                return jsonify({
+                    'success': False,
+                    'error': 'concurrency must be a positive integer'
+                }), 400
+
+        params = {
+            'joke_ids': joke_ids,
+            'joke_texts': joke_texts,
+            'concurrency': concurrency,
+            'save': data.get('save', True),
+            'fresh': _wants_fresh(data)
+        }
+        if _wants_async(data):
+            return _enqueue('analyze_batch', params)
+
+        payload, status = _run_analyze_batch(params)
+        return jsonify(payload), status
+
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def _stored_analysis(joke_id: str, joke_text: str):
+    """
+    Último análisis completo guardado de un chiste, si sigue siendo del texto actual
+
+    Returns:
+        Dict con la forma de analyze_joke o None
+    """
+    latest = analysis_repo.get_latest_analysis(joke_id)
+    if not latest or latest.get('puntuacion_general') is None:
+        return None
+
+    # Los análisis sin huella son anteriores a la columna: se aceptan tal cual
+    fingerprint = latest.get('huella_contenido')
+    if fingerprint and fingerprint != content_fingerprint(joke_text):
+        return None
+
+    return _analysis_from_record(latest)
+
+
+@ai_bp.route('/improve', methods=['POST'])
+def suggest_improvements():
+    """
+    Sugiere mejoras para un chiste
+
+    Con joke_id usa el último análisis guardado del chiste; solo si no hay
+    ninguno (o el texto ha cambiado) lo genera y lo guarda, de modo que la
+    petición hace normalmente una única llamada a la IA.
+    """
+    try:
+        data = request.get_json()
+
+        joke_text, joke_id, error = _get_joke_text(data)
+        if error:
+            return error
+
         analysis = data.get('analysis')  # Análisis previo (opcional)
+        fresh = _wants_fresh(data)
+
+        if not analysis and joke_id and not _wants_force(data):
+            analysis = _stored_analysis(joke_id, joke_text)
 
-        improvements = ai_agent.suggest_improvements(joke_text, analysis)
+        if not analysis:
+            analysis = ai_agent.analyze_joke(joke_text, fresh=fresh)
+            if joke_id and data.get('save', True):
+                saved_analysis = analysis_repo.create_analysis(
+                    _build_analysis_record(joke_id, analysis=analysis, joke_text=joke_text)
+                )
+                analysis['id'] = saved_analysis['id']
+
+        improvements = ai_agent.suggest_improvements(joke_text, analysis, fresh=fresh)
+        if analysis.get('id'):
+            improvements['analysis_id'] = analysis['id']
 
         return jsonify({
             'success': True,
@@ -115,7 +544,9 @@ def generate_variations():
         joke_text = data['joke_text']
         num_variations = data.get('num_variations', 3)
 
-        variations = ai_agent.generate_variations(joke_text, num_variations)
+        variations = ai_agent.generate_variations(
+            joke_text, num_variations, fresh=_wants_fresh(data)
+        )
 
         return jsonify({
             'success': True,
@@ -130,6 +561,24 @@ def generate_variations():
         }), 500
 
 
+@ai_bp.route('/variations/stream', methods=['POST'])
+def stream_variations():
+    """Genera variaciones de un chiste emitiendo cada una por SSE al completarse"""
+    data = request.get_json()
+
+    if not data.get('joke_text'):
+        return jsonify({
+            'success': False,
+            'error': 'joke_text is required'
+        }), 400
+
+    return _sse_response(ai_agent.stream_variations(
+        data['joke_text'],
+        data.get('num_variations', 3),
+        fresh=_wants_fresh(data)
+    ))
+
+
 @ai_bp.route('/brainstorm', methods=['POST'])
 def brainstorm_ideas():
     """Genera ideas de chistes sobre un tema"""
@@ -146,7 +595,7 @@ def brainstorm_ideas():
         style = data.get('style', 'observacional')
         num_ideas = data.get('num_ideas', 5)
 
-        ideas = ai_agent.brainstorm_ideas(topic, style, num_ideas)
+        ideas = ai_agent.brainstorm_ideas(topic, style, num_ideas, fresh=_wants_fresh(data))
 
         return jsonify({
             'success': True,
@@ -161,9 +610,59 @@ def brainstorm_ideas():
         }), 500
 
 
+@ai_bp.route('/brainstorm/stream', methods=['POST'])
+def stream_brainstorm():
+    """Genera ideas sobre un tema emitiendo cada una por SSE al completarse"""
+    data = request.get_json()
+
+    if not data.get('topic'):
+        return jsonify({
+            'success': False,
+            'error': 'topic is required'
+        }), 400
+
+    return _sse_response(ai_agent.stream_brainstorm(
+        data['topic'],
+        data.get('style', 'observacional'),
+        data.get('num_ideas', 5),
+        fresh=_wants_fresh(data)
+    ))
+
+
+def _run_identify_patterns(params: dict, progress=None):
+    """
+    Identifica patrones en los chistes indicados por ID o por texto
+
+    Returns:
+        Tupla (payload, status HTTP)
+    """
+    if params.get('joke_ids'):
+        jokes = jokes_repo.get_jokes_by_ids(params['joke_ids'])
+    else:
+        jokes = params['jokes']
+
+    if len(jokes) < 2:
+        return {
+            'success': False,
+            'error': 'At least 2 jokes are required for pattern analysis'
+        }, 400
+
+    patterns = ai_agent.identify_patterns(jokes, fresh=params.get('fresh', False),
+                                          progress=progress)
+
+    return {
+        'success': True,
+        'data': patterns
+    }, 200
+
+
 @ai_bp.route('/patterns', methods=['POST'])
 def identify_patterns():
-    """Identifica patrones en una colección de chistes"""
+    """
+    Identifica patrones en una colección de chistes
+
+    Con "async": true responde 202 y se ejecuta como trabajo.
+    """
     try:
         data = request.get_json()
 
@@ -173,55 +672,114 @@ def identify_patterns():
                 'error': 'Either joke_ids or jokes array is required'
             }), 400
 
-        # Obtener chistes
-        if data.get('joke_ids'):
-            jokes = [jokes_repo.get_joke(jid) for jid in data['joke_ids']]
-            jokes = [j for j in jokes if j]  # Filtrar None
-        else:
-            jokes = data['jokes']
+        params = {
+            'joke_ids': data.get('joke_ids'),
+            'jokes': data.get('jokes'),
+            'fresh': _wants_fresh(data)
+        }
+        if _wants_async(data):
+            return _enqueue('identify_patterns', params)
 
-        if len(jokes) < 2:
+        payload, status = _run_identify_patterns(params)
+        return jsonify(payload), status
+
+    except Exception as e:
+        logger.error(f"Error identifying patterns: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_bp.route('/tags', methods=['POST'])
+def suggest_tags():
+    """
+    Sugiere tags para un chiste
+
+    Primero con el clasificador local; solo si no hay modelo o su confianza
+    no llega a TAG_CLASSIFIER_THRESHOLD se pregunta a Gemini.
+    Body: { "joke_text": "...", "source": "ai" (opcional, fuerza Gemini) }
+    """
+    try:
+        data = request.get_json()
+
+        if not data.get('joke_text'):
             return jsonify({
                 'success': False,
-                'error': 'At least 2 jokes are required for pattern analysis'
+                'error': 'joke_text is required'
             }), 400
 
-        patterns = ai_agent.identify_patterns(jokes)
+        prediction = None
+        if tag_classifier and data.get('source') != 'ai' and not _wants_fresh(data):
+            try:
+                prediction = tag_classifier.predict(data['joke_text'])
+            except Exception as e:
+                logger.warning(f"Tag classifier failed, asking the model: {e}")
+
+        if prediction and prediction['confident']:
+            return jsonify({
+                'success': True,
+                'data': prediction['tags'],
+                'source': 'classifier',
+                'confidence': prediction['confidence']
+            }), 200
+
+        tags = ai_agent.suggest_tags(data['joke_text'], fresh=_wants_fresh(data))
 
         return jsonify({
             'success': True,
-            'data': patterns
+            'data': tags,
+            'source': 'ai',
+            'confidence': prediction['confidence'] if prediction else None
         }), 200
 
     except Exception as e:
-        logger.error(f"Error identifying patterns: {e}")
+        logger.error(f"Error suggesting tags: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
-@ai_bp.route('/tags', methods=['POST'])
-def suggest_tags():
-    """Sugiere tags para un chiste"""
+@ai_bp.route('/tags/accept', methods=['POST'])
+def accept_tags():
+    """
+    Guarda los tags aceptados de un chiste en chistes_tags (datos de entreno
+    del clasificador local)
+    Body: { "joke_id": "uuid", "tags": {"tema": ["familia"], "tecnica": [...], ...} }
+    """
     try:
         data = request.get_json()
 
-        if not data.get('joke_text'):
+        if not data.get('joke_id') or not isinstance(data.get('tags'), dict):
             return jsonify({
                 'success': False,
-                'error': 'joke_text is required'
+                'error': 'joke_id and tags are required'
             }), 400
 
-        tags = ai_agent.suggest_tags(data['joke_text'])
+        vocabulary = {(tag['categoria'], tag['nombre']): tag['id'] for tag in tags_repo.get_all_tags()}
+
+        accepted, unknown = [], []
+        for category, names in data['tags'].items():
+            for name in names or []:
+                tag_id = vocabulary.get((category, name))
+                if tag_id and category in TAG_CATEGORIES:
+                    accepted.append(tag_id)
+                else:
+                    unknown.append(f"{category}/{name}")
+
+        tags_repo.assign_tags(data['joke_id'], accepted)
 
         return jsonify({
             'success': True,
-            'data': tags
+            'data': {
+                'assigned': len(accepted),
+                'unknown': unknown
+            }
         }), 200
 
     except Exception as e:
-        logger.error(f"Error suggesting tags: {e}")
+        logger.error(f"Error accepting tags: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -255,7 +813,7 @@ def analyze_concepts():
             joke_id = None
 
         # Analizar conceptos con IA
-        concepts = ai_agent.analyze_concepts(joke_text)
+        concepts = ai_agent.analyze_concepts(joke_text, fresh=_wants_fresh(data))
 
         # Si hay joke_id y se debe guardar, actualizar análisis existente
         if joke_id and data.get('save', True):
@@ -276,12 +834,7 @@ def analyze_concepts():
                 })
             else:
                 # Crear nuevo análisis con solo información de conceptos
-                analysis_data = {
-                    'chiste_id': joke_id,
-                    'tipo_concepto': concepts.get('tipo_concepto'),
-                    'explicacion_tipo_concepto': concepts.get('explicacion_tipo'),
-                    'mapa_conceptos': concepts.get('mapa_conceptos')
-                }
+                analysis_data = _build_analysis_record(joke_id, concepts=concepts)
                 analysis_repo.create_analysis(analysis_data)
 
                 # Actualizar el chiste
@@ -329,7 +882,7 @@ def analyze_rupture():
             joke_id = None
 
         # Analizar ruptura con IA
-        rupture = ai_agent.analyze_rupture(joke_text)
+        rupture = ai_agent.analyze_rupture(joke_text, fresh=_wants_fresh(data))
 
         # Si hay joke_id y se debe guardar, actualizar análisis existente
         if joke_id and data.get('save', True):
@@ -345,12 +898,7 @@ def analyze_rupture():
                 }).eq('id', latest_analysis['id']).execute()
             else:
                 # Crear nuevo análisis con solo información de ruptura
-                analysis_data = {
-                    'chiste_id': joke_id,
-                    'tipo_ruptura': rupture.get('tipo_ruptura'),
-                    'subtipo_ruptura': rupture.get('subtipo_ruptura'),
-                    'explicacion_ruptura': rupture.get('explicacion_ruptura')
-                }
+                analysis_data = _build_analysis_record(joke_id, rupture=rupture)
                 analysis_repo.create_analysis(analysis_data)
 
         return jsonify({
@@ -364,3 +912,117 @@ def analyze_rupture():
             'success': False,
             'error': str(e)
         }), 500
+
+
+@ai_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Aciertos/fallos de la caché de IA y llamadas coalescidas de este worker"""
+    try:
+        stats = ai_agent.get_cache_stats() if ai_agent else {'enabled': False}
+
+        return jsonify({
+            'success': True,
+            'data': stats
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting AI cache stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_bp.route('/stats', methods=['GET'])
+def ai_stats():
+    """
+    Métricas por método del agente: histograma de latencia, p50/p95, espera en
+    cola, tokens, coste estimado, reparaciones/fallos del JSON y caché
+    """
+    try:
+        if not ai_agent:
+            return jsonify({
+                'success': True,
+                'data': {'enabled': False}
+            }), 200
+
+        metrics = ai_agent.metrics.get_stats() if ai_agent.metrics else {}
+        return jsonify({
+            'success': True,
+            'data': {
+                'enabled': ai_agent.metrics is not None,
+                **metrics,
+                'routes': ai_agent.get_route_stats(),
+                'tag_classifier': tag_classifier.get_stats() if tag_classifier.initialized else None
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting AI stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_bp.route('/routes/stats', methods=['GET'])
+def route_stats():
+    """Modelo, generation config, latencia y tokens por tarea"""
+    try:
+        stats = ai_agent.get_route_stats() if ai_agent else {}
+
+        return jsonify({
+            'success': True,
+            'data': stats
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting AI route stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_bp.route('/resilience/stats', methods=['GET'])
+def resilience_stats():
+    """Timeouts, reintentos, hedging, latencias por tarea y circuit breaker"""
+    try:
+        stats = ai_agent.get_resilience_stats() if ai_agent else {'enabled': False}
+
+        return jsonify({
+            'success': True,
+            'data': stats
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting AI resilience stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_bp.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """Profundidad de cola, tiempos de espera y cuota disponible de Gemini"""
+    try:
+        stats = ai_agent.get_scheduler_stats() if ai_agent else {'enabled': False}
+
+        return jsonify({
+            'success': True,
+            'data': stats
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting AI scheduler stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+# Operaciones que pueden ejecutarse como trabajos en segundo plano
+register_handler('analyze_full', _job_handler(_run_analyze_full))
+register_handler('analyze_batch', _job_handler(_run_analyze_batch))
+register_handler('identify_patterns', _job_handler(_run_identify_patterns))
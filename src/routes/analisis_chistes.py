@@ -3,6 +3,9 @@ Rutas para gestión de análisis de chistes de otros comediantes
 """
 from flask import Blueprint, request, jsonify
 from src.services.supabase_client import analisis_chistes_repo
+from src.services.similarity_index import analisis_index
+from src.services import text_indexes
+from src.utils.pagination import page_args, parse_limit, split_page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,9 +15,18 @@ analisis_chistes_bp = Blueprint('analisis_chistes', __name__)
 
 @analisis_chistes_bp.route('/', methods=['GET'])
 def get_all_analisis():
-    """Obtiene todos los análisis con filtros opcionales"""
+    """
+    Obtiene una página de análisis con filtros opcionales
+
+    Query params: limit (tamaño de página), cursor (el next_cursor de la
+    respuesta anterior; null en la última página) y fields (columnas separadas
+    por comas o "summary"; por defecto todas).
+    """
     try:
-        filters = {}
+        limit, after = page_args(request.args)
+        filters = {'limit': limit + 1}
+        if after:
+            filters['after'] = after
 
         # Obtener parámetros de query
         if request.args.get('comediante'):
@@ -23,17 +35,22 @@ def get_all_analisis():
             filters['concepto_categoria'] = request.args.get('concepto_categoria')
         if request.args.get('perspectiva_categoria'):
             filters['perspectiva_categoria'] = request.args.get('perspectiva_categoria')
-        if request.args.get('limit'):
-            filters['limit'] = int(request.args.get('limit'))
 
-        analisis_list = analisis_chistes_repo.get_all_analisis(filters if filters else None)
+        analisis_list = analisis_chistes_repo.get_all_analisis(filters, request.args.get('fields'))
+        analisis_list, next_cursor = split_page(analisis_list, limit, 'fecha_creacion')
 
         return jsonify({
             'success': True,
             'data': analisis_list,
-            'count': len(analisis_list)
+            'count': len(analisis_list),
+            'next_cursor': next_cursor
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error getting análisis: {e}")
         return jsonify({
@@ -82,6 +99,7 @@ def create_analisis():
 
         # Crear el análisis
         analisis = analisis_chistes_repo.create_analisis(data)
+        text_indexes.on_analisis_saved(analisis)
 
         return jsonify({
             'success': True,
@@ -113,6 +131,7 @@ def update_analisis(analisis_id):
 
         # Actualizar
         analisis = analisis_chistes_repo.update_analisis(analisis_id, data)
+        text_indexes.on_analisis_saved(analisis)
 
         return jsonify({
             'success': True,
@@ -142,6 +161,7 @@ def delete_analisis(analisis_id):
 
         # Eliminar (soft delete)
         analisis_chistes_repo.delete_analisis(analisis_id, soft_delete=True)
+        text_indexes.on_analisis_deleted(analisis_id)
 
         return jsonify({
             'success': True,
@@ -158,22 +178,38 @@ def delete_analisis(analisis_id):
 
 @analisis_chistes_bp.route('/similar', methods=['POST'])
 def search_similar():
-    """Busca análisis similares basados en categorías"""
+    """
+    Busca análisis similares basados en categorías
+    Con "texto" en el body se ordenan por parecido del texto (índice vectorial)
+    """
     try:
         data = request.get_json()
 
         concepto_categoria = data.get('concepto_categoria')
         perspectiva_categoria = data.get('perspectiva_categoria')
         formulacion_categoria = data.get('formulacion_categoria')
-        limit = data.get('limit', 10)
-
-        # Buscar similares
-        similar = analisis_chistes_repo.search_similar(
-            concepto_categoria=concepto_categoria,
-            perspectiva_categoria=perspectiva_categoria,
-            formulacion_categoria=formulacion_categoria,
-            limit=limit
-        )
+        try:
+            limit = parse_limit(data.get('limit'), default=10, maximum=50)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        if data.get('texto') and analisis_index:
+            hits = analisis_index.query(data['texto'], k=limit)
+            rows = {a['id']: a for a in analisis_chistes_repo.get_analisis_by_ids(
+                [hit['id'] for hit in hits])}
+            similar = [{**rows[hit['id']], 'similarity': hit['score']}
+                       for hit in hits if hit['id'] in rows]
+        else:
+            # Buscar similares
+            similar = analisis_chistes_repo.search_similar(
+                concepto_categoria=concepto_categoria,
+                perspectiva_categoria=perspectiva_categoria,
+                formulacion_categoria=formulacion_categoria,
+                limit=limit
+            )
 
         return jsonify({
             'success': True,
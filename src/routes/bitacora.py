@@ -3,6 +3,9 @@ Rutas para funcionalidades de bitácora/diario
 """
 from flask import Blueprint, request, jsonify
 from src.services.supabase_client import bitacora_repo
+from src.services.duplicate_index import possible_duplicates
+from src.services import text_indexes
+from src.utils.pagination import page_args, split_page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,9 +15,18 @@ bitacora_bp = Blueprint('bitacora', __name__, url_prefix='/api/bitacora')
 
 @bitacora_bp.route('/', methods=['GET'])
 def get_entries():
-    """Obtiene todas las entradas de bitácora con filtros opcionales"""
+    """
+    Obtiene una página de entradas de bitácora con filtros opcionales
+
+    Query params: limit (tamaño de página), cursor (el next_cursor de la
+    respuesta anterior; null en la última página) y fields (columnas separadas
+    por comas o "summary"; por defecto todas).
+    """
     try:
-        filters = {}
+        limit, after = page_args(request.args)
+        filters = {'limit': limit + 1}
+        if after:
+            filters['after'] = after
 
         # Filtros opcionales
         if request.args.get('tipo'):
@@ -23,17 +35,21 @@ def get_entries():
         if request.args.get('chiste_relacionado_id'):
             filters['chiste_relacionado_id'] = request.args.get('chiste_relacionado_id')
 
-        if request.args.get('limit'):
-            filters['limit'] = int(request.args.get('limit'))
-
-        entries = bitacora_repo.get_all_entries(filters)
+        entries = bitacora_repo.get_all_entries(filters, request.args.get('fields'))
+        entries, next_cursor = split_page(entries, limit, 'fecha')
 
         return jsonify({
             'success': True,
             'data': entries,
-            'count': len(entries)
+            'count': len(entries),
+            'next_cursor': next_cursor
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error getting bitácora entries: {e}")
         return jsonify({
@@ -93,11 +109,20 @@ def create_entry():
 
         # Crear entrada
         entry = bitacora_repo.create_entry(entry_data)
+        text_indexes.on_bitacora_saved(entry)
 
-        return jsonify({
+        response = {
             'success': True,
             'data': entry
-        }), 201
+        }
+        if entry.get('tipo') == 'idea':
+            duplicates = possible_duplicates(entry['id'], entry['contenido'])
+            if duplicates:
+                response['possible_duplicates'] = duplicates
+            elif duplicates is None:
+                # Índice aún cargándose (o fallo al consultarlo): no se ha comprobado
+                response['duplicate_check'] = 'skipped'
+        return jsonify(response), 201
 
     except Exception as e:
         logger.error(f"Error creating bitácora entry: {e}")
@@ -137,6 +162,7 @@ def update_entry(entry_id):
 
         # Actualizar entrada
         updated_entry = bitacora_repo.update_entry(entry_id, updates)
+        text_indexes.on_bitacora_saved(updated_entry)
 
         return jsonify({
             'success': True,
@@ -165,6 +191,7 @@ def delete_entry(entry_id):
 
         # Eliminar (soft delete)
         bitacora_repo.delete_entry(entry_id, soft_delete=True)
+        text_indexes.on_bitacora_deleted(entry_id)
 
         return jsonify({
             'success': True,
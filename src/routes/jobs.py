@@ -0,0 +1,111 @@
+"""
+Rutas para consultar trabajos en segundo plano
+"""
+from flask import Blueprint, jsonify
+from src.services.job_queue import job_queue, FINISHED_STATUSES
+from src.utils.sse import sse_event, sse_response
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+# Frecuencia de consulta del estado y duración máxima del stream de progreso.
+# Cada stream abierto ocupa uno de los hilos de gunicorn (--threads 8), así que
+# se corta muy por debajo de su --timeout 120 y el cliente vuelve a conectar
+POLL_INTERVAL = 0.5  # segundos
+STREAM_MAX_DURATION = 45  # segundos
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Estado, progreso y resultado de un trabajo"""
+    try:
+        job = job_queue.get(job_id)
+
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': job
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """
+    Progreso de un trabajo por SSE
+
+    Emite 'progress' cada vez que cambia el estado o el progreso y 'done' con
+    el trabajo completo (resultado o error) al terminar. Si el trabajo sigue en
+    curso pasados STREAM_MAX_DURATION segundos emite 'timeout' y cierra: el
+    cliente vuelve a conectar (EventSource lo hace solo) o consulta
+    GET /api/jobs/<id>.
+    """
+    if not job_queue.get(job_id):
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+
+    def generate():
+        last = None
+        deadline = time.monotonic() + STREAM_MAX_DURATION
+        try:
+            while time.monotonic() < deadline:
+                job = job_queue.get(job_id)
+                if not job:
+                    yield sse_event('error', {'error': 'Job not found'})
+                    return
+
+                if job['status'] in FINISHED_STATUSES:
+                    yield sse_event('done', job)
+                    return
+
+                current = (job['status'], job['progress']['done'], job['progress']['total'])
+                if current != last:
+                    last = current
+                    yield sse_event('progress', {
+                        'status': job['status'],
+                        'progress': job['progress']
+                    })
+                time.sleep(POLL_INTERVAL)
+
+            yield sse_event('timeout', {
+                'status': last[0] if last else None,
+                'reconnect': True
+            })
+        except Exception as e:
+            logger.error(f"Error streaming job {job_id}: {e}")
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(generate())
+
+
+@jobs_bp.route('/stats', methods=['GET'])
+def job_stats():
+    """Trabajos por estado"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': job_queue.get_stats()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting job stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -2,9 +2,14 @@
 Rutas para gestión de chistes (CRUD)
 """
 from flask import Blueprint, request, jsonify
-from src.services.supabase_client import jokes_repo, analisis_chistes_repo
+from src.services.supabase_client import jokes_repo, analisis_chistes_repo, bitacora_repo
 from src.services.ai_agent import ai_agent
+from src.services.similarity_index import jokes_index, analisis_index
+from src.services.duplicate_index import duplicate_index, possible_duplicates, KIND_IDEA
+from src.services import text_indexes
+from src.utils.pagination import page_args, parse_limit, split_page
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -13,9 +18,18 @@ jokes_bp = Blueprint('jokes', __name__, url_prefix='/api/jokes')
 
 @jokes_bp.route('/', methods=['GET'])
 def get_all_jokes():
-    """Obtiene todos los chistes con filtros opcionales"""
+    """
+    Obtiene una página de chistes con filtros opcionales
+
+    Query params: limit (tamaño de página), cursor (el next_cursor de la
+    respuesta anterior; null en la última página) y fields (columnas separadas
+    por comas o "summary"; por defecto todas).
+    """
     try:
-        filters = {}
+        limit, after = page_args(request.args)
+        filters = {'limit': limit + 1}
+        if after:
+            filters['after'] = after
 
         # Filtros opcionales
         if request.args.get('estado'):
@@ -23,14 +37,21 @@ def get_all_jokes():
         if request.args.get('calificacion_min'):
             filters['calificacion_min'] = int(request.args.get('calificacion_min'))
 
-        jokes = jokes_repo.get_all_jokes(filters)
+        jokes = jokes_repo.get_all_jokes(filters, request.args.get('fields'))
+        jokes, next_cursor = split_page(jokes, limit, 'fecha_creacion')
 
         return jsonify({
             'success': True,
             'data': jokes,
-            'count': len(jokes)
+            'count': len(jokes),
+            'next_cursor': next_cursor
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error getting jokes: {e}")
         return jsonify({
@@ -88,6 +109,8 @@ def create_joke():
 
         # Crear chiste
         joke = jokes_repo.create_joke(joke_data)
+        text_indexes.on_joke_saved(joke)
+        duplicates = possible_duplicates(joke['id'], joke['contenido'])
 
         # Auto-analizar con IA si está disponible
         if ai_agent and data.get('auto_analyze', False):
@@ -115,10 +138,16 @@ def create_joke():
             except Exception as e:
                 logger.warning(f"Auto-analysis failed: {e}")
 
-        return jsonify({
+        response = {
             'success': True,
             'data': joke
-        }), 201
+        }
+        if duplicates:
+            response['possible_duplicates'] = duplicates
+        elif duplicates is None:
+            # Índice aún cargándose (o fallo al consultarlo): no se ha comprobado
+            response['duplicate_check'] = 'skipped'
+        return jsonify(response), 201
 
     except Exception as e:
         logger.error(f"Error creating joke: {e}")
@@ -147,6 +176,7 @@ def update_joke(joke_id):
             }), 400
 
         joke = jokes_repo.update_joke(joke_id, updates)
+        text_indexes.on_joke_saved(joke)
 
         return jsonify({
             'success': True,
@@ -167,6 +197,7 @@ def delete_joke(joke_id):
     try:
         soft_delete = request.args.get('soft', 'true').lower() == 'true'
         jokes_repo.delete_joke(joke_id, soft_delete=soft_delete)
+        text_indexes.on_joke_deleted(joke_id)
 
         return jsonify({
             'success': True,
@@ -201,14 +232,159 @@ def mark_as_used(joke_id):
         }), 500
 
 
+@jokes_bp.route('/<joke_id>/similar', methods=['GET'])
+def get_similar(joke_id):
+    """
+    Chistes propios y análisis de referencia más parecidos a un chiste
+    Query: ?k=10
+    """
+    try:
+        if not jokes_index:
+            return jsonify({
+                'success': False,
+                'error': 'Similarity index is disabled'
+            }), 503
+
+        joke = jokes_repo.get_joke(joke_id)
+        if not joke:
+            return jsonify({
+                'success': False,
+                'error': 'Joke not found'
+            }), 404
+
+        try:
+            k = parse_limit(request.args.get('k'), default=10, maximum=50)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'k must be an integer'
+            }), 400
+        start = time.perf_counter()
+
+        jokes = jokes_index.query_id(joke_id, k=k)
+        if jokes is None:
+            # Aún no indexado (p.ej. creado en otro worker desde la última carga)
+            text_indexes.on_joke_saved(joke)
+            jokes = jokes_index.query(joke['contenido'], k=k, exclude=joke_id)
+        analisis = analisis_index.query(joke['contenido'], k=k)
+        took_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # Completar con los datos de cada fila, conservando el orden por score
+        joke_rows = {j['id']: j for j in jokes_repo.get_jokes_by_ids([hit['id'] for hit in jokes])}
+        analisis_rows = {a['id']: a for a in analisis_chistes_repo.get_analisis_by_ids(
+            [hit['id'] for hit in analisis])}
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'jokes': [{**joke_rows[hit['id']], 'similarity': hit['score']}
+                          for hit in jokes if hit['id'] in joke_rows],
+                'analisis': [{**analisis_rows[hit['id']], 'similarity': hit['score']}
+                             for hit in analisis if hit['id'] in analisis_rows],
+            },
+            'took_ms': took_ms
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error finding jokes similar to {joke_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@jokes_bp.route('/<joke_id>/duplicates', methods=['GET'])
+def get_duplicates(joke_id):
+    """
+    Chistes e ideas de la bitácora casi iguales a un chiste (MinHash + LSH)
+    Query: ?threshold=0.5 (Jaccard estimado mínimo)
+    """
+    try:
+        if not duplicate_index:
+            return jsonify({
+                'success': False,
+                'error': 'Duplicate detection is disabled'
+            }), 503
+
+        joke = jokes_repo.get_joke(joke_id)
+        if not joke:
+            return jsonify({
+                'success': False,
+                'error': 'Joke not found'
+            }), 404
+
+        threshold = request.args.get('threshold', type=float)
+        start = time.perf_counter()
+
+        found = duplicate_index.query_id(joke_id, threshold=threshold)
+        if found is None:
+            # Aún no indexado (p.ej. creado en otro worker desde la última carga)
+            text_indexes.on_joke_saved(joke)
+            found = duplicate_index.query(joke['contenido'], exclude=joke_id, threshold=threshold)
+        took_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # Completar con los datos de cada fila, conservando el orden por parecido
+        idea_ids = [d['id'] for d in found if d['kind'] == KIND_IDEA]
+        joke_ids = [d['id'] for d in found if d['kind'] != KIND_IDEA]
+        rows = {row['id']: row for row in jokes_repo.get_jokes_by_ids(joke_ids)}
+        rows.update({row['id']: row for row in bitacora_repo.get_entries_by_ids(idea_ids)})
+
+        duplicates = [{**rows[d['id']], 'kind': d['kind'], 'similarity': d['similarity']}
+                      for d in found if d['id'] in rows]
+
+        return jsonify({
+            'success': True,
+            'data': duplicates,
+            'count': len(duplicates),
+            'threshold': duplicate_index.threshold if threshold is None else threshold,
+            'took_ms': took_ms
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error finding duplicates of joke {joke_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def _category_matches(analisis, concepto_categoria, perspectiva_categoria, formulacion_categoria):
+    """Puntuación por categorías coincidentes (concepto 3, perspectiva 2, formulación 1)"""
+    score = 0
+    matches = {
+        'concepto': False,
+        'perspectiva': False,
+        'formulacion': False
+    }
+
+    if concepto_categoria and analisis.get('concepto_categoria') == concepto_categoria:
+        score += 3
+        matches['concepto'] = True
+    if perspectiva_categoria and analisis.get('perspectiva_categoria') == perspectiva_categoria:
+        score += 2
+        matches['perspectiva'] = True
+    if formulacion_categoria and analisis.get('formulacion_categoria') == formulacion_categoria:
+        score += 1
+        matches['formulacion'] = True
+
+    return score, matches
+
+
 @jokes_bp.route('/comparar', methods=['POST'])
 def comparar_con_analisis():
     """
     Compara un chiste con análisis guardados para encontrar estructuras similares
-    Body: { "joke_id": "uuid" } o { "concepto_categoria": "...", "perspectiva_categoria": "...", ... }
+    Body: { "joke_id": "uuid" }, { "texto": "..." } o
+          { "concepto_categoria": "...", "perspectiva_categoria": "...", ... }
+
+    Con texto (el del chiste o el recibido) se buscan los análisis más parecidos
+    en el índice vectorial; las categorías solo desempatan. Sin texto, o sin
+    índice, se filtra por categorías exactas.
     """
     try:
         data = request.get_json()
+        limit = data.get('limit', 10)
+        text = data.get('texto')
 
         # Si se proporciona joke_id, obtener sus categorías
         if data.get('joke_id'):
@@ -219,6 +395,7 @@ def comparar_con_analisis():
                     'error': 'Chiste no encontrado'
                 }), 404
 
+            text = joke.get('contenido')
             concepto_categoria = joke.get('concepto_categoria')
             perspectiva_categoria = joke.get('perspectiva_categoria')
             formulacion_categoria = joke.get('formulacion_categoria')
@@ -228,47 +405,51 @@ def comparar_con_analisis():
             perspectiva_categoria = data.get('perspectiva_categoria')
             formulacion_categoria = data.get('formulacion_categoria')
 
-        # Buscar análisis similares
-        similares = analisis_chistes_repo.search_similar(
-            concepto_categoria=concepto_categoria,
-            perspectiva_categoria=perspectiva_categoria,
-            formulacion_categoria=formulacion_categoria,
-            limit=data.get('limit', 10)
-        )
+        hits = None
+        if text and analisis_index:
+            try:
+                hits = analisis_index.query(text, k=limit)
+            except Exception as e:
+                logger.warning(f"Vector search unavailable, comparing by categories: {e}")
+
+        if hits is not None:
+            scores = {hit['id']: hit['score'] for hit in hits}
+            similares = analisis_chistes_repo.get_analisis_by_ids(list(scores))
+            method = 'vector'
+        else:
+            # Buscar análisis similares
+            similares = analisis_chistes_repo.search_similar(
+                concepto_categoria=concepto_categoria,
+                perspectiva_categoria=perspectiva_categoria,
+                formulacion_categoria=formulacion_categoria,
+                limit=limit
+            )
+            scores = {}
+            method = 'categories'
 
         # Calcular score de similitud para cada resultado
         results_with_score = []
         for analisis in similares:
-            score = 0
-            matches = {
-                'concepto': False,
-                'perspectiva': False,
-                'formulacion': False
-            }
-
-            if concepto_categoria and analisis.get('concepto_categoria') == concepto_categoria:
-                score += 3
-                matches['concepto'] = True
-            if perspectiva_categoria and analisis.get('perspectiva_categoria') == perspectiva_categoria:
-                score += 2
-                matches['perspectiva'] = True
-            if formulacion_categoria and analisis.get('formulacion_categoria') == formulacion_categoria:
-                score += 1
-                matches['formulacion'] = True
-
+            score, matches = _category_matches(
+                analisis, concepto_categoria, perspectiva_categoria, formulacion_categoria
+            )
             results_with_score.append({
                 **analisis,
                 'similarity_score': score,
+                'vector_score': scores.get(analisis['id']),
                 'matches': matches
             })
 
-        # Ordenar por score
-        results_with_score.sort(key=lambda x: x['similarity_score'], reverse=True)
+        # Ordenar por similitud de texto y, a igualdad, por categorías
+        results_with_score.sort(
+            key=lambda x: (x['vector_score'] or 0, x['similarity_score']), reverse=True
+        )
 
         return jsonify({
             'success': True,
             'data': results_with_score,
             'count': len(results_with_score),
+            'method': method,
             'search_criteria': {
                 'concepto_categoria': concepto_categoria,
                 'perspectiva_categoria': perspectiva_categoria,
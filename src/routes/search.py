@@ -0,0 +1,101 @@
+"""
+Rutas de búsqueda de texto completo (chistes, bitácora y análisis de referencia)
+"""
+from flask import Blueprint, request, jsonify
+from src.services.search_index import search_index, KIND_JOKE, KIND_BITACORA, KIND_ANALISIS
+from src.services.similarity_index import jokes_index, analisis_index
+from src.services.duplicate_index import duplicate_index
+from src.utils.pagination import parse_limit
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__, url_prefix='/api/search')
+
+KINDS = (KIND_JOKE, KIND_BITACORA, KIND_ANALISIS)
+
+
+@search_bp.route('/', methods=['GET'])
+def search():
+    """
+    Busca en chistes, bitácora y análisis con ranking BM25
+    Query: ?q=texto&kind=chiste,bitacora,analisis&limit=20
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': 'q is required'
+            }), 400
+
+        if not search_index:
+            return jsonify({
+                'success': False,
+                'error': 'Search is disabled'
+            }), 503
+
+        kinds = [k.strip() for k in request.args.get('kind', '').split(',') if k.strip()]
+        invalid = [k for k in kinds if k not in KINDS]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid kind: {', '.join(invalid)} (use {', '.join(KINDS)})"
+            }), 400
+
+        try:
+            limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        start = time.perf_counter()
+        found = search_index.search(query, kinds=kinds or None, limit=limit)
+        took_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        return jsonify({
+            'success': True,
+            'data': found['results'],
+            'count': len(found['results']),
+            'total': found['total'],
+            'query': query,
+            'took_ms': took_ms
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error searching '{request.args.get('q')}': {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@search_bp.route('/stats', methods=['GET'])
+def get_index_stats():
+    """Tamaño, antigüedad y latencia de los índices en memoria de este worker"""
+    try:
+        indexes = {}
+        for name, index in (('search', search_index), ('jokes_similarity', jokes_index),
+                            ('analisis_similarity', analisis_index),
+                            ('duplicates', duplicate_index)):
+            if not index:
+                indexes[name] = {'enabled': False}
+            elif not index.initialized:
+                indexes[name] = {'enabled': True, 'loaded': False}
+            else:
+                indexes[name] = {'enabled': True, **index.get_stats()}
+
+        return jsonify({
+            'success': True,
+            'data': indexes
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting index stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -1,36 +1,102 @@
 """
 Agente de IA para análisis de chistes usando Google Gemini
 """
-import google.generativeai as genai
 from src.config import config
+from src.services.ai_cache import AIResponseCache
+from src.services.ai_cassette import AICassette
+from src.services.ai_metrics import AIMetrics, add_metric, count_metric, instrumented
+from src.services.ai_resilience import CallPolicy, CircuitBreaker, ResilientCaller, remaining_time
+from src.services.ai_scheduler import GeminiScheduler, PRIORITY_BACKGROUND
+from src.services.ai_singleflight import SingleFlight
+from src.services.fake_gemini import FakeGemini
+from src.utils.json_repair import TRUNCATION_REPAIRS, parse_json
+from src.utils.json_stream import JSONArrayItemStream
+from src.utils.lazy import LazyProxy
 from src.utils.prompts import (
+    PROMPT_VERSION,
+    PROMPT_TASKS,
     ANALYZE_JOKE_PROMPT,
     SUGGEST_IMPROVEMENTS_PROMPT,
     GENERATE_VARIATIONS_PROMPT,
     BRAINSTORM_IDEAS_PROMPT,
     IDENTIFY_PATTERNS_PROMPT,
+    MERGE_PATTERNS_PROMPT,
     TAG_SUGGESTION_PROMPT,
     ANALYZE_CONCEPTS_PROMPT,
-    ANALYZE_RUPTURE_PROMPT
+    ANALYZE_RUPTURE_PROMPT,
+    ANALYZE_COMBINED_PROMPT,
+    ANALYZE_COMBINED_SCHEMA
 )
+from src.utils.json_schema import validate
+import contextvars
+import hashlib
 import json
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Modelo y generation config por tarea (sobre los valores base del agente).
+# Las tareas cortas van al modelo rápido con salida acotada; AI_MODEL_ROUTES
+# permite cambiar cualquier valor sin tocar código.
+MODEL_ROUTES = {
+    'analyze_joke': {'temperature': 0.7, 'max_output_tokens': 2048},
+    'suggest_improvements': {'temperature': 0.9, 'max_output_tokens': 1536},
+    'generate_variations': {'temperature': 1.0, 'max_output_tokens': 2048},
+    'brainstorm_ideas': {'temperature': 1.0, 'max_output_tokens': 2048},
+    'identify_patterns': {'temperature': 0.4, 'max_output_tokens': 2048},
+    'merge_patterns': {'temperature': 0.3, 'max_output_tokens': 2048},
+    'suggest_tags': {'model': config.GEMINI_FAST_MODEL, 'temperature': 0.2,
+                     'max_output_tokens': 384},
+    'analyze_concepts': {'temperature': 0.7, 'max_output_tokens': 1536},
+    'analyze_rupture': {'temperature': 0.7, 'max_output_tokens': 1536},
+    'analyze_combined': {'temperature': 0.7, 'max_output_tokens': 4096,
+                         'response_mime_type': 'application/json'},
+}
+
+# Sección de analyze_combined -> (parte de analyze_full, tarea individual)
+COMBINED_SECTIONS = {
+    'analisis': ('analysis', 'analyze_joke'),
+    'conceptos': ('concepts', 'analyze_concepts'),
+    'ruptura': ('rupture', 'analyze_rupture'),
+    'tags': ('tags', 'suggest_tags'),
+}
+
 
 class ComedyAIAgent:
     """Agente de IA para análisis y mejora de chistes usando Google Gemini"""
 
     def __init__(self):
         """Inicializa el agente de IA con Google Gemini"""
-        if not config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY not configured")
-
-        genai.configure(api_key=config.GEMINI_API_KEY)
-
-        # Configuración del modelo
+        # Sustituto local de Gemini (None si se usa la API real)
+        self.fake = FakeGemini(
+            latency=config.AI_FAKE_LATENCY,
+            latency_mean=config.AI_FAKE_LATENCY_MEAN,
+            latency_stddev=config.AI_FAKE_LATENCY_STDDEV,
+            rate_limit_rate=config.AI_FAKE_RATE_LIMIT_RATE,
+            error_rate=config.AI_FAKE_ERROR_RATE,
+            truncation_rate=config.AI_FAKE_TRUNCATION_RATE,
+            seed=config.AI_FAKE_SEED
+        ) if config.AI_FAKE_GEMINI else None
+
+        # Grabación/reproducción de llamadas (None si está desactivada)
+        self.cassette = AICassette(
+            path=config.AI_CASSETTE_PATH,
+            mode=config.AI_CASSETTE_MODE,
+            match=config.AI_CASSETTE_MATCH,
+            replay_latency=config.AI_CASSETTE_REPLAY_LATENCY
+        ) if config.AI_CASSETTE_MODE != 'off' else None
+
+        if not config.AI_OFFLINE:
+            if not config.GEMINI_API_KEY:
+                raise ValueError("GEMINI_API_KEY not configured")
+            import google.generativeai as genai
+            genai.configure(api_key=config.GEMINI_API_KEY)
+
+        # Configuración base del modelo (cada tarea la ajusta en MODEL_ROUTES)
         self.generation_config = {
             "temperature": 0.9,  # Creatividad alta para comedia
             "top_p": 0.95,
@@ -38,47 +104,418 @@ class ComedyAIAgent:
             "max_output_tokens": 2048,
         }
 
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL,
-            generation_config=self.generation_config,
+        # Tarea -> {'model', 'generation_config'}
+        self.routes = {task: self._build_route(task) for task in PROMPT_TASKS}
+
+        # Latencia, tokens y errores por tarea
+        self._route_stats = {task: self._empty_route_stats() for task in PROMPT_TASKS}
+        self._route_stats_lock = threading.Lock()
+
+        # Un modelo por tarea con sus instrucciones estáticas fijadas como
+        # system instruction: cada llamada solo envía la parte variable
+        self._inline_system = False
+        self.models = {
+            task: self._build_model(task, system)
+            for task, (system, _template) in PROMPT_TASKS.items()
+        }
+
+        # Caché de respuestas (None si está desactivada)
+        self.cache = AIResponseCache(
+            cache_dir=config.AI_CACHE_DIR,
+            max_entries=config.AI_CACHE_MAX_ENTRIES,
+            ttl=config.AI_CACHE_TTL,
+            max_disk_entries=config.AI_CACHE_MAX_DISK_ENTRIES
+        ) if config.AI_CACHE_ENABLED else None
+
+        # Agrupa llamadas idénticas simultáneas (doble click, varias pestañas)
+        self.inflight = SingleFlight()
+
+        # Planificador de cuota (None si está desactivado)
+        self.scheduler = GeminiScheduler(
+            rpm=config.AI_RPM_LIMIT,
+            tpm=config.AI_TPM_LIMIT,
+            state_path=config.AI_SCHEDULER_DB,
+            max_wait=config.AI_SCHEDULER_MAX_WAIT,
+            max_retries=config.AI_RATE_LIMIT_RETRIES
+        ) if config.AI_SCHEDULER_ENABLED else None
+
+        # Timeouts, reintentos, hedging y circuit breaker por tarea
+        self.resilience = ResilientCaller(
+            default_policy=CallPolicy(
+                timeout=config.AI_CALL_TIMEOUT,
+                retries=config.AI_CALL_RETRIES,
+                backoff=config.AI_RETRY_BACKOFF,
+                hedge=config.AI_HEDGE_ENABLED
+            ),
+            policies=config.AI_CALL_POLICIES,
+            breaker=CircuitBreaker(
+                error_rate=config.AI_BREAKER_ERROR_RATE,
+                min_calls=config.AI_BREAKER_MIN_CALLS,
+                window=config.AI_BREAKER_WINDOW,
+                open_seconds=config.AI_BREAKER_OPEN_SECONDS
+            ) if config.AI_BREAKER_ENABLED else None,
+            hedge_quantile=config.AI_HEDGE_QUANTILE,
+            hedge_min_samples=config.AI_HEDGE_MIN_SAMPLES
         )
 
-        logger.info(f"AI Agent initialized with model: {config.GEMINI_MODEL}")
+        # Latencia, espera, tokens, caché y coste por método (None si está desactivado)
+        self.metrics = AIMetrics(
+            log_path=config.AI_METRICS_LOG or None,
+            max_bytes=config.AI_METRICS_LOG_MAX_BYTES,
+            backups=config.AI_METRICS_LOG_BACKUPS,
+            prices=config.AI_TOKEN_PRICES
+        ) if config.AI_METRICS_ENABLED else None
+
+        # Executor acotado para lanzar varias llamadas al modelo en paralelo
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.AI_MAX_WORKERS,
+            thread_name_prefix='ai-agent'
+        )
 
-    def _parse_json_response(self, response_text: str) -> Dict:
-        """Parsea la respuesta JSON del modelo"""
+        if self.cassette:
+            logger.warning(f"AI Agent cassette in {self.cassette.mode} mode: {self.cassette.path}")
+        if self.fake:
+            logger.warning("AI Agent using local fake Gemini (AI_FAKE_GEMINI)")
+        else:
+            logger.info(f"AI Agent initialized with model: {config.GEMINI_MODEL}")
+
+    def _build_route(self, task: str) -> Dict:
+        """Modelo y generation config de una tarea (base + MODEL_ROUTES + AI_MODEL_ROUTES)"""
+        values = {'model': config.GEMINI_MODEL, **self.generation_config}
+        values.update(MODEL_ROUTES.get(task, {}))
+        values.update(config.AI_MODEL_ROUTES.get(task, {}))
+
+        model_name = values.pop('model')
+        return {'model': model_name, 'generation_config': values}
+
+    def _build_model(self, task: str, system_instruction: str):
+        """Crea el modelo de una tarea (real, local o desde la cassette)"""
+        if self.cassette and self.cassette.mode == 'replay':
+            return self.cassette.model(task, system_instruction)
+
+        route = self.routes[task]
+        if self.fake:
+            model = self.fake.model(task, system_instruction,
+                                    max_output_tokens=route['generation_config'].get('max_output_tokens'))
+        else:
+            model = self._build_gemini_model(route, system_instruction)
+
+        if self.cassette:
+            model = self.cassette.wrap(model, task, system_instruction)
+        return model
+
+    def _build_gemini_model(self, route: Dict, system_instruction: str):
+        """Crea el GenerativeModel de Gemini de una ruta con su system instruction"""
+        import google.generativeai as genai
+
+        try:
+            return genai.GenerativeModel(
+                model_name=route['model'],
+                generation_config=route['generation_config'],
+                system_instruction=system_instruction,
+            )
+        except TypeError:
+            # SDK anterior a system_instruction: se antepone al prompt en cada llamada
+            if not self._inline_system:
+                logger.warning("google-generativeai without system_instruction support; "
+                               "sending instructions inline")
+            self._inline_system = True
+            return genai.GenerativeModel(
+                model_name=route['model'],
+                generation_config=route['generation_config'],
+            )
+
+    def _cache_key(self, task: str, prompt: str) -> str:
+        """Clave de caché/coalescencia de una llamada (incluye la system instruction)"""
+        system = PROMPT_TASKS[task][0]
+        route = self.routes[task]
+        return AIResponseCache.make_key(
+            route['model'], route['generation_config'], PROMPT_VERSION, f"{system}\n\n{prompt}"
+        )
+
+    def _parse_json(self, response_text: str) -> Tuple[Dict, List[str]]:
+        """
+        Extrae y repara el JSON de la respuesta del modelo
+
+        Returns:
+            Tupla (JSON parseado, reparaciones aplicadas)
+        """
         try:
-            # Limpiar el texto de posibles markdown code blocks
-            cleaned = response_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-
-            cleaned = cleaned.strip()
-            return json.loads(cleaned)
-        except json.JSONDecodeError as e:
+            result, repairs = parse_json(response_text)
+        except ValueError as e:
+            add_metric('parse_failures', 1)
             logger.error(f"Error parsing JSON response: {e}\nResponse: {response_text}")
             raise ValueError(f"Invalid JSON response from AI: {e}")
 
-    def analyze_joke(self, joke_text: str) -> Dict:
+        if repairs:
+            for repair in repairs:
+                count_metric('repairs', repair)
+            logger.warning(f"AI JSON response repaired: {', '.join(repairs)}")
+        return result, repairs
+
+    def _parse_json_response(self, response_text: str) -> Dict:
+        """Parsea la respuesta JSON del modelo"""
+        return self._parse_json(response_text)[0]
+
+    def _estimate_tokens(self, task: str, prompt: str) -> int:
+        """Estimación de tokens de una llamada (~4 caracteres por token + salida)"""
+        # La system instruction también cuenta como entrada para la cuota
+        system = PROMPT_TASKS[task][0]
+        max_output = self.routes[task]['generation_config'].get('max_output_tokens')
+        output = min(config.AI_OUTPUT_TOKENS_ESTIMATE, max_output or config.AI_OUTPUT_TOKENS_ESTIMATE)
+        return (len(system) + len(prompt)) // 4 + output
+
+    @staticmethod
+    def _empty_route_stats() -> Dict:
+        return {'calls': 0, 'errors': 0, 'truncated': 0, 'total_latency': 0.0,
+                'max_latency': 0.0, 'prompt_tokens': 0, 'output_tokens': 0}
+
+    def _record_route(self, task: str, latency: float = 0.0, usage=None,
+                      error: bool = False, truncated: bool = False):
+        """Acumula latencia, tokens, errores y truncados de una tarea"""
+        with self._route_stats_lock:
+            stats = self._route_stats.setdefault(task, self._empty_route_stats())
+            if truncated:
+                stats['truncated'] += 1
+                return
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            if usage is not None:
+                stats['prompt_tokens'] += getattr(usage, 'prompt_token_count', 0) or 0
+                stats['output_tokens'] += getattr(usage, 'candidates_token_count', 0) or 0
+
+    def _submit(self, fn, *args, **kwargs):
+        """Lanza fn en el executor conservando el contexto (prioridad, deadline)"""
+        return self.executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def _call_model(self, task: str, prompt: str, stream: bool = False):
+        """
+        Llama al modelo de la tarea con timeout, reintentos y circuit breaker,
+        pasando por el planificador de cuota si está activo
+
+        Las llamadas en streaming esperan cuota pero no se reintentan, porque
+        parte de la respuesta ya puede haberse emitido.
+        """
+        model = self.models[task]
+        estimated = self._estimate_tokens(task, prompt)
+        if self._inline_system:
+            prompt = f"{PROMPT_TASKS[task][0]}\n{prompt}"
+
+        def request(timeout: float):
+            return model.generate_content(prompt, stream=stream,
+                                          request_options={'timeout': timeout})
+
+        start = time.perf_counter()
+        if stream:
+            if self.scheduler:
+                add_metric('queue_wait', self.scheduler.acquire(estimated, max_wait=remaining_time()))
+            try:
+                chunks = self.resilience.call_once(task, request)
+            except Exception:
+                self._record_route(task, time.perf_counter() - start, error=True)
+                raise
+            return self._timed_stream(task, chunks, start)
+
+        # La cuota se espera antes de cada intento, fuera de su timeout: la cola
+        # local no debe agotar AI_CALL_TIMEOUT ni contar como fallo de Gemini
+        def acquire_quota(max_wait: Optional[float]):
+            add_metric('queue_wait', self.scheduler.acquire(estimated, max_wait=max_wait))
+
+        def call_with_quota():
+            return self.resilience.call(
+                task, request, before_attempt=acquire_quota,
+                before_hedge=lambda: self.scheduler.try_acquire(estimated)
+            )
+
+        try:
+            if self.scheduler:
+                response = self.scheduler.retry_rate_limited(call_with_quota)
+            else:
+                response = self.resilience.call(task, request)
+        except Exception:
+            self._record_route(task, time.perf_counter() - start, error=True)
+            raise
+        usage = getattr(response, 'usage_metadata', None)
+        self._record_route(task, time.perf_counter() - start, usage=usage)
+        if self.metrics:
+            self.metrics.record_usage(self.routes[task]['model'], usage)
+
+        # Corregir el bucket de tokens con el consumo real si la API lo informa
+        total = getattr(usage, 'total_token_count', 0) if usage else 0
+        if self.scheduler and total:
+            self.scheduler.adjust_tokens(total - estimated)
+
+        return response
+
+    def _timed_stream(self, task: str, chunks, start: float) -> Iterator:
+        """Reenvía los trozos de un stream y registra su duración total"""
+        usage = None
+        try:
+            for chunk in chunks:
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                yield chunk
+        except Exception:
+            self._record_route(task, time.perf_counter() - start, error=True)
+            raise
+        self._record_route(task, time.perf_counter() - start, usage=usage)
+        if self.metrics:
+            self.metrics.record_usage(self.routes[task]['model'], usage)
+
+    def _generate_json(self, task: str, prompt: str, fresh: bool = False) -> Dict:
+        """
+        Envía el prompt al modelo de la tarea y devuelve el JSON parseado
+
+        Args:
+            task: Tarea de PROMPT_TASKS (determina la system instruction)
+            prompt: Parte variable del prompt ya formateada
+            fresh: Si es True ignora la caché y fuerza una nueva llamada
+
+        Returns:
+            Respuesta parseada (desde caché si hay una equivalente)
+        """
+        return self._generate_json_checked(task, prompt, fresh)[0]
+
+    def _generate_json_checked(self, task: str, prompt: str,
+                               fresh: bool = False) -> Tuple[Dict, bool]:
+        """
+        Como _generate_json, indicando además si la respuesta llegó truncada
+
+        Returns:
+            Tupla (respuesta parseada, truncada); lo servido desde caché nunca
+            está truncado porque solo se cachean respuestas completas
+        """
+        cache_key = self._cache_key(task, prompt)
+        if self.cache and not fresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                count_metric('cache', 'hit')
+                logger.info("AI response served from cache")
+                return cached, False
+
+        def generate() -> Tuple[Dict, bool]:
+            response = self._call_model(task, prompt)
+            result, repairs = self._parse_json(response.text)
+
+            # Solo se cachean respuestas completas (no las truncadas y reparadas)
+            truncated = bool(TRUNCATION_REPAIRS.intersection(repairs))
+            if truncated:
+                self._record_route(task, truncated=True)
+            elif self.cache:
+                self.cache.set(cache_key, result)
+            return result, truncated
+
+        (result, truncated), shared = self.inflight.do(cache_key, generate)
+        if shared:
+            outcome = 'shared'  # Resuelta por otra llamada idéntica en curso
+        else:
+            outcome = 'miss' if self.cache and not fresh else 'bypass'
+        count_metric('cache', outcome)
+        return result, truncated
+
+    def _stream_json_items(self, task: str, prompt: str, list_key: str,
+                           fresh: bool = False) -> Iterator[Dict]:
+        """
+        Genera en streaming y emite cada elemento de result[list_key] al completarse
+
+        Args:
+            task: Tarea de PROMPT_TASKS (determina la system instruction)
+            prompt: Parte variable del prompt ya formateada
+            list_key: Clave de la lista en el JSON de respuesta ('ideas', 'variaciones')
+            fresh: Si es True ignora la caché y fuerza una nueva llamada
+
+        Yields:
+            Cada elemento de la lista en cuanto su objeto JSON está completo
+        """
+        cache_key = None
+        if self.cache:
+            cache_key = self._cache_key(task, prompt)
+            if not fresh:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    count_metric('cache', 'hit')
+                    logger.info("AI streamed response served from cache")
+                    yield from cached.get(list_key, [])
+                    return
+        count_metric('cache', 'miss' if self.cache and not fresh else 'bypass')
+
+        parser = JSONArrayItemStream()
+        chunks = []
+
+        for chunk in self._call_model(task, prompt, stream=True):
+            chunks.append(chunk.text)
+            yield from parser.feed(chunk.text)
+
+        # Cachear la respuesta completa igual que en la versión sin streaming
+        if cache_key:
+            try:
+                result, repairs = self._parse_json(''.join(chunks))
+                if not TRUNCATION_REPAIRS.intersection(repairs):
+                    self.cache.set(cache_key, result)
+            except ValueError:
+                pass
+
+    def get_route_stats(self) -> Dict:
+        """Modelo, generation config, latencia media y tokens por tarea"""
+        with self._route_stats_lock:
+            snapshot = {task: dict(stats) for task, stats in self._route_stats.items()}
+
+        routes = {}
+        for task, route in self.routes.items():
+            stats = snapshot.get(task, self._empty_route_stats())
+            calls = stats['calls']
+            routes[task] = {
+                'model': route['model'],
+                'temperature': route['generation_config'].get('temperature'),
+                'max_output_tokens': route['generation_config'].get('max_output_tokens'),
+                'calls': calls,
+                'errors': stats['errors'],
+                'truncated': stats['truncated'],
+                'avg_latency': round(stats['total_latency'] / calls, 3) if calls else 0.0,
+                'max_latency': round(stats['max_latency'], 3),
+                'prompt_tokens': stats['prompt_tokens'],
+                'output_tokens': stats['output_tokens'],
+                'avg_output_tokens': round(stats['output_tokens'] / calls) if calls else 0,
+            }
+        return routes
+
+    def get_resilience_stats(self) -> Dict:
+        """Timeouts, reintentos, hedging, latencias y estado del circuit breaker"""
+        return self.resilience.get_stats()
+
+    def get_scheduler_stats(self) -> Dict:
+        """Estado de la cola y de la cuota de Gemini"""
+        if not self.scheduler:
+            return {'enabled': False}
+        return {'enabled': True, **self.scheduler.get_stats()}
+
+    def get_cache_stats(self) -> Dict:
+        """Estadísticas de la caché de respuestas y de las llamadas coalescidas"""
+        stats = {'enabled': bool(self.cache)}
+        if self.cache:
+            stats.update(self.cache.get_stats())
+        stats['singleflight'] = self.inflight.get_stats()
+        if self.cassette:
+            stats['cassette'] = self.cassette.get_stats()
+        return stats
+
+    @instrumented
+    def analyze_joke(self, joke_text: str, fresh: bool = False) -> Dict:
         """
         Analiza la estructura y técnicas de un chiste
 
         Args:
             joke_text: Texto del chiste a analizar
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Dict con el análisis estructurado
         """
         try:
             prompt = ANALYZE_JOKE_PROMPT.format(joke_text=joke_text)
-            response = self.model.generate_content(prompt)
-
-            analysis = self._parse_json_response(response.text)
-            logger.info(f"Joke analyzed successfully. Score: {analysis['scores']['general']}")
+            analysis = self._generate_json('analyze_joke', prompt, fresh=fresh)
+            logger.info(f"Joke analyzed successfully. Score: {analysis.get('scores', {}).get('general')}")
 
             return analysis
 
@@ -86,13 +523,16 @@ class ComedyAIAgent:
             logger.error(f"Error analyzing joke: {e}")
             raise
 
-    def suggest_improvements(self, joke_text: str, analysis: Optional[Dict] = None) -> Dict:
+    @instrumented
+    def suggest_improvements(self, joke_text: str, analysis: Optional[Dict] = None,
+                             fresh: bool = False) -> Dict:
         """
         Sugiere mejoras para un chiste
 
         Args:
             joke_text: Texto del chiste
             analysis: Análisis previo del chiste (opcional)
+            fresh: Ignorar la caché y forzar nuevas llamadas
 
         Returns:
             Dict con versiones mejoradas
@@ -100,7 +540,7 @@ class ComedyAIAgent:
         try:
             # Si no hay análisis, generar uno primero
             if not analysis:
-                analysis = self.analyze_joke(joke_text)
+                analysis = self.analyze_joke(joke_text, fresh=fresh)
 
             # Crear resumen del análisis
             analysis_summary = f"""
@@ -115,8 +555,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
                 analysis_summary=analysis_summary
             )
 
-            response = self.model.generate_content(prompt)
-            improvements = self._parse_json_response(response.text)
+            improvements = self._generate_json('suggest_improvements', prompt, fresh=fresh)
 
             logger.info("Improvements suggested successfully")
             return improvements
@@ -125,13 +564,16 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error suggesting improvements: {e}")
             raise
 
-    def generate_variations(self, joke_text: str, num_variations: int = 3) -> List[Dict]:
+    @instrumented
+    def generate_variations(self, joke_text: str, num_variations: int = 3,
+                            fresh: bool = False) -> List[Dict]:
         """
         Genera variaciones del chiste
 
         Args:
             joke_text: Texto del chiste original
             num_variations: Número de variaciones a generar
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Lista de variaciones
@@ -142,8 +584,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
                 num_variations=num_variations
             )
 
-            response = self.model.generate_content(prompt)
-            result = self._parse_json_response(response.text)
+            result = self._generate_json('generate_variations', prompt, fresh=fresh)
 
             variations = result.get('variaciones', [])
             logger.info(f"Generated {len(variations)} variations")
@@ -154,8 +595,24 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error generating variations: {e}")
             raise
 
+    @instrumented
+    def stream_variations(self, joke_text: str, num_variations: int = 3,
+                          fresh: bool = False) -> Iterator[Dict]:
+        """
+        Versión en streaming de generate_variations
+
+        Yields:
+            Cada variación en cuanto el modelo termina de escribirla
+        """
+        prompt = GENERATE_VARIATIONS_PROMPT.format(
+            joke_text=joke_text,
+            num_variations=num_variations
+        )
+        yield from self._stream_json_items('generate_variations', prompt, 'variaciones', fresh=fresh)
+
+    @instrumented
     def brainstorm_ideas(self, topic: str, style: str = "observacional",
-                        num_ideas: int = 5) -> List[Dict]:
+                        num_ideas: int = 5, fresh: bool = False) -> List[Dict]:
         """
         Genera ideas de chistes sobre un tema
 
@@ -163,6 +620,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             topic: Tema sobre el que generar ideas
             style: Estilo de humor preferido
             num_ideas: Número de ideas a generar
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Lista de ideas de chistes
@@ -174,8 +632,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
                 num_ideas=num_ideas
             )
 
-            response = self.model.generate_content(prompt)
-            result = self._parse_json_response(response.text)
+            result = self._generate_json('brainstorm_ideas', prompt, fresh=fresh)
 
             ideas = result.get('ideas', [])
             logger.info(f"Generated {len(ideas)} ideas about: {topic}")
@@ -186,53 +643,209 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error brainstorming ideas: {e}")
             raise
 
-    def identify_patterns(self, jokes: List[Dict]) -> Dict:
+    @instrumented
+    def stream_brainstorm(self, topic: str, style: str = "observacional",
+                          num_ideas: int = 5, fresh: bool = False) -> Iterator[Dict]:
+        """
+        Versión en streaming de brainstorm_ideas
+
+        Yields:
+            Cada idea en cuanto el modelo termina de escribirla
+        """
+        prompt = BRAINSTORM_IDEAS_PROMPT.format(
+            topic=topic,
+            style=style,
+            num_ideas=num_ideas
+        )
+        yield from self._stream_json_items('brainstorm_ideas', prompt, 'ideas', fresh=fresh)
+
+    @staticmethod
+    def _patterns_prompt(joke_texts: List[str]) -> str:
+        """Prompt de identify_patterns para una lista de textos"""
+        jokes_text = "\n\n---\n\n".join([
+            f"CHISTE {i+1}:\n{text}"
+            for i, text in enumerate(joke_texts)
+        ])
+
+        return IDENTIFY_PATTERNS_PROMPT.format(
+            num_jokes=len(joke_texts),
+            jokes_text=jokes_text
+        )
+
+    @staticmethod
+    def _chunk_jokes(joke_texts: List[str]) -> List[List[str]]:
+        """
+        Reparte los chistes en bloques de como máximo AI_PATTERNS_CHUNK_TOKENS
+
+        Los cortes dependen del contenido y no de la posición: los chistes se
+        ordenan por hash y un bloque termina en los chistes cuyo hash es
+        múltiplo de AI_PATTERNS_CHUNK_JOKES. Así añadir un chiste solo cambia
+        el bloque en el que cae y el resto sigue saliendo de la caché.
+        """
+        budget = config.AI_PATTERNS_CHUNK_TOKENS
+        every = max(1, config.AI_PATTERNS_CHUNK_JOKES)
+        hashed = sorted(
+            (hashlib.sha256(text.encode('utf-8')).hexdigest(), text)
+            for text in joke_texts
+        )
+
+        chunks, current, used = [], [], 0
+        for digest, text in hashed:
+            tokens = len(text) // 4 + 1
+            if current and used + tokens > budget:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+            if int(digest[:8], 16) % every == 0:
+                chunks.append(current)
+                current, used = [], 0
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def _merge_frequencies(reports: List[Dict], total_jokes: int) -> List[Dict]:
+        """Suma las frecuencias de técnicas de los informes parciales"""
+        merged = {}
+        for report in reports:
+            for item in report.get('tecnicas_frecuentes', []):
+                if not isinstance(item, dict) or not item.get('tecnica'):
+                    continue
+                try:
+                    frequency = int(item.get('frecuencia', 0))
+                except (TypeError, ValueError):
+                    continue
+                name = str(item['tecnica']).strip()
+                entry = merged.setdefault(name.lower(), {'tecnica': name, 'frecuencia': 0})
+                entry['frecuencia'] += frequency
+
+        techniques = sorted(merged.values(), key=lambda t: t['frecuencia'], reverse=True)
+        for technique in techniques:
+            technique['porcentaje'] = round(technique['frecuencia'] * 100 / total_jokes) \
+                if total_jokes else 0
+        return techniques
+
+    def _reduce_patterns(self, reports: List[Tuple[int, Dict]], fresh: bool = False) -> Dict:
+        """
+        Combina informes parciales (num_chistes, informe) en uno solo
+
+        Si los informes no caben juntos en el presupuesto de tokens se combinan
+        por grupos, en varias rondas, hasta quedar uno.
+        """
+        budget = config.AI_PATTERNS_CHUNK_TOKENS
+
+        def merge(group: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+            num_jokes = sum(n for n, _ in group)
+            reports_text = "\n\n".join(
+                f"INFORME {i+1} ({n} chistes):\n{json.dumps(report, ensure_ascii=False)}"
+                for i, (n, report) in enumerate(group)
+            )
+            prompt = MERGE_PATTERNS_PROMPT.format(
+                num_reports=len(group),
+                num_jokes=num_jokes,
+                reports_text=reports_text
+            )
+            return num_jokes, self._generate_json('merge_patterns', prompt, fresh=fresh)
+
+        while len(reports) > 1:
+            groups, current, used = [], [], 0
+            for n, report in reports:
+                tokens = len(json.dumps(report, ensure_ascii=False)) // 4 + 1
+                # Cada grupo combina al menos dos informes para que siempre avance
+                if len(current) >= 2 and used + tokens > budget:
+                    groups.append(current)
+                    current, used = [], 0
+                current.append((n, report))
+                used += tokens
+            if len(current) == 1 and groups:
+                groups[-1].extend(current)
+            elif current:
+                groups.append(current)
+
+            futures = [self._submit(merge, group) for group in groups]
+            reports = [future.result() for future in futures]
+
+        return reports[0][1]
+
+    @instrumented
+    def identify_patterns(self, jokes: List[Dict], fresh: bool = False,
+                          progress: Optional[Callable[[int, int], None]] = None) -> Dict:
         """
         Identifica patrones en una colección de chistes
 
+        Si la colección no cabe en AI_PATTERNS_CHUNK_TOKENS se hace en dos fases:
+        cada bloque se analiza en paralelo (con caché por bloque) y los informes
+        parciales se combinan después en uno.
+
         Args:
             jokes: Lista de diccionarios con chistes (debe tener campo 'contenido')
+            fresh: Ignorar la caché y forzar nuevas llamadas
+            progress: Callback opcional progress(hechos, total) por bloque
 
         Returns:
             Dict con patrones identificados
         """
         try:
-            # Construir texto con todos los chistes
-            jokes_text = "\n\n---\n\n".join([
-                f"CHISTE {i+1}:\n{joke.get('contenido', joke.get('texto', ''))}"
-                for i, joke in enumerate(jokes)
-            ])
-
-            prompt = IDENTIFY_PATTERNS_PROMPT.format(
-                num_jokes=len(jokes),
-                jokes_text=jokes_text
+            joke_texts = [joke.get('contenido', joke.get('texto', '')) for joke in jokes]
+
+            total_tokens = sum(len(text) // 4 + 1 for text in joke_texts)
+            if total_tokens <= config.AI_PATTERNS_CHUNK_TOKENS:
+                patterns = self._generate_json(
+                    'identify_patterns', self._patterns_prompt(joke_texts), fresh=fresh
+                )
+                logger.info(f"Patterns identified from {len(jokes)} jokes")
+                return patterns
+
+            chunks = self._chunk_jokes(joke_texts)
+            # La combinación final cuenta como un paso más
+            total_steps = len(chunks) + 1
+            futures = {
+                self._submit(
+                    self._generate_json, 'identify_patterns',
+                    self._patterns_prompt(chunk), fresh=fresh
+                ): i
+                for i, chunk in enumerate(chunks)
+            }
+            partials = [None] * len(chunks)
+            for done, future in enumerate(as_completed(futures), start=1):
+                partials[futures[future]] = future.result()
+                if progress:
+                    progress(done, total_steps)
+
+            patterns = self._reduce_patterns(
+                [(len(chunk), report) for chunk, report in zip(chunks, partials)],
+                fresh=fresh
             )
+            # Las frecuencias se suman en código: el modelo no cuenta bien entre bloques
+            patterns['tecnicas_frecuentes'] = self._merge_frequencies(partials, len(joke_texts))
+            if progress:
+                progress(total_steps, total_steps)
 
-            response = self.model.generate_content(prompt)
-            patterns = self._parse_json_response(response.text)
-
-            logger.info(f"Patterns identified from {len(jokes)} jokes")
+            logger.info(f"Patterns identified from {len(jokes)} jokes "
+                        f"in {len(chunks)} chunks")
             return patterns
 
         except Exception as e:
             logger.error(f"Error identifying patterns: {e}")
             raise
 
-    def suggest_tags(self, joke_text: str) -> Dict:
+    @instrumented
+    def suggest_tags(self, joke_text: str, fresh: bool = False) -> Dict:
         """
         Sugiere tags para categorizar un chiste
 
         Args:
             joke_text: Texto del chiste
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Dict con tags sugeridos por categoría
         """
         try:
             prompt = TAG_SUGGESTION_PROMPT.format(joke_text=joke_text)
-            response = self.model.generate_content(prompt)
-
-            tags = self._parse_json_response(response.text)
+            tags = self._generate_json('suggest_tags', prompt, fresh=fresh)
             logger.info("Tags suggested successfully")
 
             return tags
@@ -241,12 +854,14 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error suggesting tags: {e}")
             raise
 
-    def analyze_concepts(self, joke_text: str) -> Dict:
+    @instrumented
+    def analyze_concepts(self, joke_text: str, fresh: bool = False) -> Dict:
         """
         Analiza en profundidad los conceptos del chiste
 
         Args:
             joke_text: Texto del chiste a analizar
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Dict con análisis conceptual detallado:
@@ -259,9 +874,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
         """
         try:
             prompt = ANALYZE_CONCEPTS_PROMPT.format(joke_text=joke_text)
-            response = self.model.generate_content(prompt)
-
-            concepts = self._parse_json_response(response.text)
+            concepts = self._generate_json('analyze_concepts', prompt, fresh=fresh)
             logger.info(f"Concepts analyzed. Type: {concepts.get('tipo_concepto', 'unknown')}")
 
             return concepts
@@ -270,12 +883,14 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error analyzing concepts: {e}")
             raise
 
-    def analyze_rupture(self, joke_text: str) -> Dict:
+    @instrumented
+    def analyze_rupture(self, joke_text: str, fresh: bool = False) -> Dict:
         """
         Analiza la mecánica de ruptura humorística del chiste
 
         Args:
             joke_text: Texto del chiste a analizar
+            fresh: Ignorar la caché y forzar una nueva llamada
 
         Returns:
             Dict con análisis de la ruptura:
@@ -291,9 +906,7 @@ Scores: {json.dumps(analysis.get('scores', {}))}
         """
         try:
             prompt = ANALYZE_RUPTURE_PROMPT.format(joke_text=joke_text)
-            response = self.model.generate_content(prompt)
-
-            rupture = self._parse_json_response(response.text)
+            rupture = self._generate_json('analyze_rupture', prompt, fresh=fresh)
             logger.info(f"Rupture analyzed. Type: {rupture.get('tipo_ruptura', 'unknown')}")
 
             return rupture
@@ -302,6 +915,169 @@ Scores: {json.dumps(analysis.get('scores', {}))}
             logger.error(f"Error analyzing rupture: {e}")
             raise
 
+    @instrumented
+    def analyze_combined(self, joke_text: str, fresh: bool = False) -> Dict:
+        """
+        Análisis general, conceptos, ruptura y tags en una sola llamada
+
+        La respuesta se valida sección a sección contra ANALYZE_COMBINED_SCHEMA
+        y se separa en las formas de analyze_joke, analyze_concepts,
+        analyze_rupture y suggest_tags. Las secciones válidas de una respuesta
+        completa se guardan también en la caché de su tarea individual.
+
+        Args:
+            joke_text: Texto del chiste a analizar
+            fresh: Ignorar la caché y forzar una nueva llamada
+
+        Returns:
+            Dict con 'analysis', 'concepts', 'rupture' y 'tags' (None si la
+            sección no cumple el esquema) e 'invalid' con los errores de cada una
+        """
+        prompt = ANALYZE_COMBINED_PROMPT.format(joke_text=joke_text)
+        combined, truncated = self._generate_json_checked('analyze_combined', prompt, fresh=fresh)
+
+        # Solo las secciones de respuestas completas (no truncadas) se cachean
+        complete = bool(self.cache) and not truncated
+
+        results = {'invalid': {}}
+        for section, (name, task) in COMBINED_SECTIONS.items():
+            schema = ANALYZE_COMBINED_SCHEMA['properties'][section]
+            value = combined.get(section)
+            errors = validate(value, schema, f"$.{section}")
+            if errors:
+                results[name] = None
+                results['invalid'][name] = '; '.join(errors[:3])
+                count_metric('repairs', f"schema_{section}")
+                continue
+
+            results[name] = value
+            if complete:
+                task_prompt = PROMPT_TASKS[task][1].format(joke_text=joke_text)
+                self.cache.set(self._cache_key(task, task_prompt), value)
+
+        if results['invalid']:
+            logger.warning(f"Combined analysis with invalid sections: {results['invalid']}")
+        return results
+
+    @instrumented
+    def analyze_full(self, joke_text: str, fresh: bool = False,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Análisis general, de conceptos, de ruptura y tags de un chiste
+
+        Con AI_COMBINED_ANALYSIS se pide todo en una sola llamada y solo las
+        secciones que no cumplan el esquema (o todas, si la llamada falla) se
+        piden por separado. Las llamadas individuales van en paralelo, así que
+        el tiempo es el de la más lenta en lugar de la suma.
+
+        Args:
+            joke_text: Texto del chiste a analizar
+            fresh: Ignorar la caché y forzar nuevas llamadas
+            progress: Callback opcional progress(hechos, total) por parte terminada
+
+        Returns:
+            Dict con 'analysis', 'concepts', 'rupture' y 'tags' (None si esa parte
+            falló) y 'errors' con el mensaje de cada parte fallida
+        """
+        tasks = {
+            'analysis': self.analyze_joke,
+            'concepts': self.analyze_concepts,
+            'rupture': self.analyze_rupture,
+            'tags': self.suggest_tags,
+        }
+
+        results = {'errors': {}}
+        if config.AI_COMBINED_ANALYSIS:
+            try:
+                combined = self.analyze_combined(joke_text, fresh=fresh)
+                combined.pop('invalid')
+                results.update({name: part for name, part in combined.items() if part is not None})
+            except Exception as e:
+                logger.warning(f"Combined analysis failed, falling back to separate calls: {e}")
+
+        pending = {name: task for name, task in tasks.items() if name not in results}
+        done = len(tasks) - len(pending)
+        if progress and done:
+            progress(done, len(tasks))
+
+        futures = {
+            self._submit(task, joke_text, fresh=fresh): name
+            for name, task in pending.items()
+        }
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = None
+                results['errors'][name] = str(e)
+            done += 1
+            if progress:
+                progress(done, len(tasks))
+
+        logger.info(f"Full analysis completed ({len(pending)} separate calls, "
+                    f"{len(results['errors'])} failed parts)")
+        return results
+
+    @instrumented
+    def analyze_batch(self, joke_texts: List[str], concurrency: Optional[int] = None,
+                      fresh: bool = False,
+                      progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """
+        Analiza una lista de chistes con concurrencia acotada
+
+        Un fallo en un chiste (p.ej. JSON inválido) no afecta al resto. Los
+        chistes se lanzan en el executor compartido, como mucho `concurrency`
+        a la vez, así que un lote nunca supera AI_MAX_WORKERS hilos.
+
+        Args:
+            joke_texts: Textos de los chistes
+            concurrency: Llamadas simultáneas (por defecto AI_BATCH_CONCURRENCY,
+                máximo AI_BATCH_MAX_CONCURRENCY y AI_MAX_WORKERS)
+            fresh: Ignorar la caché y forzar nuevas llamadas
+            progress: Callback opcional progress(hechos, total) por chiste terminado
+
+        Returns:
+            Lista en el mismo orden con {'success', 'data'} o {'success', 'error'}
+        """
+        concurrency = concurrency or config.AI_BATCH_CONCURRENCY
+        concurrency = max(1, min(concurrency, config.AI_BATCH_MAX_CONCURRENCY,
+                                 config.AI_MAX_WORKERS))
+
+        def analyze_one(joke_text: str) -> Dict:
+            # Los lotes ceden el turno a las peticiones interactivas
+            try:
+                with GeminiScheduler.priority(PRIORITY_BACKGROUND):
+                    return {'success': True, 'data': self.analyze_joke(joke_text, fresh=fresh)}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
+
+        results = [None] * len(joke_texts)
+        pending = {}
+        queued = iter(enumerate(joke_texts))
+        done = 0
+        while True:
+            # Ventana deslizante: se rellena hasta `concurrency` chistes en vuelo
+            for i, text in queued:
+                pending[self._submit(analyze_one, text)] = i
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[pending.pop(future)] = future.result()
+                done += 1
+                if progress:
+                    progress(done, len(joke_texts))
+
+        failed = sum(1 for r in results if not r['success'])
+        logger.info(f"Batch analysis: {len(results)} jokes, {failed} failed "
+                    f"(concurrency={concurrency})")
+        return results
+
 
 # Instancia global del agente
-ai_agent = ComedyAIAgent() if config.GEMINI_API_KEY else None
+ai_agent = LazyProxy('ai_agent', ComedyAIAgent,
+                     available=lambda: bool(config.GEMINI_API_KEY or config.AI_OFFLINE))
@@ -0,0 +1,231 @@
+"""
+Caché de respuestas del agente de IA
+
+Dos niveles:
+- Memoria: LRU por proceso con límite de entradas y TTL
+- Disco: un fichero JSON por clave bajo data/, compartido por todos los workers;
+  un barrido periódico borra los caducados y, por encima de max_disk_entries,
+  los más antiguos
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AIResponseCache:
+    """Caché content-addressed de respuestas parseadas del modelo"""
+
+    # Segundos mínimos entre barridos del disco (el primero, en la primera escritura)
+    SWEEP_INTERVAL = 300
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 256,
+                 ttl: int = 7 * 24 * 3600, max_disk_entries: int = 5000):
+        """
+        Args:
+            cache_dir: Directorio del nivel en disco (None lo desactiva)
+            max_entries: Máximo de entradas en memoria
+            ttl: Tiempo de vida de cada entrada en segundos
+            max_disk_entries: Máximo de ficheros en disco (0 = sin límite)
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._last_sweep = 0.0
+        self._sweeping = False
+
+        # clave -> (timestamp de creación, JSON serializado)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+        }
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"AI cache disk tier disabled ({self.cache_dir}): {e}")
+                self.cache_dir = None
+
+    @staticmethod
+    def make_key(model_name: str, generation_config: Dict, prompt_version: str,
+                 prompt: str) -> str:
+        """Calcula la clave de caché a partir de todo lo que determina la respuesta"""
+        payload = json.dumps({
+            'model': model_name,
+            'generation_config': generation_config,
+            'prompt_version': prompt_version,
+            'prompt': prompt,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, serialized: str):
+        """Guarda una entrada en memoria aplicando la política LRU (requiere el lock)"""
+        self._memory[key] = (created, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve una copia del valor cacheado o None si no existe o ha caducado"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, serialized = entry
+                if not self._is_expired(created):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return json.loads(serialized)
+                del self._memory[key]
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+
+                if not self._is_expired(stored['created']):
+                    serialized = json.dumps(stored['value'], ensure_ascii=False)
+                    with self._lock:
+                        self._remember(key, stored['created'], serialized)
+                        self._stats['disk_hits'] += 1
+                    return stored['value']
+
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Discarding unreadable AI cache entry {key}: {e}")
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        """Guarda un valor serializable a JSON en ambos niveles"""
+        created = time.time()
+        serialized = json.dumps(value, ensure_ascii=False)
+
+        with self._lock:
+            self._remember(key, created, serialized)
+            self._stats['writes'] += 1
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            tmp_path = None
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Escritura atómica para que otro worker nunca lea un fichero a medias
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(f'{{"created": {created}, "value": {serialized}}}')
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not write AI cache entry {key}: {e}")
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+            self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        """Lanza el barrido del disco si hace más de SWEEP_INTERVAL del anterior"""
+        with self._lock:
+            if self._sweeping or time.time() - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._sweeping = True
+        try:
+            self.sweep()
+        finally:
+            with self._lock:
+                self._sweeping = False
+                self._last_sweep = time.time()
+
+    def sweep(self) -> int:
+        """
+        Borra del disco las entradas caducadas y, si quedan más de
+        max_disk_entries, las más antiguas
+
+        Returns:
+            Ficheros borrados
+        """
+        if not self.cache_dir:
+            return 0
+
+        now = time.time()
+        entries = []  # (mtime, ruta)
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+
+        # Los .tmp de escrituras interrumpidas y las entradas caducadas sobran
+        # siempre (el mtime es el momento de la escritura, igual que 'created')
+        doomed = [path for mtime, path in entries
+                  if (path.endswith('.tmp') and now - mtime > self.SWEEP_INTERVAL)
+                  or (path.endswith('.json') and self._is_expired(mtime))]
+        expired = set(doomed)
+        kept = sorted((mtime, path) for mtime, path in entries
+                      if path.endswith('.json') and path not in expired)
+        if self.max_disk_entries and len(kept) > self.max_disk_entries:
+            doomed += [path for _, path in kept[:len(kept) - self.max_disk_entries]]
+
+        removed = 0
+        for path in doomed:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass  # Ya borrado por otro worker
+
+        if removed:
+            with self._lock:
+                self._stats['evictions'] += removed
+                self._stats['disk_evictions'] += removed
+            logger.info(f"AI cache sweep removed {removed} disk entries")
+        return removed
+
+    def clear(self):
+        """Vacía el nivel en memoria (el disco caduca por TTL)"""
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self) -> Dict:
+        """Contadores de aciertos/fallos de este proceso"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['max_disk_entries'] = self.max_disk_entries
+        stats['disk_enabled'] = bool(self.cache_dir)
+        return stats
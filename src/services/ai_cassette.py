@@ -0,0 +1,231 @@
+"""
+Grabación y reproducción de llamadas al modelo (cassette)
+
+- record: cada respuesta real se añade al final de un fichero JSONL compacto
+  junto con su latencia, los tokens consumidos y, en streaming, el tamaño de
+  cada trozo
+- replay: las respuestas se sirven desde el fichero sin red, siempre en el
+  mismo orden y opcionalmente con la latencia grabada
+
+En replay, match='exact' exige el mismo prompt (tarea + system + prompt) y
+match='task' reparte las respuestas grabadas de cada tarea en orden circular,
+útil para benchmarks con formas de respuesta reales.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MATCHES = ('exact', 'task')
+
+
+class CassetteMissError(LookupError):
+    """No hay respuesta grabada para la llamada en modo replay"""
+
+
+def _usage(prompt_tokens: int, output_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens
+    )
+
+
+class AICassette:
+    """Fichero append-only de pares prompt/respuesta"""
+
+    def __init__(self, path: str, mode: str = 'record', match: str = 'exact',
+                 replay_latency: bool = False):
+        """
+        Args:
+            path: Fichero JSONL de la cassette
+            mode: 'record' o 'replay'
+            match: En replay, 'exact' (mismo prompt) o 'task' (cualquiera de la tarea)
+            replay_latency: En replay, esperar la latencia grabada
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        if match not in MATCHES:
+            raise ValueError(f"Invalid cassette match: {match}")
+
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self.replay_latency = replay_latency
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._stats = {'recorded': 0, 'replayed': 0, 'misses': 0}
+
+        if mode == 'record':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        else:
+            self._load()
+
+    @staticmethod
+    def make_key(task: str, system: str, prompt: str) -> str:
+        """Clave de una llamada: hash de tarea, system instruction y prompt"""
+        return hashlib.sha256(f"{task}\n{system}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def _load(self):
+        """Indexa las entradas del fichero por clave y por tarea"""
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+
+        count = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Una línea a medio escribir no invalida el resto
+                    logger.warning(f"Skipping invalid cassette line {line_number}")
+                    continue
+                self._entries[entry['k']].append(entry)
+                self._entries[f"task:{entry['t']}"].append(entry)
+                count += 1
+
+        logger.info(f"Cassette loaded: {count} responses from {self.path}")
+
+    def record(self, task: str, key: str, text: str, latency: float,
+               usage=None, chunks: Optional[List[int]] = None, first_chunk: float = None):
+        """Añade una respuesta al final del fichero"""
+        entry = {
+            'k': key,
+            't': task,
+            'r': text,
+            'l': round(latency, 4),
+            'ts': round(time.time(), 3),
+        }
+        if usage is not None:
+            entry['u'] = [getattr(usage, 'prompt_token_count', 0),
+                          getattr(usage, 'candidates_token_count', 0)]
+        if chunks is not None:
+            entry['c'] = chunks
+            entry['f'] = round(first_chunk or 0.0, 4)
+
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._stats['recorded'] += 1
+
+    def lookup(self, task: str, key: str) -> Dict:
+        """
+        Siguiente respuesta grabada para la llamada
+
+        Raises:
+            CassetteMissError: Si no hay ninguna grabada
+        """
+        index_key = key if self.match == 'exact' else f"task:{task}"
+        with self._lock:
+            entries = self._entries.get(index_key)
+            if not entries:
+                self._stats['misses'] += 1
+                raise CassetteMissError(f"No recorded AI response for {task} ({key[:12]})")
+
+            # Varias grabaciones de la misma llamada se sirven en orden circular
+            entry = entries[self._cursors[index_key] % len(entries)]
+            self._cursors[index_key] += 1
+            self._stats['replayed'] += 1
+        return entry
+
+    def wrap(self, model, task: str, system: str = ''):
+        """Envuelve un modelo real para grabar sus respuestas"""
+        return RecordingModel(self, model, task, system)
+
+    def model(self, task: str, system: str = ''):
+        """Modelo que responde desde la cassette"""
+        return ReplayModel(self, task, system)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'mode': self.mode, 'match': self.match, 'path': self.path, **self._stats}
+
+
+class RecordingModel:
+    """Modelo que delega en el real y graba cada respuesta completa"""
+
+    def __init__(self, cassette: AICassette, model, task: str, system: str):
+        self.cassette = cassette
+        self.model = model
+        self.task = task
+        self.system = system
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        key = AICassette.make_key(self.task, self.system, prompt)
+        start = time.perf_counter()
+        response = self.model.generate_content(prompt, stream=stream, **kwargs)
+
+        if stream:
+            return self._record_stream(key, response, start)
+
+        self.cassette.record(self.task, key, response.text, time.perf_counter() - start,
+                             usage=getattr(response, 'usage_metadata', None))
+        return response
+
+    def _record_stream(self, key: str, response, start: float) -> Iterator:
+        texts = []
+        first_chunk = None
+        usage = None
+        for chunk in response:
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            texts.append(chunk.text)
+            # El uso de tokens llega con el último trozo
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            yield chunk
+
+        # Solo se graban los streams consumidos hasta el final
+        self.cassette.record(self.task, key, ''.join(texts), time.perf_counter() - start,
+                             usage=usage, chunks=[len(t) for t in texts],
+                             first_chunk=first_chunk)
+
+
+class ReplayModel:
+    """Sustituto de GenerativeModel que responde desde la cassette"""
+
+    def __init__(self, cassette: AICassette, task: str, system: str):
+        self.cassette = cassette
+        self.task = task
+        self.system = system
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        key = AICassette.make_key(self.task, self.system, prompt)
+        entry = self.cassette.lookup(self.task, key)
+        usage = _usage(*entry['u']) if 'u' in entry else None
+
+        if not stream:
+            if self.cassette.replay_latency:
+                time.sleep(entry['l'])
+            return SimpleNamespace(text=entry['r'], usage_metadata=usage)
+
+        return self._stream(entry, usage)
+
+    def _stream(self, entry: Dict, usage=None) -> Iterator[SimpleNamespace]:
+        text = entry['r']
+        sizes = entry.get('c') or [len(text)]
+        latency = entry['l']
+        first_chunk = entry.get('f', latency)
+        step = (latency - first_chunk) / max(1, len(sizes) - 1)
+
+        position = 0
+        for i, size in enumerate(sizes):
+            if self.cassette.replay_latency:
+                time.sleep(first_chunk if i == 0 else step)
+            # Como la API, el uso de tokens llega con el último trozo
+            last = i == len(sizes) - 1
+            yield SimpleNamespace(text=text[position:position + size],
+                                  usage_metadata=usage if last else None)
+            position += size
@@ -0,0 +1,308 @@
+"""
+Instrumentación por llamada de los métodos de ComedyAIAgent
+
+Cada método decorado con @instrumented abre un registro en el contexto actual.
+Mientras dura, las capas inferiores anotan en él lo que ocurre (espera en la
+cola de cuota, tokens de usage_metadata, reparaciones o fallos del JSON,
+resultado de la caché) con add_metric/count_metric. Los registros se anidan:
+lo que anota analyze_joke dentro de analyze_full cuenta en ambos.
+
+Al terminar, el registro se agrega en histogramas por método (get_stats) y se
+escribe como una línea en un JSONL rotativo.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Precio por millón de tokens (entrada, salida) en USD; AI_TOKEN_PRICES lo sobrescribe
+MODEL_PRICES = {
+    'gemini-1.5-flash': (0.075, 0.30),
+    'gemini-1.5-flash-8b': (0.0375, 0.15),
+    'gemini-1.5-pro': (1.25, 5.00),
+}
+
+_current_record: contextvars.ContextVar = contextvars.ContextVar('ai_call_record', default=None)
+_records_lock = threading.Lock()
+
+
+def _new_record(method: str) -> Dict:
+    return {
+        'method': method,
+        'parent': _current_record.get(),
+        'start': time.perf_counter(),
+        'queue_wait': 0.0,
+        'model_calls': 0,
+        'prompt_tokens': 0,
+        'output_tokens': 0,
+        'cost_usd': 0.0,
+        'parse_failures': 0,
+        'repairs': Counter(),
+        'cache': Counter(),
+    }
+
+
+def add_metric(field: str, amount: float):
+    """Suma `amount` al campo del registro actual y de todos sus padres"""
+    record = _current_record.get()
+    with _records_lock:
+        while record is not None:
+            record[field] += amount
+            record = record['parent']
+
+
+def count_metric(field: str, key: str, amount: int = 1):
+    """Incrementa el contador `key` de un campo Counter ('cache', 'repairs')"""
+    record = _current_record.get()
+    with _records_lock:
+        while record is not None:
+            record[field][key] += amount
+            record = record['parent']
+
+
+def _empty_method_stats() -> Dict:
+    return {
+        'calls': 0,
+        'errors': 0,
+        'cancelled': 0,
+        'total_wall': 0.0,
+        'total_queue_wait': 0.0,
+        'model_calls': 0,
+        'prompt_tokens': 0,
+        'output_tokens': 0,
+        'cost_usd': 0.0,
+        'parse_failures': 0,
+        'repairs': Counter(),
+        'cache': Counter(),
+        'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'recent': deque(maxlen=500),
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class AIMetrics:
+    """Agregados por método y log JSONL rotativo de cada llamada"""
+
+    def __init__(self, log_path: Optional[str] = None, max_bytes: int = 5 * 1024 * 1024,
+                 backups: int = 3, prices: Optional[Dict] = None):
+        """
+        Args:
+            log_path: Fichero JSONL por llamada (None para no escribirlo)
+            max_bytes: Tamaño a partir del cual se rota el fichero
+            backups: Ficheros rotados que se conservan
+            prices: Precio por millón de tokens (entrada, salida) por modelo
+        """
+        self.prices = {**MODEL_PRICES, **{k: tuple(v) for k, v in (prices or {}).items()}}
+        self._lock = threading.Lock()
+        self._methods: Dict[str, Dict] = {}
+
+        self.log_path = None
+        self._call_log = None
+        if log_path:
+            self._init_log(log_path, max_bytes, backups)
+
+    def _init_log(self, log_path: str, max_bytes: int, backups: int):
+        """Prepara el log por llamada (en /tmp si la ruta no es usable)"""
+        candidates = [log_path, os.path.join(tempfile.gettempdir(), 'metodo_ai_calls.jsonl')]
+
+        for path in candidates:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                              encoding='utf-8')
+            except OSError as e:
+                logger.warning(f"AI call log unavailable at {path}: {e}")
+                continue
+
+            # Se escribe directamente en el handler (no en un logger) para que
+            # la configuración de logging de la app no lo silencie
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.log_path = path
+            self._call_log = handler
+            return
+
+        logger.warning("AI call log disabled: no usable location")
+
+    def record_usage(self, model: str, usage):
+        """Anota una llamada al modelo con sus tokens y coste estimado (usage_metadata)"""
+        add_metric('model_calls', 1)
+        if usage is None:
+            return
+
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        add_metric('prompt_tokens', prompt_tokens)
+        add_metric('output_tokens', output_tokens)
+        add_metric('cost_usd', (prompt_tokens * price_in + output_tokens * price_out) / 1e6)
+
+    def start(self, method: str):
+        """Abre un registro para `method` en el contexto actual"""
+        record = _new_record(method)
+        return record, _current_record.set(record)
+
+    def finish(self, record: Dict, token=None, error: Optional[BaseException] = None):
+        """Cierra el registro: lo agrega a su método y lo escribe en el log"""
+        if token is not None:
+            _current_record.reset(token)
+
+        wall = time.perf_counter() - record['start']
+        if error is None:
+            status = 'ok'
+        elif isinstance(error, GeneratorExit):
+            status = 'cancelled'
+        else:
+            status = 'error'
+
+        with _records_lock:
+            repairs = dict(record['repairs'])
+            cache = dict(record['cache'])
+            values = {field: record[field] for field in (
+                'queue_wait', 'model_calls', 'prompt_tokens', 'output_tokens',
+                'cost_usd', 'parse_failures')}
+
+        wall_ms = wall * 1000
+        bucket = next((i for i, limit in enumerate(LATENCY_BUCKETS_MS) if wall_ms <= limit),
+                      len(LATENCY_BUCKETS_MS))
+
+        with self._lock:
+            stats = self._methods.setdefault(record['method'], _empty_method_stats())
+            stats['calls'] += 1
+            stats['errors'] += int(status == 'error')
+            stats['cancelled'] += int(status == 'cancelled')
+            stats['total_wall'] += wall
+            stats['total_queue_wait'] += values['queue_wait']
+            for field in ('model_calls', 'prompt_tokens', 'output_tokens',
+                          'cost_usd', 'parse_failures'):
+                stats[field] += values[field]
+            stats['repairs'].update(repairs)
+            stats['cache'].update(cache)
+            stats['histogram'][bucket] += 1
+            stats['recent'].append(wall)
+
+        if self._call_log:
+            entry = {
+                'ts': round(time.time(), 3),
+                'method': record['method'],
+                'parent': record['parent']['method'] if record['parent'] else None,
+                'status': status,
+                'wall_ms': round(wall_ms, 1),
+                'queue_wait_ms': round(values['queue_wait'] * 1000, 1),
+                'model_calls': values['model_calls'],
+                'prompt_tokens': values['prompt_tokens'],
+                'output_tokens': values['output_tokens'],
+                'cost_usd': round(values['cost_usd'], 6),
+                'cache': cache,
+                'repairs': repairs,
+                'parse_failures': values['parse_failures'],
+            }
+            if status == 'error':
+                entry['error'] = f"{type(error).__name__}: {error}"[:300]
+            line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+            self._call_log.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO}))
+
+    def get_stats(self) -> Dict:
+        """Histograma de latencia, p50/p95 y totales por método"""
+        limits = list(LATENCY_BUCKETS_MS) + [None]  # None = por encima del último
+
+        with self._lock:
+            methods = {}
+            for method, stats in sorted(self._methods.items()):
+                calls = stats['calls']
+                recent = list(stats['recent'])
+                methods[method] = {
+                    'calls': calls,
+                    'errors': stats['errors'],
+                    'cancelled': stats['cancelled'],
+                    'avg_wall': round(stats['total_wall'] / calls, 3) if calls else 0.0,
+                    'p50_wall': round(_percentile(recent, 0.50), 3) if recent else 0.0,
+                    'p95_wall': round(_percentile(recent, 0.95), 3) if recent else 0.0,
+                    'avg_queue_wait': round(stats['total_queue_wait'] / calls, 3) if calls else 0.0,
+                    'model_calls': stats['model_calls'],
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'output_tokens': stats['output_tokens'],
+                    'cost_usd': round(stats['cost_usd'], 6),
+                    'parse_failures': stats['parse_failures'],
+                    'repairs': dict(stats['repairs']),
+                    'cache': dict(stats['cache']),
+                    'latency_histogram': [
+                        {'le_ms': limit, 'count': count}
+                        for limit, count in zip(limits, stats['histogram'])
+                    ],
+                }
+
+        return {'methods': methods, 'log_path': self.log_path}
+
+
+def instrumented(method):
+    """
+    Decorador para métodos de ComedyAIAgent: registra cada llamada en self.metrics
+
+    Los generadores se instrumentan de principio a fin del consumo, ejecutando
+    cada paso en un contexto propio para no mezclar su registro con el de la
+    petición que los va leyendo.
+    """
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(self, *args, **kwargs) -> Iterator:
+            metrics = getattr(self, 'metrics', None)
+            if not metrics:
+                yield from method(self, *args, **kwargs)
+                return
+
+            ctx = contextvars.copy_context()
+            record, _ = ctx.run(metrics.start, name)
+            items = ctx.run(method, self, *args, **kwargs)
+            error = None
+            try:
+                while True:
+                    try:
+                        item = ctx.run(next, items)
+                    except StopIteration:
+                        break
+                    yield item
+            except BaseException as e:
+                error = e
+                ctx.run(items.close)
+                raise
+            finally:
+                metrics.finish(record, error=error)
+
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = getattr(self, 'metrics', None)
+        if not metrics:
+            return method(self, *args, **kwargs)
+
+        record, token = metrics.start(name)
+        try:
+            result = method(self, *args, **kwargs)
+        except BaseException as e:
+            metrics.finish(record, token, error=e)
+            raise
+        metrics.finish(record, token)
+        return result
+
+    return wrapper
@@ -0,0 +1,425 @@
+"""
+Timeouts, reintentos, peticiones de cobertura (hedging) y circuit breaker
+para las llamadas a Gemini
+
+- Deadline por petición HTTP (contextvar): cada llamada usa como timeout el
+  mínimo entre el de su tarea y el tiempo que le queda a la petición
+- Reintentos con backoff exponencial y jitter ante errores transitorios
+  (timeouts, 5xx, errores de conexión); los 429 los gestiona el planificador
+- Hedging opcional: si la llamada supera el p95 de latencia de su tarea se
+  lanza una segunda y se usa la primera que termine
+- Circuit breaker: si la tasa de errores se dispara deja de llamar al modelo
+  durante un tiempo y falla al instante
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_deadline = contextvars.ContextVar('ai_deadline', default=None)
+
+_RETRYABLE_CODES = (500, 502, 503, 504)
+_RETRYABLE_NAMES = ('DeadlineExceeded', 'ServiceUnavailable', 'InternalServerError',
+                    'BadGateway', 'GatewayTimeout', 'RetryError')
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuit breaker está abierto: Gemini está fallando y no se le llama"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Se agotó el tiempo de la llamada o de la petición"""
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Fija el tiempo disponible para las llamadas del contexto actual"""
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Ejecuta el bloque con un presupuesto de tiempo para las llamadas al modelo"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Segundos que quedan del presupuesto actual (None si no hay)"""
+    value = _deadline.get()
+    return None if value is None else value - time.monotonic()
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Errores transitorios que merece la pena reintentar"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, DeadlineExceededError):
+        # Un timeout del intento sí; agotar el presupuesto de la petición no
+        return not getattr(error, 'budget', False)
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in _RETRYABLE_CODES \
+        or type(error).__name__ in _RETRYABLE_NAMES
+
+
+class CallPolicy:
+    """Timeout, reintentos y hedging de las llamadas de una tarea"""
+
+    def __init__(self, timeout: float = 30.0, retries: int = 2, backoff: float = 0.5,
+                 hedge: bool = False, hedge_after: Optional[float] = None):
+        """
+        Args:
+            timeout: Segundos máximos por intento
+            retries: Reintentos ante errores transitorios
+            backoff: Espera base entre reintentos (se duplica en cada uno, con jitter)
+            hedge: Lanzar una segunda petición si la primera tarda demasiado
+            hedge_after: Segundos tras los que lanzarla (por defecto el p95 de la tarea)
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+
+    def updated(self, overrides: Dict) -> 'CallPolicy':
+        """Copia de la política con los valores indicados cambiados"""
+        values = dict(vars(self))
+        values.update({k: v for k, v in overrides.items() if k in values})
+        return CallPolicy(**values)
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+class CircuitBreaker:
+    """Circuit breaker por tasa de errores en una ventana de llamadas recientes"""
+
+    def __init__(self, error_rate: float = 0.5, min_calls: int = 10, window: int = 20,
+                 open_seconds: float = 30.0):
+        """
+        Args:
+            error_rate: Tasa de errores (0-1) a partir de la que se abre
+            min_calls: Llamadas mínimas en la ventana antes de evaluar la tasa
+            window: Número de llamadas recientes consideradas
+            open_seconds: Tiempo abierto antes de dejar pasar una llamada de prueba
+        """
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self):
+        """
+        Comprueba si se puede llamar al modelo
+
+        Raises:
+            CircuitOpenError: Si el breaker está abierto
+        """
+        with self._lock:
+            if self._state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError("Gemini circuit breaker is open; failing fast")
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+
+            if self._state == STATE_HALF_OPEN:
+                # Una sola llamada de prueba a la vez
+                if self._probe_in_flight:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError("Gemini circuit breaker is half-open; probe in flight")
+                self._probe_in_flight = True
+
+    def release(self):
+        """Deshace allow() cuando la llamada no llega a hacerse (no cuenta como resultado)"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, success: bool):
+        """Registra el resultado de una llamada"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self._state = STATE_CLOSED
+                    self._outcomes.clear()
+                    logger.info("Gemini circuit breaker closed")
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self._state == STATE_CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._open()
+
+    def _open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._stats['opened'] += 1
+        logger.warning(f"Gemini circuit breaker opened for {self.open_seconds:.0f}s")
+
+    def get_state(self) -> Dict:
+        """Estado actual y tasa de errores de la ventana"""
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            state = self._state
+            retry_in = 0.0
+            if state == STATE_OPEN:
+                retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            return {
+                'state': state,
+                'window_calls': calls,
+                'window_errors': failures,
+                'error_rate': round(failures / calls, 3) if calls else 0.0,
+                'retry_in': round(retry_in, 1),
+                **self._stats
+            }
+
+
+class ResilientCaller:
+    """Ejecuta llamadas al modelo con deadline, reintentos, hedging y breaker"""
+
+    # Latencias recientes por tarea para calcular el umbral de hedging
+    LATENCY_SAMPLES = 100
+
+    def __init__(self, default_policy: CallPolicy, policies: Optional[Dict[str, Dict]] = None,
+                 breaker: Optional[CircuitBreaker] = None, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 20, max_workers: int = 16):
+        """
+        Args:
+            default_policy: Política por defecto
+            policies: Cambios por tarea, p.ej. {'identify_patterns': {'timeout': 90}}
+            breaker: Circuit breaker compartido (None = sin breaker)
+            hedge_quantile: Percentil de latencia a partir del que se cubre
+            hedge_min_samples: Latencias necesarias antes de usar el percentil
+            max_workers: Hilos para ejecutar intentos (incluye los abandonados)
+        """
+        self.default_policy = default_policy
+        self.policies = {
+            task: default_policy.updated(overrides)
+            for task, overrides in (policies or {}).items()
+        }
+        self.breaker = breaker
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-call')
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._stats = {'calls': 0, 'retries': 0, 'timeouts': 0, 'hedged': 0,
+                       'hedge_wins': 0, 'failures': 0}
+
+    def policy(self, task: str) -> CallPolicy:
+        return self.policies.get(task, self.default_policy)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _observe(self, task: str, latency: float):
+        with self._lock:
+            samples = self._latencies.setdefault(task, deque(maxlen=self.LATENCY_SAMPLES))
+            samples.append(latency)
+
+    def _hedge_delay(self, task: str, policy: CallPolicy) -> Optional[float]:
+        """Segundos tras los que lanzar la petición de cobertura (None = no cubrir)"""
+        if not policy.hedge:
+            return None
+        if policy.hedge_after is not None:
+            return policy.hedge_after
+        with self._lock:
+            samples = sorted(self._latencies.get(task, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_quantile))]
+
+    def _attempt(self, task: str, call: Callable[[float], Any], timeout: float,
+                 hedge_delay: Optional[float],
+                 before_hedge: Optional[Callable[[], bool]] = None) -> Any:
+        """Un intento (con su posible petición de cobertura) limitado a `timeout`"""
+        start = time.monotonic()
+        ctx = contextvars.copy_context()
+        futures = [self._pool.submit(ctx.run, call, timeout)]
+        hedged = None
+
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            # Sin cuota libre para la cobertura se sigue esperando a la primera
+            if not done and (before_hedge is None or before_hedge()):
+                self._count('hedged')
+                logger.info(f"Hedging slow {task} call after {hedge_delay:.2f}s")
+                hedged = self._pool.submit(contextvars.copy_context().run, call, timeout)
+                futures.append(hedged)
+
+        error = None
+        pending = set(futures)
+        while pending:
+            left = timeout - (time.monotonic() - start)
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self._count('hedge_wins')
+                    self._observe(task, time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+
+        # Los intentos que siguen en curso se abandonan (no se pueden cancelar)
+        self._count('timeouts')
+        raise DeadlineExceededError(f"Gemini call for {task} timed out after {timeout:.2f}s")
+
+    def call(self, task: str, call: Callable[[float], Any],
+             before_attempt: Optional[Callable[[Optional[float]], Any]] = None,
+             before_hedge: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Ejecuta `call(timeout)` aplicando la política de la tarea
+
+        Args:
+            task: Tarea (determina la política)
+            call: Función que hace la petición con el timeout indicado
+            before_attempt: Se llama antes de cada intento, fuera de su timeout,
+                con el presupuesto restante (p.ej. esperar cuota); sus errores
+                se propagan sin reintentar ni contar para el breaker
+            before_hedge: Indica si se puede lanzar la petición de cobertura
+                (p.ej. si hay cuota libre)
+
+        Raises:
+            CircuitOpenError: Si el breaker está abierto
+            DeadlineExceededError: Si se agota el timeout o el presupuesto de la petición
+        """
+        policy = self.policy(task)
+        hedge_delay = self._hedge_delay(task, policy)
+        self._count('calls')
+
+        for attempt in range(policy.retries + 1):
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                error = DeadlineExceededError(f"Request budget exhausted before {task} call")
+                error.budget = True
+                raise error
+
+            if self.breaker:
+                self.breaker.allow()
+            if before_attempt:
+                try:
+                    before_attempt(remaining)
+                except Exception:
+                    if self.breaker:
+                        self.breaker.release()
+                    self._count('failures')
+                    raise
+                remaining = remaining_time()
+                if remaining is not None and remaining <= 0:
+                    if self.breaker:
+                        self.breaker.release()
+                    error = DeadlineExceededError(f"Request budget exhausted before {task} call")
+                    error.budget = True
+                    raise error
+
+            timeout = policy.timeout if remaining is None else min(policy.timeout, remaining)
+            try:
+                result = self._attempt(task, call, timeout, hedge_delay, before_hedge)
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                # Solo los fallos del servicio cuentan para el breaker (no 429 ni 4xx)
+                if self.breaker:
+                    self.breaker.record(not retryable)
+                if not retryable or attempt == policy.retries:
+                    self._count('failures')
+                    raise
+
+                delay = policy.backoff * (2 ** attempt) * (0.5 + random.random())
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    self._count('failures')
+                    raise
+                logger.warning(f"Retrying {task} call in {delay:.2f}s after error: {e} "
+                               f"(attempt {attempt + 1}/{policy.retries})")
+                self._count('retries')
+                time.sleep(delay)
+                continue
+
+            if self.breaker:
+                self.breaker.record(True)
+            return result
+
+    def call_once(self, task: str, call: Callable[[float], Any]) -> Any:
+        """
+        Ejecuta `call(timeout)` sin reintentos ni hedging (streaming)
+
+        Respeta el breaker y el presupuesto; el timeout se pasa a la llamada.
+        """
+        policy = self.policy(task)
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            error = DeadlineExceededError(f"Request budget exhausted before {task} call")
+            error.budget = True
+            raise error
+
+        if self.breaker:
+            self.breaker.allow()
+        self._count('calls')
+        try:
+            result = call(policy.timeout if remaining is None else min(policy.timeout, remaining))
+        except Exception as e:
+            if self.breaker:
+                self.breaker.record(not is_retryable_error(e))
+            self._count('failures')
+            raise
+
+        if self.breaker:
+            self.breaker.record(True)
+        return result
+
+    def get_stats(self) -> Dict:
+        """Contadores, políticas y percentiles de latencia por tarea"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = {task: sorted(samples) for task, samples in self._latencies.items()}
+
+        stats['latency'] = {
+            task: {
+                'samples': len(samples),
+                'p50': round(samples[len(samples) // 2], 3),
+                'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            }
+            for task, samples in latencies.items() if samples
+        }
+        stats['default_policy'] = self.default_policy.to_dict()
+        stats['policies'] = {task: p.to_dict() for task, p in self.policies.items()}
+        if self.breaker:
+            stats['breaker'] = self.breaker.get_state()
+        return stats
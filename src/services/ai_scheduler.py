@@ -0,0 +1,355 @@
+"""
+Planificador de peticiones a Gemini consciente de la cuota
+
+- Token bucket de peticiones por minuto (RPM) y tokens por minuto (TPM)
+  compartido entre workers mediante SQLite (transacciones BEGIN IMMEDIATE)
+- Cola de prioridad por proceso: las peticiones interactivas adelantan a las
+  de segundo plano (lotes, jobs)
+- Reintentos ante 429 respetando el retry-after que indique la API; la pausa
+  se comparte con todos los workers
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_current_priority = contextvars.ContextVar('ai_priority', default=PRIORITY_INTERACTIVE)
+
+_RETRY_PATTERNS = [
+    re.compile(r'retry in ([\d.]+)\s*s', re.IGNORECASE),
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)', re.IGNORECASE),
+    re.compile(r'retry[- ]after[:=\s]+([\d.]+)', re.IGNORECASE),
+]
+
+
+class RateLimitTimeout(RuntimeError):
+    """No se obtuvo cuota dentro del tiempo máximo de espera"""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Detecta un 429 / ResourceExhausted de la API de Gemini
+
+    Solo por el código o el tipo: buscar "429" en el mensaje confundiría
+    cualquier error que lo cite (un id, un recuento de tokens) con un 429.
+    """
+    return (getattr(error, 'code', None) == 429
+            or type(error).__name__ == 'ResourceExhausted')
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """Segundos de espera sugeridos por la API en un error 429, si los hay"""
+    value = getattr(error, 'retry_after', None)
+    if value is not None:
+        return float(value)
+
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    if headers.get('Retry-After'):
+        try:
+            return float(headers['Retry-After'])
+        except ValueError:
+            pass
+
+    for pattern in _RETRY_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class GeminiScheduler:
+    """Controla cuándo puede salir cada llamada al modelo"""
+
+    def __init__(self, rpm: int, tpm: int, state_path: Optional[str] = None,
+                 max_wait: float = 60.0, max_retries: int = 3, base_backoff: float = 2.0):
+        """
+        Args:
+            rpm: Peticiones por minuto permitidas
+            tpm: Tokens por minuto permitidos
+            state_path: Fichero SQLite compartido entre workers
+            max_wait: Espera máxima en cola antes de rendirse (segundos)
+            max_retries: Reintentos ante 429
+            base_backoff: Espera base si el 429 no trae retry-after (segundos)
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.state_path = self._init_state(state_path)
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap de (prioridad, secuencia)
+        self._sequence = itertools.count()
+        self._stats = {
+            'acquired': 0,
+            'timeouts': 0,
+            'rate_limited': 0,
+            'retries': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'last_wait': 0.0,
+        }
+
+    def _init_state(self, state_path: Optional[str]) -> str:
+        """Crea la tabla de estado compartido (en /tmp si la ruta no es usable)"""
+        candidates = [state_path] if state_path else []
+        candidates.append(os.path.join(tempfile.gettempdir(), 'metodo_ai_scheduler.sqlite3'))
+
+        for path in candidates:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with self._connect(path) as conn:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS buckets ('
+                        'name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)'
+                    )
+                return path
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"AI scheduler state unavailable at {path}: {e}")
+
+        raise RuntimeError("No usable location for AI scheduler state")
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        return sqlite3.connect(path, timeout=10, isolation_level=None)
+
+    @staticmethod
+    @contextmanager
+    def priority(level: int):
+        """Ejecuta el bloque con la prioridad indicada (menor = antes)"""
+        token = _current_priority.set(level)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    def _take(self, tokens: int) -> float:
+        """
+        Intenta consumir 1 petición y `tokens` tokens de los buckets compartidos
+
+        Returns:
+            0 si se consumieron; si no, segundos hasta que haya cuota
+        """
+        now = time.time()
+        tokens = min(tokens, self.tpm)
+        limits = {'rpm': (self.rpm, 1), 'tpm': (self.tpm, tokens)}
+
+        conn = self._connect(self.state_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = dict(
+                (name, (level, updated))
+                for name, level, updated in conn.execute('SELECT name, level, updated FROM buckets')
+            )
+
+            cooldown = rows.get('cooldown', (0.0, 0.0))[0]
+            if cooldown > now:
+                conn.execute('ROLLBACK')
+                return cooldown - now
+
+            wait = 0.0
+            levels = {}
+            for name, (capacity, cost) in limits.items():
+                level, updated = rows.get(name, (capacity, now))
+                level = min(capacity, level + (now - updated) * capacity / 60.0)
+                levels[name] = level - cost
+                if level < cost:
+                    wait = max(wait, (cost - level) * 60.0 / capacity)
+
+            if wait > 0:
+                conn.execute('ROLLBACK')
+                return wait
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)',
+                [(name, level, now) for name, level in levels.items()]
+            )
+            conn.execute('COMMIT')
+            return 0.0
+        finally:
+            conn.close()
+
+    def adjust_tokens(self, delta: int):
+        """Corrige el bucket de tokens con el consumo real (positivo = gastar más)"""
+        if not delta:
+            return
+        conn = self._connect(self.state_path)
+        try:
+            conn.execute(
+                'UPDATE buckets SET level = MIN(?, level - ?) WHERE name = ?',
+                (self.tpm, delta, 'tpm')
+            )
+        finally:
+            conn.close()
+
+    def _set_cooldown(self, seconds: float):
+        """Pausa todas las peticiones de todos los workers durante `seconds`"""
+        conn = self._connect(self.state_path)
+        try:
+            conn.execute(
+                'INSERT INTO buckets (name, level, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET level = MAX(level, excluded.level), '
+                'updated = excluded.updated',
+                ('cooldown', time.time() + seconds, time.time())
+            )
+        finally:
+            conn.close()
+
+    def acquire(self, tokens: int, priority: Optional[int] = None,
+                max_wait: Optional[float] = None) -> float:
+        """
+        Espera turno y cuota para una llamada
+
+        Args:
+            tokens: Tokens estimados de la llamada (entrada + salida)
+            priority: Prioridad (por defecto la del contexto actual)
+            max_wait: Límite de espera de esta llamada (p.ej. lo que queda del
+                presupuesto de la petición); nunca más que self.max_wait
+
+        Returns:
+            Segundos esperados en cola
+
+        Raises:
+            RateLimitTimeout: Si se supera el límite de espera
+        """
+        if priority is None:
+            priority = _current_priority.get()
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    waited = time.monotonic() - start
+                    if waited > limit:
+                        self._stats['timeouts'] += 1
+                        raise RateLimitTimeout(
+                            f"No Gemini quota available after {waited:.1f}s"
+                        )
+
+                    timeout = 1.0
+                    if self._waiting[0] == ticket:
+                        wait = self._take(tokens)
+                        if wait <= 0:
+                            break
+                        timeout = min(wait, 1.0)
+                    # Despertar a tiempo de rendirse al agotar el límite
+                    self._cond.wait(max(0.0, min(timeout, limit - waited)) + 0.001)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self._stats['acquired'] += 1
+            self._stats['total_wait'] += waited
+            self._stats['last_wait'] = waited
+            self._stats['max_wait'] = max(self._stats['max_wait'], waited)
+
+        return waited
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Consume cuota solo si la hay ya y nadie espera turno (sin bloquear)"""
+        with self._cond:
+            if self._waiting or self._take(tokens) > 0:
+                return False
+            self._stats['acquired'] += 1
+            return True
+
+    def run(self, call: Callable[[], Any], tokens: int, priority: Optional[int] = None) -> Any:
+        """
+        Ejecuta `call` respetando la cuota y reintentando los 429
+
+        Args:
+            call: Función sin argumentos que hace la petición
+            tokens: Tokens estimados de la llamada
+            priority: Prioridad (por defecto la del contexto actual)
+        """
+        def attempt():
+            self.acquire(tokens, priority)
+            return call()
+
+        return self.retry_rate_limited(attempt)
+
+    def retry_rate_limited(self, call: Callable[[], Any]) -> Any:
+        """
+        Ejecuta `call` reintentando los 429 tras la pausa que indique la API
+
+        A diferencia de run(), `call` pide su propia cuota con acquire() (así
+        quien la llama puede esperar cuota fuera de sus timeouts).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+
+                with self._cond:
+                    self._stats['rate_limited'] += 1
+                if attempt == self.max_retries:
+                    raise
+
+                hint = retry_after_hint(e)
+                delay = hint if hint is not None else (
+                    self.base_backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+                )
+                logger.warning(f"Gemini rate limited, retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                self._set_cooldown(delay)
+                with self._cond:
+                    self._stats['retries'] += 1
+
+    def get_stats(self) -> Dict:
+        """Profundidad de cola, esperas y estado de los buckets"""
+        with self._cond:
+            stats = dict(self._stats)
+            queue = [priority for priority, _ in self._waiting]
+
+        stats['queue_depth'] = len(queue)
+        stats['queue_interactive'] = sum(1 for p in queue if p <= PRIORITY_INTERACTIVE)
+        stats['queue_background'] = len(queue) - stats['queue_interactive']
+        stats['avg_wait'] = (round(stats['total_wait'] / stats['acquired'], 3)
+                             if stats['acquired'] else 0.0)
+        for key in ('total_wait', 'max_wait', 'last_wait'):
+            stats[key] = round(stats[key], 3)
+
+        stats['limits'] = {'rpm': self.rpm, 'tpm': self.tpm}
+        try:
+            conn = self._connect(self.state_path)
+            try:
+                now = time.time()
+                for name, level, updated in conn.execute(
+                        'SELECT name, level, updated FROM buckets'):
+                    if name == 'cooldown':
+                        stats['cooldown_remaining'] = round(max(0.0, level - now), 2)
+                    else:
+                        capacity = self.rpm if name == 'rpm' else self.tpm
+                        stats[f'{name}_available'] = round(
+                            min(capacity, level + (now - updated) * capacity / 60.0), 1
+                        )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read AI scheduler state: {e}")
+
+        return stats
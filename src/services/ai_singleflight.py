@@ -0,0 +1,77 @@
+"""
+Coalescencia de llamadas idénticas en curso (single-flight)
+
+Si varios hilos piden la misma clave mientras la primera llamada sigue en
+curso, solo esa llamada llega al modelo; el resto espera y recibe una copia
+del mismo resultado (o la misma excepción). También el que la ejecutó recibe
+una copia, para que modificarla no afecte a los demás.
+"""
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _InFlightCall:
+    """Llamada en curso compartida por varios hilos"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Exception = None
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecuta func() salvo que ya haya una llamada en curso con la misma clave
+
+        Returns:
+            Tupla (resultado, compartido); compartido es True si se reutilizó
+            el resultado de otra llamada
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            logger.info("Coalesced identical in-flight AI request")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Copia para que ningún llamador modifique el resultado de otro
+            return copy.deepcopy(call.result), True
+
+        try:
+            # Se guarda una copia propia antes de avisar a los demás: así ni lo
+            # que func() conserve (p.ej. la caché) ni el líder al modificar su
+            # resultado pueden alterar lo que reciben los que esperan
+            call.result = copy.deepcopy(func())
+            return copy.deepcopy(call.result), False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict:
+        """Llamadas ejecutadas, coalescidas y en curso"""
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
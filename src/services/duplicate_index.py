@@ -0,0 +1,255 @@
+"""
+Detección de casi duplicados con MinHash + LSH
+
+Cada texto (normalizado, sin acentos ni puntuación) se reduce a su conjunto de
+5-gramas de caracteres y este a una firma MinHash de num_perm enteros: la
+fracción de posiciones iguales entre dos firmas estima la similitud de Jaccard
+de los conjuntos. La firma se parte en `bands` bandas y dos textos son
+candidatos si coinciden en alguna banda entera, así que una consulta solo
+compara con los textos que comparten cubo, no con toda la colección.
+
+Un único índice cubre los chistes y las ideas de la bitácora, para detectar
+también una idea apuntada que ya está escrita como chiste.
+"""
+import logging
+import re
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from src.config import config
+from src.services import text_indexes
+from src.services.text_indexes import CollectionView, MemoryIndex
+from src.utils.lazy import LazyProxy
+from src.utils.text import fold_text
+
+logger = logging.getLogger(__name__)
+
+KIND_JOKE = 'chiste'
+KIND_IDEA = 'bitacora'
+
+SHINGLE_SIZE = 5
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+class MinHasher:
+    """Firmas MinHash con hashing multiply-shift sobre los CRC32 de los n-gramas"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        import numpy as np
+
+        self.np = np
+        self.num_perm = num_perm
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2 ** 64, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text: str) -> set:
+        # Dos borradores del mismo chiste suelen diferir en signos y mayúsculas
+        folded = ' '.join(_PUNCTUATION.sub(' ', fold_text(text)).split())
+        if len(folded) <= SHINGLE_SIZE:
+            return {folded} if folded else set()
+        return {folded[i:i + SHINGLE_SIZE] for i in range(len(folded) - SHINGLE_SIZE + 1)}
+
+    def signature(self, text: str):
+        """Firma de `num_perm` uint32 (None si el texto no tiene contenido)"""
+        np = self.np
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # (a·x + b) mod 2^64, quedándose con los 32 bits altos
+        permuted = (self._a * hashes + self._b) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class DuplicateIndex(MemoryIndex):
+    """Índice LSH de firmas MinHash con estimación de Jaccard de los candidatos"""
+
+    def __init__(self, name: str, loader, num_perm: int = 128, bands: int = 32,
+                 threshold: float = 0.5, refresh_seconds: float = 600):
+        """
+        Args:
+            name: Nombre para logs y estadísticas
+            loader: Devuelve las tuplas (id, texto, tipo) con las que se construye
+            num_perm: Permutaciones MinHash (se redondea a múltiplo de `bands`)
+            bands: Bandas LSH; más bandas detectan parecidos más bajos con más candidatos
+            threshold: Jaccard estimado mínimo para considerar duplicado
+            refresh_seconds: Antigüedad a partir de la cual se reconstruye (0 = nunca)
+        """
+        super().__init__(name, loader, refresh_seconds)
+        self.bands = bands
+        self.rows = max(1, num_perm // bands)
+        self.threshold = threshold
+        self.hasher = MinHasher(self.bands * self.rows)
+
+        self._signatures: Dict[str, object] = {}
+        self._kinds: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+        self._candidates = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.bands)]
+
+    def _add(self, state, item_id: str, signature, kind: str):
+        signatures, kinds, buckets = state
+        signatures[item_id] = signature
+        kinds[item_id] = kind
+        for band, key in enumerate(self._band_keys(signature)):
+            buckets[band].setdefault(key, set()).add(item_id)
+
+    # ------------------------------------------------------------------
+    # Construcción y actualización incremental
+    # ------------------------------------------------------------------
+
+    def _build(self):
+        state = ({}, {}, [{} for _ in range(self.bands)])
+        for item_id, text, kind in self.loader():
+            signature = self.hasher.signature(text)
+            if signature is not None:
+                self._add(state, item_id, signature, kind)
+        return state
+
+    def _install(self, state):
+        self._signatures, self._kinds, self._buckets = state
+
+    def _upsert(self, item_id: str, text: str, kind: str):
+        self._remove(item_id)
+        signature = self.hasher.signature(text)
+        if signature is not None:
+            self._add((self._signatures, self._kinds, self._buckets), item_id, signature, kind)
+
+    def _remove(self, item_id: str):
+        signature = self._signatures.pop(item_id, None)
+        self._kinds.pop(item_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _find(self, signature, exclude: Optional[str], threshold: Optional[float],
+              limit: int) -> List[Dict]:
+        threshold = self.threshold if threshold is None else threshold
+        start = time.perf_counter()
+
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            candidates.discard(exclude)
+            self._candidates += len(candidates)
+
+            results = []
+            for item_id in candidates:
+                similarity = float((self._signatures[item_id] == signature).mean())
+                if similarity >= threshold:
+                    results.append({'id': item_id, 'kind': self._kinds[item_id],
+                                    'similarity': round(similarity, 3)})
+
+        self._record_query(start)
+        results.sort(key=lambda r: r['similarity'], reverse=True)
+        return results[:limit]
+
+    def query(self, text: str, exclude: Optional[str] = None, threshold: Optional[float] = None,
+              limit: int = 20) -> List[Dict]:
+        """
+        Textos indexados casi iguales a `text`
+
+        Returns:
+            Lista de {'id', 'kind', 'similarity'} (Jaccard estimado, descendente)
+        """
+        self.ensure_loaded()
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return []
+        return self._find(signature, exclude, threshold, limit)
+
+    def query_id(self, item_id: str, threshold: Optional[float] = None,
+                 limit: int = 20) -> Optional[List[Dict]]:
+        """Casi duplicados de un elemento del índice (None si no está indexado)"""
+        self.ensure_loaded()
+        with self._lock:
+            signature = self._signatures.get(item_id)
+        if signature is None:
+            return None
+        return self._find(signature, item_id, threshold, limit)
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        with self._lock:
+            stats.update({
+                'num_perm': self.bands * self.rows,
+                'bands': self.bands,
+                'threshold': self.threshold,
+                'by_kind': {kind: list(self._kinds.values()).count(kind)
+                            for kind in (KIND_JOKE, KIND_IDEA)},
+                'avg_candidates': round(self._candidates / self._queries, 1)
+                if self._queries else 0.0,
+            })
+        return stats
+
+
+def _load_items():
+    for item_id, text in text_indexes.load(text_indexes.JOKES, text_indexes.joke_text):
+        yield item_id, text, KIND_JOKE
+    for item_id, text in text_indexes.load(text_indexes.BITACORA, text_indexes.idea_text):
+        yield item_id, text, KIND_IDEA
+
+
+def possible_duplicates(item_id: str, text: str) -> Optional[List[Dict]]:
+    """
+    Casi duplicados de un chiste o idea recién guardado, para avisar al crearlo
+
+    Nunca lanza excepción ni espera a construir el índice: si aún no está
+    cargado (worker recién arrancado) lanza la carga en segundo plano y
+    devuelve None, igual que si la comprobación falla. Sin índice configurado
+    devuelve lista vacía.
+    """
+    if not duplicate_index:
+        return []
+    try:
+        if not duplicate_index.warm_up():
+            logger.info(f"Duplicate check skipped for {item_id}: index still loading")
+            return None
+        found = duplicate_index.query_id(item_id)
+        if found is None:
+            found = duplicate_index.query(text, exclude=item_id)
+        if found:
+            logger.info(f"{item_id} has {len(found)} possible duplicates")
+        return found
+    except Exception as e:
+        logger.warning(f"Duplicate check failed for {item_id}: {e}")
+        return None
+
+
+# Instancia global (NumPy se importa al crear el índice)
+duplicate_index = LazyProxy(
+    'duplicate_index',
+    lambda: DuplicateIndex('duplicates', _load_items,
+                           num_perm=config.DUPLICATES_NUM_PERM,
+                           bands=config.DUPLICATES_BANDS,
+                           threshold=config.DUPLICATES_THRESHOLD,
+                           refresh_seconds=config.TEXT_INDEX_REFRESH_SECONDS),
+    available=lambda: config.DUPLICATES_ENABLED
+)
+
+text_indexes.register_index(text_indexes.JOKES, CollectionView(duplicate_index, KIND_JOKE),
+                            text_indexes.joke_text)
+text_indexes.register_index(text_indexes.BITACORA, CollectionView(duplicate_index, KIND_IDEA),
+                            text_indexes.idea_text)
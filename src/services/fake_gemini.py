@@ -0,0 +1,351 @@
+"""
+Sustituto local de Gemini para pruebas sin red y de carga
+
+Imita la parte del SDK que usa ComedyAIAgent (GenerativeModel.generate_content,
+con y sin streaming, y usage_metadata) y devuelve JSON válido para cada tarea
+de prompts.py generado a partir del propio prompt. Permite simular:
+
+- Latencia con distintas distribuciones (fixed, uniform, normal, lognormal)
+- Errores 429 (con retry-after en el mensaje) y 500
+- Respuestas truncadas, como cuando se alcanza max_output_tokens
+
+Se activa con AI_FAKE_GEMINI=True; no consume cuota ni necesita API key.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TECHNIQUES = ['exageración', 'incongruencia', 'wordplay', 'observacional', 'autoburla',
+              'sarcasmo', 'regla de tres', 'absurdo', 'comparación', 'callback']
+TOPICS = ['familia', 'tecnología', 'trabajo', 'relaciones', 'viajes', 'comida', 'salud']
+TONES = ['ligero', 'oscuro', 'sarcástico', 'absurdo', 'tierno']
+RUPTURES = ['incongruencia', 'reinterpretación', 'exageración', 'deflación',
+            'inversión', 'yuxtaposición', 'sorpresa', 'violación de norma']
+CONCEPT_TYPES = ['simple', 'compuesto', 'concreto', 'abstracto']
+
+
+class FakeAPIError(Exception):
+    """Error con código HTTP, con la misma forma que los de google.api_core"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def _quoted(prompt: str) -> str:
+    """Primer texto entre comillas del prompt (el chiste)"""
+    match = re.search(r'"(.*?)"', prompt, re.DOTALL)
+    return match.group(1).strip() if match else prompt.strip()[:200]
+
+
+def _number(prompt: str, pattern: str, default: int) -> int:
+    match = re.search(pattern, prompt)
+    return int(match.group(1)) if match else default
+
+
+def _score(rng: random.Random) -> float:
+    return round(rng.uniform(5.0, 9.5), 1)
+
+
+def _analyze_joke(prompt: str, rng: random.Random) -> Dict:
+    joke = _quoted(prompt)
+    middle = len(joke) // 2
+    scores = {key: _score(rng) for key in ('estructura', 'originalidad', 'timing')}
+    scores['general'] = round(sum(scores.values()) / 3, 1)
+    return {
+        'estructura': {
+            'setup': joke[:middle],
+            'punchline': joke[middle:],
+            'twist': 'el remate cambia el sentido del setup',
+            'callback': ''
+        },
+        'tecnicas': rng.sample(TECHNIQUES, 2),
+        'puntos_fuertes': ['situación reconocible', 'remate breve'],
+        'puntos_debiles': ['el setup podría ser más corto'],
+        'sugerencias': ['recortar el setup', 'retrasar la palabra clave', 'añadir un tag'],
+        'scores': scores
+    }
+
+
+def _suggest_improvements(prompt: str, rng: random.Random) -> Dict:
+    joke = _quoted(prompt)
+    return {
+        'version_timing': {'texto': f"{joke} (pausa)", 'cambios': 'pausa antes del remate'},
+        'version_claridad': {'texto': joke, 'cambios': 'setup más directo'},
+        'version_twist': {'texto': f"{joke} Y encima...", 'cambios': 'giro adicional'},
+        'recomendacion': rng.choice(['version_timing', 'version_claridad', 'version_twist'])
+    }
+
+
+def _generate_variations(prompt: str, rng: random.Random) -> Dict:
+    joke = _quoted(prompt)
+    count = _number(prompt, r'Genera (\d+) variaciones', 3)
+    return {'variaciones': [
+        {
+            'numero': i,
+            'texto': f"{joke} (variación {i})",
+            'tecnica': rng.choice(TECHNIQUES),
+            'estilo': rng.choice(TONES),
+            'diferencia': 'cambia el remate'
+        }
+        for i in range(1, count + 1)
+    ]}
+
+
+def _brainstorm_ideas(prompt: str, rng: random.Random) -> Dict:
+    count = _number(prompt, r'Genera (\d+) ideas', 5)
+    match = re.search(r'TEMA: (.*)', prompt)
+    topic = match.group(1).strip() if match else rng.choice(TOPICS)
+    return {'ideas': [
+        {
+            'numero': i,
+            'setup': f"Idea {i} sobre {topic}",
+            'direccion_punchline': 'llevar la situación al extremo',
+            'tecnica': rng.choice(TECHNIQUES),
+            'dificultad': rng.choice(['fácil', 'medio', 'difícil']),
+            'notas': ''
+        }
+        for i in range(1, count + 1)
+    ]}
+
+
+def _patterns(prompt: str, rng: random.Random) -> Dict:
+    total = _number(prompt, r'(\d+) chistes en total', 0) or _number(prompt, r'(\d+) CHISTES', 2)
+    techniques = rng.sample(TECHNIQUES, 3)
+    frequencies = sorted((rng.randint(1, total) for _ in techniques), reverse=True)
+    return {
+        'tecnicas_frecuentes': [
+            {'tecnica': t, 'frecuencia': f, 'porcentaje': round(f * 100 / total)}
+            for t, f in zip(techniques, frequencies)
+        ],
+        'temas_recurrentes': rng.sample(TOPICS, 2),
+        'estructura_preferida': 'setup corto y remate inesperado',
+        'fortalezas': ['observación precisa'],
+        'areas_mejora': ['variar la estructura'],
+        'estilo_distintivo': 'observacional con toques absurdos',
+        'recomendaciones': ['probar más callbacks']
+    }
+
+
+def _suggest_tags(prompt: str, rng: random.Random) -> Dict:
+    return {
+        'tema': rng.sample(TOPICS, 2),
+        'tecnica': rng.sample(TECHNIQUES, 2),
+        'audiencia': ['general'],
+        'tono': [rng.choice(TONES)]
+    }
+
+
+def _analyze_concepts(prompt: str, rng: random.Random) -> Dict:
+    joke = _quoted(prompt)
+    return {
+        'concepto_principal': joke[:60],
+        'tipo_concepto': rng.choice(CONCEPT_TYPES),
+        'explicacion_tipo': 'se apoya en una situación cotidiana',
+        'mapa_conceptos': {
+            'concepto_inicial': joke[:30],
+            'asociaciones_esperadas': ['rutina', 'normalidad'],
+            'asociacion_inesperada': 'el remate lo lleva al absurdo',
+            'conceptos_secundarios': rng.sample(TOPICS, 2),
+            'explicacion': 'el setup activa una asociación que el remate rompe'
+        },
+        'ejemplos_similares': [],
+        'potencial_expansion': 'añadir tags sobre la misma premisa'
+    }
+
+
+def _analyze_rupture(prompt: str, rng: random.Random) -> Dict:
+    return {
+        'tipo_ruptura': rng.choice(RUPTURES),
+        'subtipo_ruptura': 'situacional',
+        'explicacion_ruptura': 'el remate reinterpreta el setup',
+        'expectativa_creada': 'una conclusión lógica',
+        'momento_ruptura': 'la última frase',
+        'efecto_logrado': 'sorpresa',
+        'intensidad_ruptura': rng.choice(['suave', 'moderada', 'fuerte']),
+        'mejoras_posibles': ['retrasar la palabra clave'],
+        'ejemplos_similares': []
+    }
+
+
+def _analyze_combined(prompt: str, rng: random.Random) -> Dict:
+    return {
+        'analisis': _analyze_joke(prompt, rng),
+        'conceptos': _analyze_concepts(prompt, rng),
+        'ruptura': _analyze_rupture(prompt, rng),
+        'tags': _suggest_tags(prompt, rng),
+    }
+
+
+# Tarea de prompts.py -> generador de respuesta
+RESPONSE_BUILDERS: Dict[str, Callable[[str, random.Random], Dict]] = {
+    'analyze_joke': _analyze_joke,
+    'suggest_improvements': _suggest_improvements,
+    'generate_variations': _generate_variations,
+    'brainstorm_ideas': _brainstorm_ideas,
+    'identify_patterns': _patterns,
+    'merge_patterns': _patterns,
+    'suggest_tags': _suggest_tags,
+    'analyze_concepts': _analyze_concepts,
+    'analyze_rupture': _analyze_rupture,
+    'analyze_combined': _analyze_combined,
+}
+
+
+class FakeGemini:
+    """Comportamiento compartido por todos los modelos falsos (latencia, errores)"""
+
+    def __init__(self, latency: str = 'lognormal', latency_mean: float = 1.5,
+                 latency_stddev: float = 0.5, rate_limit_rate: float = 0.0,
+                 error_rate: float = 0.0, truncation_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency: Distribución de la latencia: fixed, uniform, normal o lognormal
+            latency_mean: Latencia media por llamada (segundos)
+            latency_stddev: Desviación típica de la latencia (segundos)
+            rate_limit_rate: Probabilidad de responder 429
+            error_rate: Probabilidad de responder 500
+            truncation_rate: Probabilidad de cortar la respuesta
+            seed: Semilla para resultados reproducibles
+        """
+        if latency not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.truncation_rate = truncation_rate
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'rate_limited': 0, 'errors': 0, 'truncated': 0}
+
+    def _random(self, func: Callable[[random.Random], float]) -> float:
+        with self._lock:
+            return func(self._rng)
+
+    def sample_latency(self) -> float:
+        """Latencia de una llamada según la distribución configurada"""
+        mean, stddev = self.latency_mean, self.latency_stddev
+        if self.latency == 'fixed' or mean <= 0:
+            return max(0.0, mean)
+        if self.latency == 'uniform':
+            return self._random(lambda r: max(0.0, r.uniform(mean - stddev, mean + stddev)))
+        if self.latency == 'normal':
+            return self._random(lambda r: max(0.0, r.gauss(mean, stddev)))
+
+        # lognormal con la media y desviación indicadas (cola larga, como la API real)
+        sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+        mu = math.log(mean) - sigma ** 2 / 2
+        return self._random(lambda r: r.lognormvariate(mu, sigma))
+
+    def respond(self, task: str, system: str, prompt: str,
+                max_output_tokens: Optional[int] = None):
+        """
+        Decide el resultado de una llamada
+
+        Returns:
+            Tupla (texto, latencia, usage_metadata)
+
+        Raises:
+            FakeAPIError: Si toca simular un 429 o un 500
+        """
+        latency = self.sample_latency()
+        roll = self._random(lambda r: r.random())
+
+        with self._lock:
+            self._stats['calls'] += 1
+            if roll < self.rate_limit_rate:
+                self._stats['rate_limited'] += 1
+                error = FakeAPIError(429, "Resource has been exhausted (e.g. check quota). "
+                                          "Please retry in 1.0s")
+            elif roll < self.rate_limit_rate + self.error_rate:
+                self._stats['errors'] += 1
+                error = FakeAPIError(500, "An internal error has occurred")
+            else:
+                error = None
+
+        if error:
+            # Los errores llegan antes que una respuesta completa
+            time.sleep(latency * 0.2)
+            raise error
+
+        builder = RESPONSE_BUILDERS.get(task)
+        payload = self._random(lambda r: builder(prompt, r)) if builder else {}
+        text = f"```json\n{json.dumps(payload, ensure_ascii=False, indent=2)}\n```"
+
+        if self._random(lambda r: r.random()) < self.truncation_rate:
+            cut = self._random(lambda r: r.uniform(0.3, 0.9))
+            text = text[:int(len(text) * cut)]
+            with self._lock:
+                self._stats['truncated'] += 1
+        elif max_output_tokens and len(text) // 4 > max_output_tokens:
+            # Igual que la API: la salida se corta al llegar a max_output_tokens
+            text = text[:max_output_tokens * 4]
+            with self._lock:
+                self._stats['truncated'] += 1
+
+        prompt_tokens = (len(system) + len(prompt)) // 4
+        output_tokens = len(text) // 4
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens
+        )
+        return text, latency, usage
+
+    def model(self, task: str, system: str = '',
+              max_output_tokens: Optional[int] = None) -> 'FakeGenerativeModel':
+        """Crea el modelo falso de una tarea"""
+        return FakeGenerativeModel(self, task, system, max_output_tokens)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+class FakeGenerativeModel:
+    """Sustituto de genai.GenerativeModel para una tarea concreta"""
+
+    # Tamaño de los trozos en streaming (caracteres)
+    STREAM_CHUNK = 48
+
+    def __init__(self, backend: FakeGemini, task: str, system: str = '',
+                 max_output_tokens: Optional[int] = None):
+        self.backend = backend
+        self.task = task
+        self.system = system
+        self.max_output_tokens = max_output_tokens
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        text, latency, usage = self.backend.respond(self.task, self.system, prompt,
+                                                    self.max_output_tokens)
+
+        if not stream:
+            time.sleep(latency)
+            return SimpleNamespace(text=text, usage_metadata=usage)
+
+        return self._stream(text, latency, usage)
+
+    def _stream(self, text: str, latency: float, usage=None) -> Iterator[SimpleNamespace]:
+        # ~30% de la latencia hasta el primer trozo y el resto repartido
+        chunks = [text[i:i + self.STREAM_CHUNK] for i in range(0, len(text), self.STREAM_CHUNK)]
+        time.sleep(latency * 0.3)
+        step = latency * 0.7 / max(1, len(chunks))
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(step)
+            # Como la API, el uso de tokens llega con el último trozo
+            last = i == len(chunks) - 1
+            yield SimpleNamespace(text=chunk, usage_metadata=usage if last else None)
@@ -0,0 +1,237 @@
+"""
+Cola de trabajos en segundo plano para operaciones largas de IA
+
+- Los trabajos se ejecutan en un pool de hilos del propio proceso, así las
+  peticiones HTTP responden 202 enseguida y el worker queda libre
+- El estado (progreso, resultado, error) se guarda en SQLite, de modo que
+  cualquier worker de gunicorn puede responder a GET /api/jobs/<id>
+- Los trabajos terminados se borran pasado JOBS_TTL
+- Las llamadas a Gemini de los trabajos van con prioridad de segundo plano,
+  detrás de las peticiones interactivas
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.config import config
+from src.services.ai_scheduler import GeminiScheduler, PRIORITY_BACKGROUND
+from src.utils.lazy import LazyProxy
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED)
+
+# handler(params, progress) -> resultado; progress(hechos, total)
+JobHandler = Callable[[Dict, Callable[[int, int], None]], Any]
+
+# Tipo de trabajo -> handler. Las rutas registran sus handlers al importarse,
+# sin necesidad de crear la cola (ni abrir SQLite) hasta el primer trabajo
+_handlers: Dict[str, JobHandler] = {}
+
+
+def register_handler(kind: str, handler: JobHandler):
+    """Registra la función que ejecuta los trabajos de un tipo"""
+    _handlers[kind] = handler
+
+
+def _pid_alive(pid: int) -> bool:
+    """Indica si el proceso sigue vivo en esta máquina"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Cola de trabajos con estado compartido en SQLite"""
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: int = 2,
+                 ttl: int = 24 * 3600, handlers: Optional[Dict[str, JobHandler]] = None):
+        """
+        Args:
+            db_path: Fichero SQLite con el estado de los trabajos
+            max_workers: Trabajos ejecutándose a la vez en este proceso
+            ttl: Segundos que se conservan los trabajos terminados
+            handlers: Registro tipo -> handler (compartido, no se copia)
+        """
+        self.ttl = ttl
+        self.db_path = self._init_db(db_path)
+        self._handlers: Dict[str, JobHandler] = {} if handlers is None else handlers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='job-worker')
+        self._lock = threading.Lock()
+        self._active = 0
+
+        self._recover()
+
+    def _init_db(self, db_path: Optional[str]) -> str:
+        """Crea la tabla de trabajos (en /tmp si la ruta no es usable)"""
+        candidates = [db_path] if db_path else []
+        candidates.append(os.path.join(tempfile.gettempdir(), 'metodo_jobs.sqlite3'))
+
+        for path in candidates:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = self._connect(path)
+                try:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS jobs ('
+                        'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, '
+                        'params TEXT, result TEXT, error TEXT, '
+                        'progress_done INTEGER NOT NULL DEFAULT 0, '
+                        'progress_total INTEGER NOT NULL DEFAULT 0, '
+                        'owner_pid INTEGER, created REAL NOT NULL, '
+                        'started REAL, finished REAL)'
+                    )
+                finally:
+                    conn.close()
+                return path
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Job queue state unavailable at {path}: {e}")
+
+        raise RuntimeError("No usable location for job queue state")
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        conn = self._connect(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _recover(self):
+        """Marca como fallidos los trabajos de procesos que ya no existen"""
+        rows = self._execute(
+            'SELECT id, owner_pid FROM jobs WHERE status IN (?, ?)',
+            (STATUS_QUEUED, STATUS_RUNNING)
+        )
+        for row in rows:
+            if row['owner_pid'] and not _pid_alive(row['owner_pid']):
+                self._update(row['id'], status=STATUS_FAILED,
+                             error='Interrupted by worker restart', finished=time.time())
+                logger.warning(f"Job {row['id']} interrupted by worker restart")
+
+    def _cleanup(self):
+        """Borra los trabajos terminados más antiguos que ttl"""
+        self._execute(
+            'DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?',
+            (*FINISHED_STATUSES, time.time() - self.ttl)
+        )
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        self._execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def submit(self, kind: str, params: Dict) -> Dict:
+        """
+        Encola un trabajo
+
+        Args:
+            kind: Tipo de trabajo (debe estar registrado)
+            params: Parámetros serializables a JSON para el handler
+
+        Returns:
+            Dict con el estado inicial del trabajo
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self._cleanup()
+
+        job_id = uuid.uuid4().hex
+        self._execute(
+            'INSERT INTO jobs (id, kind, status, params, owner_pid, created) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, kind, STATUS_QUEUED, json.dumps(params), os.getpid(), time.time())
+        )
+        self._executor.submit(self._run, job_id, kind, params)
+
+        logger.info(f"Job {job_id} queued ({kind})")
+        return self.get(job_id)
+
+    def _run(self, job_id: str, kind: str, params: Dict):
+        """Ejecuta un trabajo y guarda su resultado o error"""
+        with self._lock:
+            self._active += 1
+        self._update(job_id, status=STATUS_RUNNING, started=time.time())
+
+        def progress(done: int, total: int):
+            self._update(job_id, progress_done=done, progress_total=total)
+
+        try:
+            # Los hilos del pool no heredan el contexto: la prioridad se fija aquí
+            with GeminiScheduler.priority(PRIORITY_BACKGROUND):
+                result = self._handlers[kind](params, progress)
+            self._update(job_id, status=STATUS_SUCCEEDED, finished=time.time(),
+                         result=json.dumps(result))
+            logger.info(f"Job {job_id} succeeded ({kind})")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed ({kind}): {e}")
+            self._update(job_id, status=STATUS_FAILED, finished=time.time(), error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado, progreso y (si ha terminado) resultado de un trabajo"""
+        rows = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+
+        row = rows[0]
+        job = {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'progress': {'done': row['progress_done'], 'total': row['progress_total']},
+            'created': row['created'],
+            'started': row['started'],
+            'finished': row['finished'],
+        }
+        if row['status'] == STATUS_SUCCEEDED:
+            job['result'] = json.loads(row['result']) if row['result'] else None
+        if row['status'] == STATUS_FAILED:
+            job['error'] = row['error']
+        return job
+
+    def get_stats(self) -> Dict:
+        """Trabajos por estado (todos los workers) y activos en este proceso"""
+        rows = self._execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        with self._lock:
+            active = self._active
+        return {
+            'by_status': {row['status']: row['n'] for row in rows},
+            'active_in_process': active,
+        }
+
+
+# Instancia global de la cola (SQLite se abre en el primer uso)
+job_queue = LazyProxy(
+    'job_queue',
+    lambda: JobQueue(
+        db_path=config.JOBS_DB,
+        max_workers=config.JOBS_MAX_WORKERS,
+        ttl=config.JOBS_TTL,
+        handlers=_handlers
+    )
+)
@@ -0,0 +1,278 @@
+"""
+Búsqueda de texto completo en memoria sobre chistes, bitácora y análisis
+
+Índice invertido con ranking BM25. Los textos se normalizan para español:
+minúsculas, sin acentos, sin palabras vacías y con un stemming ligero que
+quita plurales y la vocal final (gato/gatos/gata comparten raíz), así que
+"madres" encuentra "madre" y "cancion" encuentra "canción".
+
+El título de cada documento cuenta doble. Los resultados llevan un fragmento
+del texto con los términos encontrados entre <mark>.
+"""
+import heapq
+import html
+import logging
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from src.config import config
+from src.services import text_indexes
+from src.services.text_indexes import CollectionView, MemoryIndex
+from src.utils.lazy import LazyProxy
+from src.utils.text import fold_text
+
+logger = logging.getLogger(__name__)
+
+KIND_JOKE = 'chiste'
+KIND_BITACORA = 'bitacora'
+KIND_ANALISIS = 'analisis'
+
+_WORD = re.compile(r'\w+')
+_SPACES = re.compile(r'\s+')
+
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes asi aun bajo bien cada casi
+como con contra cual cuando de del desde donde dos e el ella ellas ello ellos en entre
+era eran es esa esas ese eso esos esta estaba estan estar estas este esto estos fue
+fueron ha habia han hasta hay la las le les lo los mas me mi mis mucho muy nada ni no
+nos o os otra otro para pero poco por porque que se sea ser si sin sobre son su sus
+tambien te tiene tu tus u un una unas uno unos y ya yo
+""".split())
+
+
+def stem(token: str) -> str:
+    """Stemming ligero para español: plurales y vocal final (sobre texto sin acentos)"""
+    if len(token) <= 3:
+        return token
+    if token.endswith('ces'):
+        token = token[:-3] + 'z'  # voces -> voz
+    elif token.endswith('es') and token[-3] not in 'aeiou':
+        token = token[:-2]  # canciones -> cancion
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Términos indexables de un texto (normalizados y con stemming)"""
+    return [stem(word) for word in _WORD.findall(fold_text(text))
+            if word not in STOPWORDS]
+
+
+def highlight(text: str, terms: set, window: int = 30) -> str:
+    """
+    Fragmento de `window` palabras con más términos de la consulta, en HTML
+
+    Los términos encontrados van entre <mark>; el resto del texto se escapa.
+    """
+    words = list(_WORD.finditer(text))
+    if not words:
+        return html.escape(text[:200])
+
+    hits = [i for i, match in enumerate(words)
+            if stem(fold_text(match.group())) in terms]
+
+    # Ventana que empieza en el término que deja más términos dentro
+    first = 0
+    if hits:
+        first = max(hits, key=lambda h: sum(1 for other in hits if h <= other < h + window))
+        first = max(0, min(first - 3, len(words) - window))
+    last = min(len(words), first + window) - 1
+
+    # Desde el principio del texto o de la primera palabra hasta la siguiente
+    # palabra tras la última (o el final), con los espacios colapsados
+    start = 0 if first == 0 else words[first].start()
+    end = words[last + 1].start() if last + 1 < len(words) else len(text)
+    hit_set = set(hits)
+    parts, position = [], start
+    for i in range(first, last + 1):
+        match = words[i]
+        parts.append(html.escape(_SPACES.sub(' ', text[position:match.start()])))
+        word = html.escape(match.group())
+        parts.append(f"<mark>{word}</mark>" if i in hit_set else word)
+        position = match.end()
+    parts.append(html.escape(_SPACES.sub(' ', text[position:end])))
+
+    prefix = '… ' if first > 0 else ''
+    suffix = ' …' if last + 1 < len(words) else ''
+    return prefix + ''.join(parts).strip() + suffix
+
+
+class SearchIndex(MemoryIndex):
+    """Índice invertido con ranking BM25 sobre documentos {'title', 'text'}"""
+
+    def __init__(self, name: str, loader, k1: float = 1.2, b: float = 0.75,
+                 refresh_seconds: float = 600):
+        """
+        Args:
+            name: Nombre para logs y estadísticas
+            loader: Devuelve las tuplas (id, documento, tipo) con las que se construye
+            k1: Saturación de la frecuencia de un término en BM25
+            b: Peso de la normalización por longitud del documento en BM25
+            refresh_seconds: Antigüedad a partir de la cual se reconstruye (0 = nunca)
+        """
+        super().__init__(name, loader, refresh_seconds)
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, Dict[str, int]] = {}  # término -> {id: frecuencia}
+        # id -> (tipo, documento, términos, longitud)
+        self._docs: Dict[str, Tuple[str, Dict, Counter, int]] = {}
+        self._total_length = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _terms(document: Dict) -> Counter:
+        terms = Counter(analyze(document.get('text') or ''))
+        for term in analyze(document.get('title') or ''):
+            terms[term] += 2
+        return terms
+
+    def _add(self, state, item_id: str, document: Dict, kind: str):
+        postings, docs = state
+        terms = self._terms(document)
+        length = sum(terms.values())
+        docs[item_id] = (kind, document, terms, length)
+        for term, count in terms.items():
+            postings.setdefault(term, {})[item_id] = count
+        return length
+
+    # ------------------------------------------------------------------
+    # Construcción y actualización incremental
+    # ------------------------------------------------------------------
+
+    def _build(self):
+        postings, docs = {}, {}
+        total_length = 0
+        for item_id, document, kind in self.loader():
+            total_length += self._add((postings, docs), item_id, document, kind)
+        return postings, docs, total_length
+
+    def _install(self, state):
+        self._postings, self._docs, self._total_length = state
+
+    def _upsert(self, item_id: str, document: Dict, kind: str):
+        self._remove(item_id)
+        self._total_length += self._add((self._postings, self._docs), item_id, document, kind)
+
+    def _remove(self, item_id: str):
+        entry = self._docs.pop(item_id, None)
+        if entry is None:
+            return
+        _, _, terms, length = entry
+        self._total_length -= length
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(item_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, kinds: Optional[List[str]] = None, limit: int = 20) -> Dict:
+        """
+        Documentos que mejor encajan con `query` según BM25
+
+        Returns:
+            {'results': [{'id', 'kind', 'score', 'title', 'snippet'}], 'total': n}
+        """
+        self.ensure_loaded()
+        terms = list(dict.fromkeys(analyze(query)))
+        if not terms:
+            return {'results': [], 'total': 0}
+
+        start = time.perf_counter()
+        with self._lock:
+            n_docs = len(self._docs)
+            avg_length = self._total_length / n_docs if n_docs else 0.0
+            scores: Dict[str, float] = {}
+
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for item_id, tf in posting.items():
+                    kind, _, _, length = self._docs[item_id]
+                    if kinds and kind not in kinds:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[item_id] = scores.get(item_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            hits = [(item_id, score, self._docs[item_id]) for item_id, score in top]
+
+        self._record_query(start)
+
+        term_set = set(terms)
+        results = [{
+            'id': item_id,
+            'kind': kind,
+            'score': round(score, 3),
+            'title': document.get('title') or '',
+            'snippet': highlight(document.get('text') or '', term_set),
+        } for item_id, score, (kind, document, _, _) in hits]
+        return {'results': results, 'total': len(scores)}
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        with self._lock:
+            stats['terms'] = len(self._postings)
+            stats['by_kind'] = dict(Counter(entry[0] for entry in self._docs.values()))
+        return stats
+
+
+def joke_document(joke: Dict) -> Dict:
+    return {
+        'title': joke.get('titulo') or '',
+        'text': '\n'.join(filter(None, (joke.get('contenido'), joke.get('notas')))),
+    }
+
+
+def bitacora_document(entry: Dict) -> Dict:
+    return {
+        'title': entry.get('titulo') or '',
+        'text': '\n'.join(filter(None, (entry.get('contenido'), ' '.join(entry.get('tags') or [])))),
+    }
+
+
+def analisis_document(analisis: Dict) -> Dict:
+    title = ' - '.join(filter(None, (analisis.get('titulo_referencia'), analisis.get('comediante'))))
+    return {'title': title, 'text': text_indexes.analisis_text(analisis)}
+
+
+# Colección -> (tipo en los resultados, documento a indexar de cada fila)
+COLLECTIONS = {
+    text_indexes.JOKES: (KIND_JOKE, joke_document),
+    text_indexes.BITACORA: (KIND_BITACORA, bitacora_document),
+    text_indexes.ANALISIS: (KIND_ANALISIS, analisis_document),
+}
+
+
+def _load_documents():
+    for collection, (kind, extract) in COLLECTIONS.items():
+        for item_id, document in text_indexes.load(collection, extract):
+            yield item_id, document, kind
+
+
+# Instancia global
+search_index = LazyProxy(
+    'search_index',
+    lambda: SearchIndex('search', _load_documents,
+                        refresh_seconds=config.TEXT_INDEX_REFRESH_SECONDS),
+    available=lambda: config.SEARCH_ENABLED
+)
+
+for _collection, (_kind, _extract) in COLLECTIONS.items():
+    text_indexes.register_index(_collection, CollectionView(search_index, _kind), _extract)
@@ -0,0 +1,228 @@
+"""
+Índice vectorial en memoria para buscar chistes y análisis parecidos
+
+Cada texto se convierte en un vector TF-IDF de n-gramas de caracteres (3 a 5,
+dentro de cada palabra) proyectados con el hashing trick a una dimensión fija,
+así no hace falta guardar vocabulario y los textos nuevos se indexan al vuelo.
+Las filas se guardan normalizadas en una matriz NumPy: la similitud coseno
+con todo el índice es un único producto matriz-vector.
+
+Es un índice por worker (MemoryIndex): se construye en la primera consulta,
+se mantiene al día con los hooks de text_indexes y cada reconstrucción
+periódica recalcula también los IDF.
+"""
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.config import config
+from src.services import text_indexes
+from src.services.text_indexes import MemoryIndex
+from src.utils.lazy import LazyProxy
+from src.utils.text import fold_text
+
+
+class HashedNgramVectorizer:
+    """N-gramas de caracteres por palabra, proyectados a `dim` columnas con signo"""
+
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (3, 5)):
+        import numpy as np
+
+        self.np = np
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def ngrams(self, text: str) -> List[str]:
+        low, high = self.ngram_range
+        grams = []
+        for word in fold_text(text).split():
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                if len(padded) < n:
+                    break
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return grams
+
+    def transform(self, text: str):
+        """Vector TF sublineal (1 + log tf) de un texto"""
+        np = self.np
+        # CRC32 y no hash(): igual en todos los procesos, así un modelo entrenado
+        # en uno (p.ej. el clasificador de tags) sirve en los demás
+        hashes = np.fromiter((zlib.crc32(g.encode('utf-8')) for g in self.ngrams(text)),
+                             dtype=np.int64)
+        if not len(hashes):
+            return np.zeros(self.dim, dtype=np.float32)
+
+        columns = hashes % self.dim
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        counts = np.bincount(columns, weights=signs, minlength=self.dim)
+        return (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+
+
+class SimilarityIndex(MemoryIndex):
+    """Matriz de vectores TF-IDF normalizados con búsqueda top-k por coseno"""
+
+    def __init__(self, name: str, loader: Callable[[], Iterable[Tuple[str, str]]],
+                 dim: int = 512, refresh_seconds: float = 600):
+        """
+        Args:
+            name: Nombre para logs y estadísticas
+            loader: Devuelve los pares (id, texto) con los que se construye
+            dim: Columnas del hashing trick
+            refresh_seconds: Antigüedad a partir de la cual se reconstruye (0 = nunca)
+        """
+        super().__init__(name, loader, refresh_seconds)
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.np = self.vectorizer.np
+
+        self._matrix = None  # (capacidad, dim) float32; solo las primeras _count filas valen
+        self._idf = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+
+    @property
+    def size(self) -> int:
+        return self._count
+
+    # ------------------------------------------------------------------
+    # Construcción y actualización incremental
+    # ------------------------------------------------------------------
+
+    def _build(self):
+        np = self.np
+        ids, vectors = [], []
+        for item_id, text in self.loader():
+            ids.append(item_id)
+            vectors.append(self.vectorizer.transform(text))
+
+        tf = np.vstack(vectors) if vectors else np.zeros((0, self.vectorizer.dim), dtype=np.float32)
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1 + len(ids)) / (1 + df)) + 1).astype(np.float32)
+
+        matrix = np.zeros((max(64, int(len(ids) * 1.25)), self.vectorizer.dim), dtype=np.float32)
+        matrix[:len(ids)] = tf * idf
+        norms = np.linalg.norm(matrix[:len(ids)], axis=1, keepdims=True)
+        matrix[:len(ids)] /= np.maximum(norms, 1e-12)
+        return matrix, idf, ids
+
+    def _install(self, state):
+        self._matrix, self._idf, self._ids = state
+        self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+        self._count = len(self._ids)
+
+    def _vector(self, text: str):
+        vector = self.vectorizer.transform(text) * self._idf
+        norm = self.np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _upsert(self, item_id: str, text: str):
+        row = self._rows.get(item_id)
+        if row is None:
+            if self._count == len(self._matrix):
+                grown = self.np.zeros((len(self._matrix) * 2, self.vectorizer.dim), dtype=self.np.float32)
+                grown[:self._count] = self._matrix[:self._count]
+                self._matrix = grown
+            row = self._count
+            self._count += 1
+            self._ids.append(item_id)
+            self._rows[item_id] = row
+        self._matrix[row] = self._vector(text)
+
+    def _remove(self, item_id: str):
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return
+        # La última fila ocupa el hueco para que la matriz siga compacta
+        last = self._count - 1
+        if row != last:
+            moved = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        self._count = last
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _top_k(self, vector, k: int, exclude: Optional[str], min_score: float) -> List[Dict]:
+        np = self.np
+        start = time.perf_counter()
+
+        if k <= 0:
+            return []
+
+        with self._lock:
+            if not self._count or not vector.any():
+                return []
+            scores = self._matrix[:self._count] @ vector
+            if exclude in self._rows:
+                scores[self._rows[exclude]] = -1.0
+
+            k = min(k, self._count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = [{'id': self._ids[row], 'score': round(float(scores[row]), 4)}
+                       for row in top if scores[row] > min_score]
+
+        self._record_query(start)
+        return results
+
+    def query(self, text: str, k: int = 10, exclude: Optional[str] = None,
+              min_score: float = 0.0) -> List[Dict]:
+        """
+        Los `k` elementos más parecidos a un texto
+
+        Returns:
+            Lista de {'id', 'score'} ordenada por similitud coseno descendente
+        """
+        self.ensure_loaded()
+        with self._lock:
+            vector = self._vector(text)
+        return self._top_k(vector, k, exclude, min_score)
+
+    def query_id(self, item_id: str, k: int = 10, min_score: float = 0.0) -> Optional[List[Dict]]:
+        """Los `k` más parecidos a un elemento del índice (None si no está indexado)"""
+        self.ensure_loaded()
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                return None
+            vector = self._matrix[row].copy()
+        return self._top_k(vector, k, item_id, min_score)
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        with self._lock:
+            stats['dim'] = self.vectorizer.dim
+            stats['memory_mb'] = round(self._matrix.nbytes / 1e6, 2) if self.loaded else 0.0
+        return stats
+
+
+def _create_index(name: str, loader: Callable) -> SimilarityIndex:
+    return SimilarityIndex(name, loader, dim=config.SIMILARITY_DIM,
+                           refresh_seconds=config.TEXT_INDEX_REFRESH_SECONDS)
+
+
+def _similarity_enabled() -> bool:
+    return config.SIMILARITY_ENABLED
+
+
+# Instancias globales (NumPy se importa al crear el primer índice)
+jokes_index = LazyProxy(
+    'jokes_index',
+    lambda: _create_index('jokes', lambda: text_indexes.load(text_indexes.JOKES,
+                                                             text_indexes.joke_text)),
+    available=_similarity_enabled
+)
+analisis_index = LazyProxy(
+    'analisis_index',
+    lambda: _create_index('analisis', lambda: text_indexes.load(text_indexes.ANALISIS,
+                                                                text_indexes.analisis_text)),
+    available=_similarity_enabled
+)
+
+text_indexes.register_index(text_indexes.JOKES, jokes_index, text_indexes.joke_text)
+text_indexes.register_index(text_indexes.ANALISIS, analisis_index, text_indexes.analisis_text)
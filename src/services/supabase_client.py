@@ -1,10 +1,16 @@
 """
 Cliente de Supabase para gestión de base de datos
 """
-from supabase import create_client, Client
 from src.config import config
-from typing import Optional, Dict, List, Any
+from src.utils.lazy import LazyProxy
+from src.utils.pagination import keyset_filter
+from src.utils.projection import select_clause
+from typing import TYPE_CHECKING, Optional, Dict, Iterator, List, Any, Sequence, Union
 import logging
+import threading
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
@@ -12,20 +18,27 @@ logger = logging.getLogger(__name__)
 class SupabaseClient:
     """Cliente singleton de Supabase"""
 
-    _instance: Optional[Client] = None
+    _instance: Optional['Client'] = None
+    _lock = threading.Lock()
 
     @classmethod
-    def get_client(cls) -> Client:
+    def get_client(cls) -> 'Client':
         """Obtiene o crea una instancia del cliente de Supabase"""
         if cls._instance is None:
-            if not config.SUPABASE_URL or not config.SUPABASE_KEY:
-                raise ValueError("Supabase credentials not configured")
+            with cls._lock:
+                if cls._instance is None:
+                    if not config.SUPABASE_URL or not config.SUPABASE_KEY:
+                        raise ValueError("Supabase credentials not configured")
+
+                    # Importación diferida: el SDK tarda en cargar y no hace
+                    # falta para servir /health ni la PWA
+                    from supabase import create_client
 
-            cls._instance = create_client(
-                config.SUPABASE_URL,
-                config.SUPABASE_KEY
-            )
-            logger.info("Supabase client initialized")
+                    cls._instance = create_client(
+                        config.SUPABASE_URL,
+                        config.SUPABASE_KEY
+                    )
+                    logger.info("Supabase client initialized")
 
         return cls._instance
 
@@ -33,6 +46,10 @@ class SupabaseClient:
 class JokesRepository:
     """Repositorio para gestionar chistes en Supabase"""
 
+    # Vista "summary" de los listados: sin contenido, notas ni JSONB
+    SUMMARY_FIELDS = ('titulo', 'estado', 'calificacion', 'veces_usado', 'concepto',
+                      'fecha_creacion', 'fecha_modificacion', 'ultima_presentacion')
+
     def __init__(self):
         self.client = SupabaseClient.get_client()
         self.table = 'chistes'
@@ -61,13 +78,58 @@ class JokesRepository:
             logger.error(f"Error getting joke {joke_id}: {e}")
             raise
 
-    def get_all_jokes(self, filters: Optional[Dict] = None) -> List[Dict]:
-        """Obtiene todos los chistes con filtros opcionales"""
+    def get_jokes_by_ids(self, joke_ids: List[str]) -> List[Dict]:
+        """Obtiene varios chistes por ID en una sola consulta"""
         try:
-            query = self.client.table(self.table)\
+            if not joke_ids:
+                return []
+
+            result = self.client.table(self.table)\
                 .select('*')\
+                .in_('id', joke_ids)\
+                .eq('eliminado', False)\
+                .execute()
+
+            return result.data
+        except Exception as e:
+            logger.error(f"Error getting jokes by ids: {e}")
+            raise
+
+    def iter_contents(self, columns: str = 'id, contenido', page_size: int = 1000) -> Iterator[Dict]:
+        """Recorre las columnas indicadas de todos los chistes, por páginas (para índices)"""
+        try:
+            start = 0
+            while True:
+                result = self.client.table(self.table)\
+                    .select(columns)\
+                    .eq('eliminado', False)\
+                    .order('id')\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+
+                yield from result.data
+                if len(result.data) < page_size:
+                    return
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error iterating joke contents: {e}")
+            raise
+
+    def get_all_jokes(self, filters: Optional[Dict] = None,
+                      fields: Union[str, Sequence[str], None] = None) -> List[Dict]:
+        """
+        Obtiene todos los chistes con filtros opcionales
+
+        Ordenados por (fecha_creacion, id) descendente. Con 'after' (fecha, id)
+        en los filtros devuelve solo los posteriores a esa fila en ese orden.
+        `fields` limita las columnas (ver select_clause; None = todas).
+        """
+        try:
+            query = self.client.table(self.table)\
+                .select(select_clause(fields, self.SUMMARY_FIELDS, ('id', 'fecha_creacion')))\
                 .eq('eliminado', False)\
-                .order('fecha_creacion', desc=True)
+                .order('fecha_creacion', desc=True)\
+                .order('id', desc=True)
 
             # Aplicar filtros si existen
             if filters:
@@ -75,6 +137,10 @@ class JokesRepository:
                     query = query.eq('estado', filters['estado'])
                 if 'calificacion_min' in filters:
                     query = query.gte('calificacion', filters['calificacion_min'])
+                if 'after' in filters:
+                    query = query.or_(keyset_filter('fecha_creacion', filters['after']))
+                if 'limit' in filters:
+                    query = query.limit(filters['limit'])
 
             result = query.execute()
             return result.data
@@ -157,6 +223,19 @@ class AnalysisRepository:
             logger.error(f"Error creating analysis: {e}")
             raise
 
+    def create_analyses(self, analyses_data: List[Dict[str, Any]]) -> List[Dict]:
+        """Guarda varios análisis de IA en un único insert"""
+        try:
+            if not analyses_data:
+                return []
+
+            result = self.client.table(self.table).insert(analyses_data).execute()
+            logger.info(f"{len(result.data)} analyses created in bulk")
+            return result.data
+        except Exception as e:
+            logger.error(f"Error creating analyses in bulk: {e}")
+            raise
+
     def get_joke_analyses(self, joke_id: str) -> List[Dict]:
         """Obtiene todos los análisis de un chiste"""
         try:
@@ -186,10 +265,73 @@ class AnalysisRepository:
             logger.error(f"Error getting latest analysis for joke {joke_id}: {e}")
             raise
 
+    def find_analysis(self, joke_id: str, fingerprint: str, prompt_version: str,
+                      model: str) -> Optional[Dict]:
+        """Obtiene el análisis más reciente de un chiste para ese contenido, prompt y modelo"""
+        try:
+            result = self.client.table(self.table)\
+                .select('*')\
+                .eq('chiste_id', joke_id)\
+                .eq('huella_contenido', fingerprint)\
+                .eq('prompt_version', prompt_version)\
+                .eq('modelo_ia', model)\
+                .order('fecha_analisis', desc=True)\
+                .limit(1)\
+                .execute()
+
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error finding analysis for joke {joke_id}: {e}")
+            raise
+
+    def collapse_duplicates(self, joke_id: str) -> int:
+        """
+        Retención: deja solo el análisis más reciente de cada combinación
+        (contenido, versión de prompt, modelo) de un chiste
+
+        Los análisis sin huella (anteriores a la columna) no se tocan.
+
+        Returns:
+            Número de análisis eliminados
+        """
+        try:
+            result = self.client.table(self.table)\
+                .select('id, huella_contenido, prompt_version, modelo_ia')\
+                .eq('chiste_id', joke_id)\
+                .order('fecha_analisis', desc=True)\
+                .execute()
+
+            seen = set()
+            duplicates = []
+            for row in result.data:
+                if not row.get('huella_contenido'):
+                    continue
+                key = (row['huella_contenido'], row.get('prompt_version'), row.get('modelo_ia'))
+                if key in seen:
+                    duplicates.append(row['id'])
+                else:
+                    seen.add(key)
+
+            if duplicates:
+                self.client.table(self.table)\
+                    .delete()\
+                    .in_('id', duplicates)\
+                    .execute()
+                logger.info(f"Collapsed {len(duplicates)} duplicate analyses for joke {joke_id}")
+
+            return len(duplicates)
+        except Exception as e:
+            logger.error(f"Error collapsing analyses for joke {joke_id}: {e}")
+            raise
+
 
 class BitacoraRepository:
     """Repositorio para gestionar entradas de bitácora"""
 
+    # Vista "summary" de los listados: sin contenido
+    SUMMARY_FIELDS = ('fecha', 'tipo', 'titulo', 'estado_animo', 'tags',
+                      'chiste_relacionado_id', 'presentacion_relacionada_id')
+
     def __init__(self):
         self.client = SupabaseClient.get_client()
         self.table = 'bitacora'
@@ -218,13 +360,59 @@ class BitacoraRepository:
             logger.error(f"Error getting bitácora entry {entry_id}: {e}")
             raise
 
-    def get_all_entries(self, filters: Optional[Dict] = None) -> List[Dict]:
-        """Obtiene todas las entradas con filtros opcionales"""
+    def get_entries_by_ids(self, entry_ids: List[str]) -> List[Dict]:
+        """Obtiene varias entradas por ID en una sola consulta"""
         try:
-            query = self.client.table(self.table)\
+            if not entry_ids:
+                return []
+
+            result = self.client.table(self.table)\
                 .select('*')\
+                .in_('id', entry_ids)\
                 .eq('eliminado', False)\
-                .order('fecha', desc=True)
+                .execute()
+
+            return result.data
+        except Exception as e:
+            logger.error(f"Error getting bitácora entries by ids: {e}")
+            raise
+
+    def iter_contents(self, columns: str = 'id, tipo, contenido',
+                      page_size: int = 1000) -> Iterator[Dict]:
+        """Recorre las columnas indicadas de todas las entradas, por páginas (para índices)"""
+        try:
+            start = 0
+            while True:
+                result = self.client.table(self.table)\
+                    .select(columns)\
+                    .eq('eliminado', False)\
+                    .order('id')\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+
+                yield from result.data
+                if len(result.data) < page_size:
+                    return
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error iterating bitácora contents: {e}")
+            raise
+
+    def get_all_entries(self, filters: Optional[Dict] = None,
+                        fields: Union[str, Sequence[str], None] = None) -> List[Dict]:
+        """
+        Obtiene todas las entradas con filtros opcionales
+
+        Ordenadas por (fecha, id) descendente. Con 'after' (fecha, id) en los
+        filtros devuelve solo las posteriores a esa fila en ese orden.
+        `fields` limita las columnas (ver select_clause; None = todas).
+        """
+        try:
+            query = self.client.table(self.table)\
+                .select(select_clause(fields, self.SUMMARY_FIELDS, ('id', 'fecha')))\
+                .eq('eliminado', False)\
+                .order('fecha', desc=True)\
+                .order('id', desc=True)
 
             # Aplicar filtros si existen
             if filters:
@@ -232,6 +420,8 @@ class BitacoraRepository:
                     query = query.eq('tipo', filters['tipo'])
                 if 'chiste_relacionado_id' in filters:
                     query = query.eq('chiste_relacionado_id', filters['chiste_relacionado_id'])
+                if 'after' in filters:
+                    query = query.or_(keyset_filter('fecha', filters['after']))
                 if 'limit' in filters:
                     query = query.limit(filters['limit'])
 
@@ -279,6 +469,11 @@ class BitacoraRepository:
 class AnalisisChistesRepository:
     """Repositorio para gestionar análisis de chistes de otros comediantes"""
 
+    # Vista "summary" de los listados: las categorías, sin los textos del análisis
+    SUMMARY_FIELDS = ('titulo_referencia', 'comediante', 'concepto', 'concepto_categoria',
+                      'perspectiva_categoria', 'actitud', 'formulacion_categoria',
+                      'elemento_mecanico', 'fecha_creacion')
+
     def __init__(self):
         self.client = SupabaseClient.get_client()
         self.table = 'analisis_chistes'
@@ -307,13 +502,59 @@ class AnalisisChistesRepository:
             logger.error(f"Error getting análisis {analisis_id}: {e}")
             raise
 
-    def get_all_analisis(self, filters: Optional[Dict] = None) -> List[Dict]:
-        """Obtiene todos los análisis con filtros opcionales"""
+    def get_analisis_by_ids(self, analisis_ids: List[str]) -> List[Dict]:
+        """Obtiene varios análisis por ID en una sola consulta"""
         try:
-            query = self.client.table(self.table)\
+            if not analisis_ids:
+                return []
+
+            result = self.client.table(self.table)\
                 .select('*')\
+                .in_('id', analisis_ids)\
                 .eq('eliminado', False)\
-                .order('fecha_creacion', desc=True)
+                .execute()
+
+            return result.data
+        except Exception as e:
+            logger.error(f"Error getting análisis by ids: {e}")
+            raise
+
+    def iter_contents(self, columns: str = 'id, premisa, ruptura, remate',
+                      page_size: int = 1000) -> Iterator[Dict]:
+        """Recorre las columnas indicadas de todos los análisis, por páginas (para índices)"""
+        try:
+            start = 0
+            while True:
+                result = self.client.table(self.table)\
+                    .select(columns)\
+                    .eq('eliminado', False)\
+                    .order('id')\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+
+                yield from result.data
+                if len(result.data) < page_size:
+                    return
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error iterating análisis texts: {e}")
+            raise
+
+    def get_all_analisis(self, filters: Optional[Dict] = None,
+                         fields: Union[str, Sequence[str], None] = None) -> List[Dict]:
+        """
+        Obtiene todos los análisis con filtros opcionales
+
+        Ordenados por (fecha_creacion, id) descendente. Con 'after' (fecha, id)
+        en los filtros devuelve solo los posteriores a esa fila en ese orden.
+        `fields` limita las columnas (ver select_clause; None = todas).
+        """
+        try:
+            query = self.client.table(self.table)\
+                .select(select_clause(fields, self.SUMMARY_FIELDS, ('id', 'fecha_creacion')))\
+                .eq('eliminado', False)\
+                .order('fecha_creacion', desc=True)\
+                .order('id', desc=True)
 
             # Aplicar filtros si existen
             if filters:
@@ -323,6 +564,8 @@ class AnalisisChistesRepository:
                     query = query.eq('concepto_categoria', filters['concepto_categoria'])
                 if 'perspectiva_categoria' in filters:
                     query = query.eq('perspectiva_categoria', filters['perspectiva_categoria'])
+                if 'after' in filters:
+                    query = query.or_(keyset_filter('fecha_creacion', filters['after']))
                 if 'limit' in filters:
                     query = query.limit(filters['limit'])
 
@@ -450,9 +693,70 @@ class CategoriasRepository:
             raise
 
 
-# Instancias globales
-jokes_repo = JokesRepository()
-analysis_repo = AnalysisRepository()
-bitacora_repo = BitacoraRepository()
-analisis_chistes_repo = AnalisisChistesRepository()
-categorias_repo = CategoriasRepository()
+class TagsRepository:
+    """Repositorio para el vocabulario de tags y sus asignaciones a chistes"""
+
+    def __init__(self):
+        self.client = SupabaseClient.get_client()
+        self.table = 'tags'
+        self.assignments_table = 'chistes_tags'
+
+    def get_all_tags(self) -> List[Dict]:
+        """Obtiene todos los tags (id, nombre, categoria)"""
+        try:
+            result = self.client.table(self.table)\
+                .select('id, nombre, categoria')\
+                .order('categoria')\
+                .order('nombre')\
+                .execute()
+
+            return result.data
+        except Exception as e:
+            logger.error(f"Error getting tags: {e}")
+            raise
+
+    def iter_assignments(self, page_size: int = 1000) -> Iterator[Dict]:
+        """Recorre todas las asignaciones chiste-tag, por páginas"""
+        try:
+            start = 0
+            while True:
+                result = self.client.table(self.assignments_table)\
+                    .select('chiste_id, tag_id')\
+                    .order('chiste_id')\
+                    .order('tag_id')\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+
+                yield from result.data
+                if len(result.data) < page_size:
+                    return
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error iterating tag assignments: {e}")
+            raise
+
+    def assign_tags(self, joke_id: str, tag_ids: List[str]) -> List[Dict]:
+        """Asigna tags a un chiste (las asignaciones que ya existían se mantienen)"""
+        try:
+            if not tag_ids:
+                return []
+
+            rows = [{'chiste_id': joke_id, 'tag_id': tag_id} for tag_id in tag_ids]
+            result = self.client.table(self.assignments_table)\
+                .upsert(rows, on_conflict='chiste_id,tag_id', ignore_duplicates=True)\
+                .execute()
+
+            logger.info(f"Assigned {len(tag_ids)} tags to joke {joke_id}")
+            return result.data
+        except Exception as e:
+            logger.error(f"Error assigning tags to joke {joke_id}: {e}")
+            raise
+
+
+# Instancias globales (se crean en el primer uso)
+jokes_repo = LazyProxy('jokes_repo', JokesRepository)
+analysis_repo = LazyProxy('analysis_repo', AnalysisRepository)
+bitacora_repo = LazyProxy('bitacora_repo', BitacoraRepository)
+analisis_chistes_repo = LazyProxy('analisis_chistes_repo', AnalisisChistesRepository)
+categorias_repo = LazyProxy('categorias_repo', CategoriasRepository)
+tags_repo = LazyProxy('tags_repo', TagsRepository)
@@ -0,0 +1,354 @@
+"""
+Clasificador local de tags para /api/ai/tags
+
+Sugerir tags es una clasificación multi-etiqueta sobre el vocabulario fijo de
+la tabla `tags` (tema, técnica, audiencia y tono), así que no necesita un LLM
+cuando hay ejemplos: una regresión logística uno-contra-todos sobre n-gramas
+de caracteres hasheados (los mismos vectores que el índice de similitud),
+entrenada con las asignaciones de `chistes_tags`. Las sugerencias aceptadas
+con /api/ai/tags/accept se guardan ahí y sirven para el siguiente entreno.
+
+El modelo se entrena con train_tag_classifier.py y se guarda en un .npz; los
+workers lo cargan en el primer uso y lo recargan si el fichero cambia. Si la
+confianza de una predicción no llega al umbral, la ruta pregunta a Gemini.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.config import config
+from src.services.similarity_index import HashedNgramVectorizer
+from src.utils.lazy import LazyProxy
+
+logger = logging.getLogger(__name__)
+
+# Categorías que devuelve suggest_tags (en la tabla hay también 'evento')
+TAG_CATEGORIES = ('tema', 'tecnica', 'audiencia', 'tono')
+MAX_TAGS_PER_CATEGORY = 3
+
+Label = Tuple[str, str]  # (categoria, nombre)
+
+
+class TagClassifier:
+    """Regresión logística uno-contra-todos sobre n-gramas hasheados"""
+
+    def __init__(self, labels: List[Label], dim: int = 1024, weights=None, bias=None,
+                 metadata: Optional[Dict] = None):
+        """
+        Args:
+            labels: Tags que predice el modelo, como (categoria, nombre)
+            dim: Columnas del hashing trick
+            weights: Pesos (dim, len(labels)) de un modelo ya entrenado
+            bias: Sesgos (len(labels),) de un modelo ya entrenado
+            metadata: Información del entreno (fecha, ejemplos, métricas)
+        """
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.np = self.vectorizer.np
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.metadata = metadata or {}
+
+    def _features(self, texts: List[str]):
+        np = self.np
+        features = np.vstack([self.vectorizer.transform(text) for text in texts])
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        return features / np.maximum(norms, 1e-12)
+
+    def fit(self, texts: List[str], label_sets: List[Set[Label]], epochs: int = 300,
+            learning_rate: float = 0.05, l2: float = 1e-4):
+        """Entrena con descenso de gradiente (Adam) a lote completo"""
+        np = self.np
+        features = self._features(texts)
+        index = {label: i for i, label in enumerate(self.labels)}
+        targets = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        for row, labels in enumerate(label_sets):
+            for label in labels:
+                if label in index:
+                    targets[row, index[label]] = 1.0
+
+        # Cada tag está en pocos chistes: se pesan más los positivos
+        n = len(texts)
+        positives = targets.sum(axis=0)
+        pos_weight = np.clip((n - positives) / np.maximum(positives, 1), 1.0, 10.0)
+        sample_weight = 1.0 + (pos_weight - 1.0) * targets
+
+        prior = np.clip(positives / n, 1e-3, 1 - 1e-3)
+        weights = np.zeros((features.shape[1], len(self.labels)), dtype=np.float32)
+        bias = np.log(prior / (1 - prior)).astype(np.float32)
+
+        moments = [np.zeros_like(weights), np.zeros_like(weights),
+                   np.zeros_like(bias), np.zeros_like(bias)]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            probs = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+            error = (probs - targets) * sample_weight
+            grads = (features.T @ error / n + l2 * weights, error.mean(axis=0))
+
+            for i, (param, grad) in enumerate(zip((weights, bias), grads)):
+                m, v = moments[2 * i], moments[2 * i + 1]
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                m_hat = m / (1 - beta1 ** step)
+                v_hat = v / (1 - beta2 ** step)
+                param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+        self.weights, self.bias = weights, bias
+        return self
+
+    def predict_proba(self, texts: List[str]):
+        """Probabilidad de cada tag (n, len(labels))"""
+        features = self._features(texts)
+        return 1.0 / (1.0 + self.np.exp(-(features @ self.weights + self.bias)))
+
+    def decode(self, probs) -> Dict:
+        """
+        Tags por categoría a partir de las probabilidades de un texto
+
+        Se queda con los tags de probabilidad >= 0.5 (como mínimo el más
+        probable) y hasta MAX_TAGS_PER_CATEGORY por categoría. La confianza es
+        la del tag más probable de la categoría más dudosa; una categoría sin
+        tags entrenados tiene confianza 0.
+        """
+        tags, confidences = {}, {}
+        for category in TAG_CATEGORIES:
+            ranked = sorted(((float(probs[i]), name) for i, (cat, name) in enumerate(self.labels)
+                             if cat == category), reverse=True)
+            chosen = [name for p, name in ranked[:MAX_TAGS_PER_CATEGORY] if p >= 0.5]
+            tags[category] = chosen or [name for _, name in ranked[:1]]
+            confidences[category] = round(ranked[0][0], 3) if ranked else 0.0
+
+        return {
+            'tags': tags,
+            'confidence': min(confidences.values()),
+            'confidence_by_category': confidences,
+        }
+
+    def predict(self, text: str) -> Dict:
+        return self.decode(self.predict_proba([text])[0])
+
+    def save(self, path: str):
+        np = self.np
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # np.savez añade .npz si falta; se escribe aparte y se renombra
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array([f"{cat}/{name}" for cat, name in self.labels]),
+            metadata=np.array(json.dumps({**self.metadata, 'dim': self.vectorizer.dim})),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TagClassifier':
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data['metadata']))
+            labels = [tuple(label.split('/', 1)) for label in data['labels'].tolist()]
+            return cls(labels, dim=metadata['dim'], weights=data['weights'],
+                       bias=data['bias'], metadata=metadata)
+
+
+# ----------------------------------------------------------------------
+# Datos de entreno y evaluación (train_tag_classifier.py)
+# ----------------------------------------------------------------------
+
+def load_training_data() -> Tuple[List[str], List[Set[Label]], List[Label]]:
+    """
+    Chistes con tags asignados en `chistes_tags`
+
+    Returns:
+        (textos, tags de cada texto, vocabulario de tags de TAG_CATEGORIES)
+    """
+    from src.services.supabase_client import jokes_repo, tags_repo
+
+    vocabulary = {tag['id']: (tag['categoria'], tag['nombre']) for tag in tags_repo.get_all_tags()
+                  if tag['categoria'] in TAG_CATEGORIES}
+
+    assigned: Dict[str, Set[Label]] = {}
+    for row in tags_repo.iter_assignments():
+        label = vocabulary.get(row['tag_id'])
+        if label:
+            assigned.setdefault(row['chiste_id'], set()).add(label)
+
+    texts, label_sets = [], []
+    for joke in jokes_repo.iter_contents('id, contenido'):
+        if joke['id'] in assigned and joke.get('contenido'):
+            texts.append(joke['contenido'])
+            label_sets.append(assigned[joke['id']])
+
+    return texts, label_sets, sorted(vocabulary.values())
+
+
+def trainable_labels(label_sets: List[Set[Label]], min_examples: int) -> List[Label]:
+    """Tags con al menos `min_examples` chistes (el resto no se puede aprender)"""
+    counts: Dict[Label, int] = {}
+    for labels in label_sets:
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+    return sorted(label for label, count in counts.items() if count >= min_examples)
+
+
+def evaluate(model: TagClassifier, texts: List[str], label_sets: List[Set[Label]],
+             threshold: float) -> Dict:
+    """
+    Métricas de un modelo entrenado sobre ejemplos que no ha visto
+
+    - Precisión, recall y F1 por tag (umbral 0.5), micro y macro F1
+    - Acierto del tag más probable de cada categoría
+    - Cobertura: fracción de chistes con confianza >= threshold (los que se
+      responderían sin Gemini) y micro F1 sobre ellos
+    """
+    probs = model.predict_proba(texts)
+    predictions = [model.decode(row) for row in probs]
+
+    per_label = {}
+    totals = {'tp': 0, 'fp': 0, 'fn': 0}
+    for i, label in enumerate(model.labels):
+        predicted = probs[:, i] >= 0.5
+        actual = [label in labels for labels in label_sets]
+        tp = sum(1 for p, a in zip(predicted, actual) if p and a)
+        fp = sum(1 for p, a in zip(predicted, actual) if p and not a)
+        fn = sum(1 for p, a in zip(predicted, actual) if not p and a)
+        for key, value in (('tp', tp), ('fp', fp), ('fn', fn)):
+            totals[key] += value
+        per_label['/'.join(label)] = {**_prf(tp, fp, fn), 'support': sum(actual)}
+
+    top1 = {}
+    for category in TAG_CATEGORIES:
+        hits = total = 0
+        for prediction, labels in zip(predictions, label_sets):
+            expected = {name for cat, name in labels if cat == category}
+            if expected and prediction['tags'][category]:
+                total += 1
+                hits += prediction['tags'][category][0] in expected
+        top1[category] = round(hits / total, 3) if total else None
+
+    covered = [i for i, prediction in enumerate(predictions) if prediction['confidence'] >= threshold]
+    covered_totals = {'tp': 0, 'fp': 0, 'fn': 0}
+    for i in covered:
+        predicted = {(cat, name) for cat, names in predictions[i]['tags'].items() for name in names}
+        covered_totals['tp'] += len(predicted & label_sets[i])
+        covered_totals['fp'] += len(predicted - label_sets[i])
+        covered_totals['fn'] += len(label_sets[i] - predicted)
+
+    f1_values = [metrics['f1'] for metrics in per_label.values() if metrics['support']]
+    return {
+        'examples': len(texts),
+        'micro': _prf(**totals),
+        'macro_f1': round(sum(f1_values) / len(f1_values), 3) if f1_values else 0.0,
+        'top1_accuracy': top1,
+        'threshold': threshold,
+        'coverage': round(len(covered) / len(texts), 3) if texts else 0.0,
+        'covered_micro': _prf(**covered_totals),
+        'per_label': per_label,
+    }
+
+
+def _prf(tp: int, fp: int, fn: int) -> Dict:
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': round(precision, 3), 'recall': round(recall, 3), 'f1': round(f1, 3)}
+
+
+def split(texts: List[str], label_sets: List[Set[Label]], holdout: float, seed: int = 42):
+    """Partición reproducible en entreno y validación"""
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    cut = int(len(order) * (1 - holdout))
+
+    def pick(rows):
+        return [texts[i] for i in rows], [label_sets[i] for i in rows]
+
+    return pick(order[:cut]), pick(order[cut:])
+
+
+# ----------------------------------------------------------------------
+# Servicio para las rutas
+# ----------------------------------------------------------------------
+
+class OfflineTagger:
+    """Modelo guardado en disco, recargado si cambia, con estadísticas de uso"""
+
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._model: Optional[TagClassifier] = None
+        self._mtime = None
+        self._stats = {'predictions': 0, 'confident': 0, 'no_model': 0, 'total_seconds': 0.0}
+
+    def _current_model(self) -> Optional[TagClassifier]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if mtime != self._mtime:
+                self._model = TagClassifier.load(self.path)
+                self._mtime = mtime
+                logger.info(f"Tag classifier loaded from {self.path} "
+                            f"({len(self._model.labels)} tags)")
+            return self._model
+
+    def predict(self, text: str) -> Optional[Dict]:
+        """
+        Tags por categoría y confianza (None si no hay modelo entrenado)
+
+        Returns:
+            {'tags', 'confidence', 'confidence_by_category', 'confident'}
+        """
+        start = time.perf_counter()
+        model = self._current_model()
+        if model is None:
+            with self._lock:
+                self._stats['no_model'] += 1
+            return None
+
+        prediction = model.predict(text)
+        prediction['confident'] = prediction['confidence'] >= self.threshold
+
+        with self._lock:
+            self._stats['predictions'] += 1
+            self._stats['confident'] += int(prediction['confident'])
+            self._stats['total_seconds'] += time.perf_counter() - start
+        return prediction
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            model = self._model
+
+        predictions = stats.pop('predictions')
+        total_seconds = stats.pop('total_seconds')
+        return {
+            'model_loaded': model is not None,
+            'path': self.path,
+            'threshold': self.threshold,
+            'trained_at': model.metadata.get('trained_at') if model else None,
+            'labels': len(model.labels) if model else 0,
+            'predictions': predictions,
+            'confident': stats['confident'],
+            'no_model': stats['no_model'],
+            'offline_rate': round(stats['confident'] / predictions, 3) if predictions else 0.0,
+            'avg_ms': round(total_seconds / predictions * 1000, 3) if predictions else 0.0,
+        }
+
+
+# Instancia global (NumPy y el modelo se cargan en la primera predicción)
+tag_classifier = LazyProxy(
+    'tag_classifier',
+    lambda: OfflineTagger(config.TAG_CLASSIFIER_PATH, config.TAG_CLASSIFIER_THRESHOLD),
+    available=lambda: config.TAG_CLASSIFIER_ENABLED
+)
@@ -0,0 +1,294 @@
+"""
+Índices de texto en memoria sobre chistes, análisis de referencia y bitácora
+
+MemoryIndex es la base común: se construye desde Supabase en la primera
+consulta, se reconstruye en segundo plano cuando pasa refresh_seconds (para
+recoger lo que escriban otros workers) y admite upsert/remove incrementales.
+
+Las rutas llaman a los hooks on_*_saved / on_*_deleted tras escribir en
+Supabase para mantener al día los índices registrados; un fallo en un índice
+nunca rompe la escritura.
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryIndex(ABC):
+    """
+    Base de los índices en memoria
+
+    Las subclases implementan _build() (lee self.loader() y devuelve el estado
+    nuevo sin tocar el actual), _install(state), _upsert(item_id, *args),
+    _remove(item_id) y la propiedad size. Las consultas llaman antes a
+    ensure_loaded() y después a _record_query(start).
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Iterable], refresh_seconds: float = 600):
+        """
+        Args:
+            name: Nombre para logs y estadísticas
+            loader: Devuelve las tuplas (id, texto, ...) con las que se construye
+            refresh_seconds: Antigüedad a partir de la cual se reconstruye (0 = nunca)
+        """
+        self.name = name
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        self.loaded = False
+
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._build_seconds = 0.0
+        self._refreshing = False
+        # Escrituras recibidas durante una reconstrucción, para reaplicarlas al terminar
+        self._pending: Optional[List[Tuple[str, Optional[tuple]]]] = None
+
+        self._queries = 0
+        self._query_seconds = 0.0
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        """Elementos indexados"""
+
+    @abstractmethod
+    def _build(self) -> Any:
+        """Estado nuevo construido desde self.loader(), sin tocar el actual"""
+
+    @abstractmethod
+    def _install(self, state: Any):
+        """Sustituye el estado actual por uno de _build() (con el lock)"""
+
+    @abstractmethod
+    def _upsert(self, item_id: str, *args):
+        """Añade o actualiza un elemento (con el lock)"""
+
+    @abstractmethod
+    def _remove(self, item_id: str):
+        """Quita un elemento si está (con el lock)"""
+
+    def load(self):
+        """(Re)construye el índice; las escrituras que lleguen mientras tanto se reaplican"""
+        with self._build_lock:
+            self._load()
+
+    def _load(self):
+        with self._lock:
+            self._pending = []
+        start = time.perf_counter()
+        try:
+            state = self._build()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._install(state)
+            self.loaded = True
+            self._loaded_at = time.time()
+            self._build_seconds = elapsed
+
+            pending, self._pending = self._pending, None
+            for item_id, args in pending:
+                if args is None:
+                    self._remove(item_id)
+                else:
+                    self._upsert(item_id, *args)
+
+        logger.info(f"Text index '{self.name}' built: {self.size} items in {elapsed:.2f}s")
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                logger.warning(f"Text index '{self.name}' refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        self._refreshing = True
+        threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True).start()
+
+    def ensure_loaded(self):
+        """Construye el índice si aún no existe o programa su refresco si está viejo"""
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    self._load()
+            return
+
+        stale = self.refresh_seconds and time.time() - self._loaded_at > self.refresh_seconds
+        if stale and not self._refreshing:
+            self._refresh_in_background()
+
+    def warm_up(self) -> bool:
+        """
+        True si el índice ya está construido; si no, lanza la construcción en
+        segundo plano y devuelve False (para comprobaciones que no deben esperarla)
+        """
+        if self.loaded:
+            self.ensure_loaded()
+            return True
+        with self._lock:
+            if not self._refreshing:
+                self._refresh_in_background()
+        return False
+
+    def upsert(self, item_id: str, *args):
+        """Añade o actualiza un elemento (no hace nada si el índice aún no se ha construido)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((item_id, args))
+            if self.loaded:
+                self._upsert(item_id, *args)
+
+    def remove(self, item_id: str):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((item_id, None))
+            if self.loaded:
+                self._remove(item_id)
+
+    def _record_query(self, start: float):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._queries += 1
+            self._query_seconds += elapsed
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'loaded': self.loaded,
+                'size': self.size,
+                'age_seconds': round(time.time() - self._loaded_at, 1) if self.loaded else None,
+                'build_seconds': round(self._build_seconds, 3),
+                'queries': self._queries,
+                'avg_query_ms': round(self._query_seconds / self._queries * 1000, 3)
+                if self._queries else 0.0,
+            }
+
+
+JOKES = 'jokes'
+ANALISIS = 'analisis'
+BITACORA = 'bitacora'
+
+# Columnas que se leen de cada tabla al construir los índices
+COLUMNS = {
+    JOKES: 'id, titulo, contenido, notas',
+    ANALISIS: 'id, titulo_referencia, comediante, premisa, ruptura, remate',
+    BITACORA: 'id, tipo, titulo, contenido, tags',
+}
+
+# Colección -> [(índice, extract)]; extract(registro) devuelve lo que se
+# indexa de cada fila, o None si la fila no va en ese índice
+_indexes: Dict[str, List[Tuple[object, Callable[[Dict], Any]]]] = {
+    JOKES: [], ANALISIS: [], BITACORA: []
+}
+
+
+def register_index(collection: str, index, extract: Callable[[Dict], Any]):
+    """Añade un índice a los que se actualizan al escribir en la colección"""
+    _indexes[collection].append((index, extract))
+
+
+def joke_text(joke: Dict) -> str:
+    return joke.get('contenido') or ''
+
+
+def analisis_text(analisis: Dict) -> str:
+    """Premisa, ruptura y remate de un análisis de referencia en un solo texto"""
+    return '\n'.join(analisis.get(field) or '' for field in ('premisa', 'ruptura', 'remate')).strip()
+
+
+def idea_text(entry: Dict) -> Optional[str]:
+    """Contenido de una entrada de bitácora de tipo 'idea' (None para el resto)"""
+    return entry.get('contenido') or '' if entry.get('tipo') == 'idea' else None
+
+
+def load(collection: str, extract: Callable[[Dict], Any]) -> Iterator[Tuple[str, Any]]:
+    """(id, extract(fila)) de todas las filas de una colección, para construir un índice"""
+    from src.services import supabase_client
+
+    repo = {
+        JOKES: supabase_client.jokes_repo,
+        ANALISIS: supabase_client.analisis_chistes_repo,
+        BITACORA: supabase_client.bitacora_repo,
+    }[collection]
+
+    for record in repo.iter_contents(COLUMNS[collection]):
+        document = extract(record)
+        if document is not None:
+            yield record['id'], document
+
+
+class CollectionView:
+    """
+    Un índice con elementos de varias colecciones, visto como índice de una
+
+    Sirve para registrarlo en cada colección: upsert añade el tipo (`kind`)
+    con el que el índice etiqueta los elementos de esa colección.
+    """
+
+    def __init__(self, index, kind: str):
+        self.index = index
+        self.kind = kind
+
+    @property
+    def initialized(self) -> bool:
+        return getattr(self.index, 'initialized', True)
+
+    def __bool__(self) -> bool:
+        return bool(self.index)
+
+    def upsert(self, item_id: str, document):
+        self.index.upsert(item_id, document, self.kind)
+
+    def remove(self, item_id: str):
+        self.index.remove(item_id)
+
+
+def _update(collection: str, item_id: str, record: Optional[Dict] = None):
+    for index, extract in _indexes[collection]:
+        # Un índice que nadie ha consultado todavía no necesita actualizarse
+        if not index or not getattr(index, 'initialized', True):
+            continue
+        try:
+            document = extract(record) if record is not None else None
+            if document is None:
+                index.remove(item_id)
+            else:
+                index.upsert(item_id, document)
+        except Exception as e:
+            logger.warning(f"Could not update {collection} index for {item_id}: {e}")
+
+
+def on_joke_saved(joke: Dict):
+    _update(JOKES, joke['id'], joke)
+
+
+def on_joke_deleted(joke_id: str):
+    _update(JOKES, joke_id)
+
+
+def on_analisis_saved(analisis: Dict):
+    _update(ANALISIS, analisis['id'], analisis)
+
+
+def on_analisis_deleted(analisis_id: str):
+    _update(ANALISIS, analisis_id)
+
+
+def on_bitacora_saved(entry: Dict):
+    _update(BITACORA, entry['id'], entry)
+
+
+def on_bitacora_deleted(entry_id: str):
+    _update(BITACORA, entry_id)
@@ -0,0 +1,346 @@
+"""
+Extracción tolerante a fallos de JSON en respuestas del modelo
+
+El parser procesa el texto de forma incremental (admite trozos de streaming) y
+reescribe sobre la marcha un JSON válido, reparando los defectos habituales:
+
+- leading_text / trailing_text: prosa o ``` alrededor del JSON
+- trailing_comma / extra_comma: comas sobrantes antes de } o ]
+- missing_comma / missing_colon: separadores omitidos
+- smart_quotes: cadenas delimitadas con comillas tipográficas
+- control_characters: saltos de línea o tabuladores sin escapar en cadenas
+- python_literal: True / False / None
+- mismatched_bracket / missing_value: cierres incorrectos o claves sin valor
+- unterminated_string / truncated: respuesta cortada (p.ej. por max_output_tokens)
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+# Reparaciones que indican que la respuesta llegó incompleta
+TRUNCATION_REPAIRS = frozenset({'unterminated_string', 'truncated'})
+
+_SMART_QUOTES = '“”„‟'
+_CLOSERS = {'{': '}', '[': ']'}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_WHITESPACE = ' \t\r\n'
+
+# Caracteres que interrumpen el copiado rápido del contenido de una cadena
+_STRING_SPECIAL = re.compile('["\\\\\n\r\t' + _SMART_QUOTES + ']')
+_FENCE = re.compile(r'```(?:json)?', re.IGNORECASE)
+
+
+class IncrementalJSONParser:
+    """
+    Parser incremental que repara el primer objeto/array JSON de un texto
+
+    Uso:
+        parser = IncrementalJSONParser()
+        parser.feed(trozo)              # tantas veces como haga falta
+        parcial, _ = parser.snapshot()  # objeto parcial para streaming
+        valor, reparaciones = parser.finish()
+    """
+
+    def __init__(self):
+        self._out: List[str] = []
+        # Pila de contenedores abiertos: [tipo ('{' o '['), estado]
+        # Estados de objeto: key, colon, value, comma. De array: value, comma
+        self._frames: List[List[str]] = []
+        self._repairs: List[str] = []
+        self._skipped: List[str] = []
+        self._started = False
+        self._done = False
+
+        self._string_quote: Optional[str] = None  # '"' o 'smart'
+        self._string_is_key = False
+        self._escaped = False
+        self._scalar_start: Optional[int] = None
+
+        # Último punto en el que cerrar los contenedores abiertos da JSON válido
+        self._safe_len = 0
+        self._safe_frames: List[List[str]] = []
+
+    @property
+    def done(self) -> bool:
+        """True cuando el contenedor raíz ya se ha cerrado"""
+        return self._done
+
+    @property
+    def repairs(self) -> List[str]:
+        """Reparaciones aplicadas hasta ahora"""
+        return list(self._repairs)
+
+    def _repair(self, name: str):
+        if name not in self._repairs:
+            self._repairs.append(name)
+
+    def _mark_safe(self):
+        self._safe_len = len(self._out)
+        self._safe_frames = [frame[:] for frame in self._frames]
+
+    def _begin_value(self):
+        """Se llama al empezar cualquier valor o clave: inserta la coma si falta"""
+        frame = self._frames[-1]
+        if frame[1] == 'comma':
+            self._out.append(',')
+            self._repair('missing_comma')
+            frame[1] = 'key' if frame[0] == '{' else 'value'
+        elif frame[1] == 'colon':
+            self._out.append(':')
+            self._repair('missing_colon')
+            frame[1] = 'value'
+
+    def _end_value(self):
+        """Se llama al completar un valor o clave en el contenedor actual"""
+        frame = self._frames[-1]
+        if frame[0] == '{' and frame[1] == 'key':
+            frame[1] = 'colon'
+        else:
+            frame[1] = 'comma'
+            self._mark_safe()
+
+    def _end_scalar(self):
+        token = ''.join(self._out[self._scalar_start:])
+        if token in _PYTHON_LITERALS:
+            del self._out[self._scalar_start:]
+            self._out.append(_PYTHON_LITERALS[token])
+            self._repair('python_literal')
+        self._scalar_start = None
+        self._end_value()
+
+    def _close_container(self, char: str):
+        frame = self._frames[-1]
+        expected = _CLOSERS[frame[0]]
+        if char != expected:
+            self._repair('mismatched_bracket')
+
+        if self._out[-1] == ',':
+            self._out.pop()
+            self._repair('trailing_comma')
+        elif frame[1] == 'colon':
+            self._out.append(':null')
+            self._repair('missing_value')
+        elif frame[1] == 'value' and frame[0] == '{':
+            self._out.append('null')
+            self._repair('missing_value')
+
+        self._out.append(expected)
+        self._frames.pop()
+
+        if self._frames:
+            self._end_value()
+        else:
+            self._done = True
+
+    def feed(self, chunk: str):
+        """Procesa un nuevo trozo de texto"""
+        i = 0
+        n = len(chunk)
+        out = self._out
+
+        while i < n:
+            if self._done:
+                if chunk[i:].strip(_WHITESPACE + '`'):
+                    self._repair('trailing_text')
+                return
+
+            char = chunk[i]
+
+            if not self._started:
+                if char in '{[':
+                    skipped = _FENCE.sub('', ''.join(self._skipped)).strip()
+                    if skipped:
+                        self._repair('leading_text')
+                    self._skipped = []
+                    self._started = True
+                    out.append(char)
+                    self._frames.append([char, 'key' if char == '{' else 'value'])
+                    self._mark_safe()
+                else:
+                    self._skipped.append(char)
+                i += 1
+                continue
+
+            # Dentro de una cadena: copiar en bloque hasta el siguiente carácter especial
+            if self._string_quote:
+                if self._escaped:
+                    out.append(char)
+                    self._escaped = False
+                    i += 1
+                    continue
+
+                match = _STRING_SPECIAL.search(chunk, i)
+                if not match:
+                    out.append(chunk[i:])
+                    return
+                if match.start() > i:
+                    out.append(chunk[i:match.start()])
+                i = match.start()
+                char = chunk[i]
+
+                if char == '\\':
+                    out.append(char)
+                    self._escaped = True
+                elif char in _CONTROL_ESCAPES:
+                    out.append(_CONTROL_ESCAPES[char])
+                    self._repair('control_characters')
+                elif char == '"' and self._string_quote == '"':
+                    out.append('"')
+                    self._string_quote = None
+                    self._end_value()
+                elif char == '"':
+                    out.append('\\"')
+                elif self._string_quote == 'smart':
+                    out.append('"')
+                    self._string_quote = None
+                    self._end_value()
+                else:
+                    out.append(char)
+                i += 1
+                continue
+
+            if self._scalar_start is not None and (char in _WHITESPACE or char in ',:]}"[{'
+                                                   or char in _SMART_QUOTES):
+                self._end_scalar()
+
+            if char in _WHITESPACE:
+                pass
+            elif char == '"' or char in _SMART_QUOTES:
+                self._begin_value()
+                self._string_is_key = self._frames[-1] == ['{', 'key']
+                self._string_quote = '"' if char == '"' else 'smart'
+                if char != '"':
+                    self._repair('smart_quotes')
+                out.append('"')
+            elif char in '{[':
+                self._begin_value()
+                out.append(char)
+                self._frames.append([char, 'key' if char == '{' else 'value'])
+                self._mark_safe()
+            elif char in '}]':
+                self._close_container(char)
+            elif char == ':':
+                frame = self._frames[-1]
+                if frame[1] == 'colon':
+                    out.append(':')
+                    frame[1] = 'value'
+            elif char == ',':
+                frame = self._frames[-1]
+                if frame[1] == 'comma':
+                    out.append(',')
+                    frame[1] = 'key' if frame[0] == '{' else 'value'
+                else:
+                    self._repair('extra_comma')
+            else:
+                if self._scalar_start is None:
+                    self._begin_value()
+                    self._scalar_start = len(out)
+                out.append(char)
+            i += 1
+
+    def _repaired_text(self) -> Tuple[Optional[str], List[str]]:
+        """Texto JSON reparado a partir del estado actual, sin modificarlo"""
+        if not self._started:
+            return None, list(self._repairs)
+        if self._done:
+            return ''.join(self._out), list(self._repairs)
+
+        repairs = list(self._repairs)
+        out = list(self._out)
+        frames = [frame[:] for frame in self._frames]
+
+        def add(name):
+            if name not in repairs:
+                repairs.append(name)
+
+        complete_value = False
+        if self._string_quote and not self._string_is_key:
+            # Cadena de valor cortada: se conserva lo recibido
+            if self._escaped:
+                out[-1] = out[-1][:-1]
+            out.append('"')
+            add('unterminated_string')
+            complete_value = True
+        elif self._scalar_start is not None:
+            token = ''.join(out[self._scalar_start:])
+            token = _PYTHON_LITERALS.get(token, token)
+            try:
+                json.loads(token)
+                del out[self._scalar_start:]
+                out.append(token)
+                complete_value = True
+            except ValueError:
+                pass
+
+        if complete_value:
+            frames[-1][1] = 'comma'
+        else:
+            out = out[:self._safe_len]
+            frames = [frame[:] for frame in self._safe_frames]
+
+        # Quedan contenedores por cerrar: la respuesta está cortada aunque el
+        # último valor esté completo ('{"a": 12' o '[1, 2, 3')
+        add('truncated')
+
+        for kind, _state in reversed(frames):
+            if out[-1] == ',':
+                out.pop()
+            out.append(_CLOSERS[kind])
+
+        return ''.join(out), repairs
+
+    def snapshot(self) -> Tuple[Any, List[str]]:
+        """
+        Valor parcial con lo recibido hasta ahora (para consumidores en streaming)
+
+        Returns:
+            Tupla (valor o None si aún no hay JSON, reparaciones)
+        """
+        text, repairs = self._repaired_text()
+        if text is None:
+            return None, repairs
+        try:
+            return json.loads(text), repairs
+        except ValueError:
+            return None, repairs
+
+    def finish(self) -> Tuple[Any, List[str]]:
+        """
+        Valor final reparado
+
+        Raises:
+            ValueError: Si no hay JSON o no se puede reparar
+        """
+        text, repairs = self._repaired_text()
+        if text is None:
+            raise ValueError("No JSON object found in response")
+        try:
+            return json.loads(text), repairs
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Unrecoverable JSON ({', '.join(repairs) or 'no repairs'}): {e}")
+
+
+def parse_json(text: str) -> Tuple[Any, List[str]]:
+    """
+    Extrae y repara el primer objeto/array JSON de un texto
+
+    Returns:
+        Tupla (valor, lista de reparaciones aplicadas; vacía si el JSON era válido)
+
+    Raises:
+        ValueError: Si no hay JSON o no se puede reparar
+    """
+    cleaned = text.strip()
+    if cleaned.startswith('```'):
+        cleaned = _FENCE.sub('', cleaned, count=1)
+    if cleaned.endswith('```'):
+        cleaned = cleaned[:-3]
+    try:
+        return json.loads(cleaned), []
+    except ValueError:
+        pass
+
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.finish()
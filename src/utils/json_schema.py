@@ -0,0 +1,69 @@
+"""
+Validación mínima de JSON Schema para las respuestas del modelo
+
+Cubre el subconjunto que usan los esquemas de prompts.py: type, properties,
+required, items, enum, minimum y maximum. Devuelve la lista de errores en vez
+de lanzar excepción, para poder decidir qué partes de una respuesta se usan.
+"""
+from typing import Any, Dict, List
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+}
+
+
+def _matches_type(value: Any, expected) -> bool:
+    types = expected if isinstance(expected, list) else [expected]
+    for name in types:
+        if name == 'null':
+            if value is None:
+                return True
+            continue
+        # bool es subclase de int, pero no es un número en JSON
+        if name in ('number', 'integer') and isinstance(value, bool):
+            continue
+        if isinstance(value, _TYPES[name]):
+            return True
+    return False
+
+
+def validate(instance: Any, schema: Dict, path: str = '$') -> List[str]:
+    """
+    Valida `instance` contra `schema`
+
+    Returns:
+        Lista de errores ("$.ruta: motivo"); vacía si es válido
+    """
+    errors = []
+
+    expected = schema.get('type')
+    if expected and not _matches_type(instance, expected):
+        return [f"{path}: expected {expected}, got {type(instance).__name__}"]
+
+    if 'enum' in schema and instance not in schema['enum']:
+        errors.append(f"{path}: {instance!r} not in {schema['enum']}")
+
+    if isinstance(instance, (int, float)) and not isinstance(instance, bool):
+        if 'minimum' in schema and instance < schema['minimum']:
+            errors.append(f"{path}: {instance} < {schema['minimum']}")
+        if 'maximum' in schema and instance > schema['maximum']:
+            errors.append(f"{path}: {instance} > {schema['maximum']}")
+
+    if isinstance(instance, dict):
+        for key in schema.get('required', []):
+            if key not in instance:
+                errors.append(f"{path}: missing '{key}'")
+        for key, subschema in schema.get('properties', {}).items():
+            if key in instance:
+                errors.extend(validate(instance[key], subschema, f"{path}.{key}"))
+
+    if isinstance(instance, list) and 'items' in schema:
+        for i, item in enumerate(instance):
+            errors.extend(validate(item, schema['items'], f"{path}[{i}]"))
+
+    return errors
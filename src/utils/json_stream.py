@@ -0,0 +1,87 @@
+"""
+Extracción incremental de objetos JSON desde una respuesta en streaming
+"""
+import json
+import logging
+from typing import Dict, List
+
+from src.utils.json_repair import parse_json
+
+logger = logging.getLogger(__name__)
+
+
+class JSONArrayItemStream:
+    """
+    Emite cada objeto de la primera lista JSON en cuanto llega completo
+
+    Pensado para respuestas como {"ideas": [{...}, {...}]} que llegan a trozos:
+    cada {...} de la lista se devuelve desde feed() en cuanto se cierra, sin
+    esperar al resto de la respuesta. Ignora texto fuera del JSON (p.ej. ```json).
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []   # contenedores abiertos: '{' o '['
+        self._in_string = False
+        self._escaped = False
+        self._array_depth = None      # profundidad de la lista cuyos elementos se emiten
+        self._item: List[str] = []    # caracteres del objeto en curso
+        self._capturing = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Procesa un nuevo trozo de texto
+
+        Returns:
+            Objetos completados dentro de este trozo (puede estar vacía)
+        """
+        items = []
+
+        for char in chunk:
+            if self._capturing:
+                self._item.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                if self._stack:
+                    self._in_string = True
+            elif char in '{[':
+                if char == '[' and self._array_depth is None:
+                    self._array_depth = len(self._stack) + 1
+                elif (char == '{' and not self._capturing
+                      and len(self._stack) == self._array_depth):
+                    self._capturing = True
+                    self._item = [char]
+                self._stack.append(char)
+            elif char in '}]' and self._stack:
+                self._stack.pop()
+                if (self._capturing and char == '}'
+                        and len(self._stack) == self._array_depth):
+                    self._capturing = False
+                    item = self._decode(''.join(self._item))
+                    if item is not None:
+                        items.append(item)
+
+        return items
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+
+        try:
+            item, repairs = parse_json(text)
+            logger.warning(f"Streamed item repaired: {', '.join(repairs)}")
+            return item
+        except ValueError as e:
+            logger.warning(f"Skipping malformed streamed item: {e}")
+            return None
@@ -0,0 +1,80 @@
+"""
+Singletons perezosos para acelerar el arranque en frío
+
+Los servicios globales (agente de IA, repositorios de Supabase) se exponen
+como LazyProxy: el módulo se importa al instante y el objeto real se crea en
+el primer acceso a uno de sus atributos, una sola vez aunque lleguen varios
+hilos a la vez. Así /health y la PWA responden sin esperar a Gemini ni a
+Supabase.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Nombre -> segundos que tardó en crearse cada singleton
+_init_times: Dict[str, float] = {}
+_init_times_lock = threading.Lock()
+
+
+class LazyProxy:
+    """Crea el objeto con factory() en el primer uso y delega en él"""
+
+    def __init__(self, name: str, factory: Callable, available: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            name: Nombre para logs y para el informe de arranque
+            factory: Función que crea el objeto real
+            available: Indica sin crear el objeto si el servicio está configurado;
+                el proxy es falso (bool) cuando devuelve False
+        """
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_available', available)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def _get(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                if not self:
+                    raise RuntimeError(f"{self._name} is not configured")
+
+                start = time.perf_counter()
+                instance = self._factory()
+                elapsed = time.perf_counter() - start
+                object.__setattr__(self, '_instance', instance)
+
+                with _init_times_lock:
+                    _init_times[self._name] = round(elapsed, 4)
+                logger.info(f"{self._name} initialized lazily in {elapsed:.3f}s")
+        return self._instance
+
+    def __getattr__(self, attr: str):
+        return getattr(self._get(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._get(), attr, value)
+
+    def __bool__(self) -> bool:
+        return self._available() if self._available else True
+
+    def __repr__(self) -> str:
+        state = 'initialized' if self.initialized else 'pending'
+        return f"<LazyProxy {self._name} ({state})>"
+
+
+def get_init_times() -> Dict[str, float]:
+    """Segundos que tardó en crearse cada singleton ya inicializado"""
+    with _init_times_lock:
+        return dict(_init_times)
@@ -0,0 +1,90 @@
+"""
+Paginación por cursor (keyset) de los listados
+
+Los listados se ordenan por (fecha DESC, id DESC) y cada página empieza justo
+después de la última fila de la anterior, en lugar de saltar N filas con
+offset: el coste de pedir una página no crece con lo lejos que esté y no se
+repiten ni se pierden filas si se crean entradas mientras se recorre.
+
+El cursor es opaco para el cliente (base64 de la fecha y el id de la última
+fila devuelta) y se valida al decodificarlo, porque acaba dentro del filtro
+de PostgREST.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(date_value: str, item_id: str) -> str:
+    """Cursor que apunta justo después de la fila (date_value, item_id)"""
+    raw = json.dumps([date_value, item_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Fecha e id codificados en un cursor
+
+    Raises:
+        ValueError: Si el cursor no es uno generado por encode_cursor
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_value, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        datetime.fromisoformat(date_value)
+        return date_value, str(uuid.UUID(item_id))
+    except Exception:
+        raise ValueError("Invalid cursor") from None
+
+
+def parse_limit(value: Union[str, int, None], default: int, maximum: int) -> int:
+    """
+    Parámetro limit de una query, acotado a 1..maximum (default si no viene)
+
+    Raises:
+        ValueError: Si no es un número entero
+    """
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer") from None
+    return max(1, min(limit, maximum))
+
+
+def page_args(args: Mapping) -> Tuple[int, Optional[Tuple[str, str]]]:
+    """
+    Tamaño de página y posición de inicio a partir de los parámetros limit y cursor
+
+    Raises:
+        ValueError: Si limit no es un entero o el cursor no es válido
+    """
+    limit = parse_limit(args.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def keyset_filter(date_column: str, after: Tuple[str, str]) -> str:
+    """Filtro or= de PostgREST para las filas posteriores a `after` en orden descendente"""
+    date_value, item_id = after
+    return (f'{date_column}.lt."{date_value}",'
+            f'and({date_column}.eq."{date_value}",id.lt.{item_id})')
+
+
+def split_page(rows: List[Dict], limit: int, date_column: str) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Separa una página pedida con limit + 1 filas en (filas, cursor siguiente)
+
+    El cursor es None cuando no quedan más filas.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[date_column], last['id'])
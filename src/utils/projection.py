@@ -0,0 +1,47 @@
+"""
+Proyección de columnas de los listados
+
+Los listados pueden pedir solo algunas columnas en lugar de la fila entera:
+una lista explícita ("id,titulo,estado") o la vista con nombre "summary",
+que cada repositorio define sin los textos largos ni los JSONB. Así el
+select() de PostgREST no trae de la base de datos lo que la vista no muestra.
+"""
+import re
+from typing import Sequence, Union
+
+SUMMARY = 'summary'
+
+_COLUMN = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def select_clause(fields: Union[str, Sequence[str], None], summary: Sequence[str],
+                  required: Sequence[str] = ('id',)) -> str:
+    """
+    Cláusula de select() para una proyección
+
+    Args:
+        fields: None (todas las columnas) o columnas como lista o separadas
+            por comas; "summary" entre ellas equivale a sus columnas
+        summary: Columnas de la vista "summary"
+        required: Columnas que se añaden siempre (id y la que ordena el cursor)
+
+    Raises:
+        ValueError: Si alguna columna no es un nombre de columna válido
+    """
+    if not fields:
+        return '*'
+    if isinstance(fields, str):
+        fields = fields.split(',')
+
+    columns = list(required)
+    for field in fields:
+        field = field.strip()
+        expanded = summary if field == SUMMARY else (field,)
+        for column in expanded:
+            if column and column not in columns:
+                columns.append(column)
+
+    for column in columns:
+        if not _COLUMN.match(column):
+            raise ValueError(f"Invalid field: {column}")
+    return ', '.join(columns)
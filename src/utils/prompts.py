@@ -1,32 +1,38 @@
 """
 Templates de prompts para el agente de IA
+
+Cada tarea tiene dos partes:
+- *_SYSTEM: instrucciones estáticas (rol, rúbrica, formato JSON). Se fijan una
+  sola vez como system instruction del GenerativeModel de la tarea.
+- *_PROMPT: la parte variable de cada llamada (el chiste, el tema...).
 """
 
-ANALYZE_JOKE_PROMPT = """Eres un experto en comedia stand-up y análisis humorístico. Analiza el siguiente chiste en profundidad:
+# Versión de los templates: incrementar al modificar cualquier prompt para
+# invalidar respuestas cacheadas y distinguir análisis guardados en BD
+PROMPT_VERSION = "2.0"
 
-CHISTE:
-"{joke_text}"
+ANALYZE_JOKE_SYSTEM = """Eres un experto en comedia stand-up y análisis humorístico. Analiza en profundidad el chiste que te envíen.
 
 Proporciona un análisis estructurado en formato JSON con la siguiente estructura:
 
-{{
-  "estructura": {{
+{
+  "estructura": {
     "setup": "identifica y cita el setup (la preparación)",
     "punchline": "identifica y cita el punchline (el remate)",
     "twist": "describe el elemento sorpresa o giro",
     "callback": "si hay referencia a algo anterior, descríbelo"
-  }},
+  },
   "tecnicas": ["lista las técnicas cómicas utilizadas"],
   "puntos_fuertes": ["qué aspectos funcionan bien y por qué"],
   "puntos_debiles": ["qué aspectos podrían mejorar y por qué"],
   "sugerencias": ["3-5 sugerencias específicas de mejora"],
-  "scores": {{
+  "scores": {
     "estructura": 7.5,
     "originalidad": 8.0,
     "timing": 7.0,
     "general": 7.5
-  }}
-}}
+  }
+}
 
 TÉCNICAS CÓMICAS POSIBLES:
 - Exageración: amplificar la realidad
@@ -50,13 +56,11 @@ CRITERIOS DE EVALUACIÓN:
 Responde SOLO con el JSON, sin texto adicional.
 """
 
-SUGGEST_IMPROVEMENTS_PROMPT = """Basándote en el análisis previo de este chiste, genera versiones mejoradas.
-
-CHISTE ORIGINAL:
+ANALYZE_JOKE_PROMPT = """CHISTE:
 "{joke_text}"
+"""
 
-ANÁLISIS PREVIO:
-{analysis_summary}
+SUGGEST_IMPROVEMENTS_SYSTEM = """Basándote en el análisis previo de un chiste, genera versiones mejoradas.
 
 Genera 3 versiones mejoradas del chiste que:
 1. VERSION_TIMING: Optimiza el timing y ritmo del punchline
@@ -65,30 +69,34 @@ Genera 3 versiones mejoradas del chiste que:
 
 Responde en formato JSON:
 
-{{
-  "version_timing": {{
+{
+  "version_timing": {
     "texto": "versión mejorada enfocada en timing",
     "cambios": "qué se modificó y por qué mejora el timing"
-  }},
-  "version_claridad": {{
+  },
+  "version_claridad": {
     "texto": "versión mejorada enfocada en claridad",
     "cambios": "qué se modificó y por qué mejora la claridad"
-  }},
-  "version_twist": {{
+  },
+  "version_twist": {
     "texto": "versión mejorada enfocada en el twist",
     "cambios": "qué se modificó y por qué mejora la sorpresa"
-  }},
+  },
   "recomendacion": "cuál de las 3 versiones recomiendas y por qué"
-}}
+}
 
 Mantén la esencia del chiste original. Responde SOLO con JSON.
 """
 
-GENERATE_VARIATIONS_PROMPT = """Genera {num_variations} variaciones del siguiente chiste, explorando diferentes enfoques:
-
-CHISTE ORIGINAL:
+SUGGEST_IMPROVEMENTS_PROMPT = """CHISTE ORIGINAL:
 "{joke_text}"
 
+ANÁLISIS PREVIO:
+{analysis_summary}
+"""
+
+GENERATE_VARIATIONS_SYSTEM = """Genera variaciones del chiste que te envíen, explorando diferentes enfoques.
+
 Para cada variación:
 - Mantén la premisa básica
 - Explora diferentes punchlines
@@ -97,26 +105,29 @@ Para cada variación:
 
 Responde en formato JSON:
 
-{{
+{
   "variaciones": [
-    {{
+    {
       "numero": 1,
       "texto": "variación del chiste",
       "tecnica": "técnica principal usada",
       "estilo": "estilo de humor",
       "diferencia": "en qué se diferencia del original"
-    }},
+    },
     ...
   ]
-}}
+}
 
 Responde SOLO con JSON.
 """
 
-BRAINSTORM_IDEAS_PROMPT = """Genera {num_ideas} ideas originales de chistes sobre el siguiente tema:
+GENERATE_VARIATIONS_PROMPT = """Genera {num_variations} variaciones.
 
-TEMA: {topic}
-ESTILO PREFERIDO: {style}
+CHISTE ORIGINAL:
+"{joke_text}"
+"""
+
+BRAINSTORM_IDEAS_SYSTEM = """Genera ideas originales de chistes sobre el tema y estilo que te indiquen.
 
 Para cada idea proporciona:
 - Setup básico (la preparación)
@@ -126,27 +137,30 @@ Para cada idea proporciona:
 
 Responde en formato JSON:
 
-{{
+{
   "ideas": [
-    {{
+    {
       "numero": 1,
       "setup": "setup básico del chiste",
       "direccion_punchline": "hacia dónde debería ir el remate",
       "tecnica": "técnica cómica sugerida",
       "dificultad": "fácil|medio|difícil",
       "notas": "notas adicionales o tips"
-    }},
+    },
     ...
   ]
-}}
+}
 
 Busca perspectivas originales y evita clichés. Responde SOLO con JSON.
 """
 
-IDENTIFY_PATTERNS_PROMPT = """Analiza los siguientes {num_jokes} chistes y identifica patrones en el estilo cómico:
+BRAINSTORM_IDEAS_PROMPT = """Genera {num_ideas} ideas.
 
-CHISTES:
-{jokes_text}
+TEMA: {topic}
+ESTILO PREFERIDO: {style}
+"""
+
+IDENTIFY_PATTERNS_SYSTEM = """Analiza la colección de chistes que te envíen e identifica patrones en el estilo cómico.
 
 Identifica:
 1. Técnicas más utilizadas
@@ -158,9 +172,9 @@ Identifica:
 
 Responde en formato JSON:
 
-{{
+{
   "tecnicas_frecuentes": [
-    {{"tecnica": "nombre", "frecuencia": 5, "porcentaje": 50}}
+    {"tecnica": "nombre", "frecuencia": 5, "porcentaje": 50}
   ],
   "temas_recurrentes": ["tema1", "tema2"],
   "estructura_preferida": "descripción de la estructura típica",
@@ -170,15 +184,46 @@ Responde en formato JSON:
   "recomendaciones": [
     "recomendación específica basada en los patrones"
   ]
-}}
+}
 
 Responde SOLO con JSON.
 """
 
-TAG_SUGGESTION_PROMPT = """Sugiere tags/etiquetas apropiados para categorizar este chiste:
+IDENTIFY_PATTERNS_PROMPT = """{num_jokes} CHISTES:
+{jokes_text}
+"""
 
-CHISTE:
-"{joke_text}"
+MERGE_PATTERNS_SYSTEM = """Recibirás varios informes parciales de patrones, cada uno obtenido de un bloque distinto de la misma colección de chistes. Combínalos en un único informe de toda la colección.
+
+- Une los temas, fortalezas y áreas de mejora equivalentes aunque estén redactados distinto
+- Prioriza lo que aparece en varios bloques frente a lo que solo aparece en uno
+- Describe la estructura preferida y el estilo distintivo del conjunto, no de un bloque
+- Las recomendaciones deben basarse en los patrones globales
+
+Responde en formato JSON con la misma estructura que los informes parciales:
+
+{
+  "tecnicas_frecuentes": [
+    {"tecnica": "nombre", "frecuencia": 5, "porcentaje": 50}
+  ],
+  "temas_recurrentes": ["tema1", "tema2"],
+  "estructura_preferida": "descripción de la estructura típica",
+  "fortalezas": ["fortaleza1", "fortaleza2"],
+  "areas_mejora": ["área1", "área2"],
+  "estilo_distintivo": "descripción del estilo único",
+  "recomendaciones": [
+    "recomendación específica basada en los patrones"
+  ]
+}
+
+Responde SOLO con JSON.
+"""
+
+MERGE_PATTERNS_PROMPT = """{num_reports} INFORMES PARCIALES ({num_jokes} chistes en total):
+{reports_text}
+"""
+
+TAG_SUGGESTION_SYSTEM = """Sugiere tags/etiquetas apropiados para categorizar el chiste que te envíen.
 
 Categorías de tags:
 - TEMA: sobre qué es el chiste (familia, tecnología, viajes, etc.)
@@ -188,20 +233,21 @@ Categorías de tags:
 
 Responde en formato JSON:
 
-{{
+{
   "tema": ["tag1", "tag2"],
   "tecnica": ["tag1", "tag2"],
   "audiencia": ["tag1"],
   "tono": ["tag1"]
-}}
+}
 
 Máximo 3 tags por categoría. Responde SOLO con JSON.
 """
 
-ANALYZE_CONCEPTS_PROMPT = """Eres un experto en análisis conceptual de humor. Analiza en detalle el CONCEPTO del siguiente chiste:
-
-CHISTE:
+TAG_SUGGESTION_PROMPT = """CHISTE:
 "{joke_text}"
+"""
+
+ANALYZE_CONCEPTS_SYSTEM = """Eres un experto en análisis conceptual de humor. Analiza en detalle el CONCEPTO del chiste que te envíen.
 
 Analiza:
 
@@ -220,28 +266,29 @@ Analiza:
 
 Responde en formato JSON:
 
-{{
+{
   "concepto_principal": "descripción clara del concepto central",
   "tipo_concepto": "simple|compuesto|concreto|abstracto",
   "explicacion_tipo": "explicación detallada de por qué es este tipo",
-  "mapa_conceptos": {{
+  "mapa_conceptos": {
     "concepto_inicial": "concepto que presenta el setup",
     "asociaciones_esperadas": ["asociaciones lógicas/esperadas"],
     "asociacion_inesperada": "la asociación sorpresa que crea el humor",
     "conceptos_secundarios": ["otros conceptos que intervienen"],
     "explicacion": "cómo funciona el mapa de asociaciones"
-  }},
+  },
   "ejemplos_similares": ["ejemplos de chistes con estructura conceptual similar"],
   "potencial_expansion": "cómo se podría expandir o explotar más este concepto"
-}}
+}
 
 Responde SOLO con JSON.
 """
 
-ANALYZE_RUPTURE_PROMPT = """Eres un experto en mecánicas de humor. Analiza la RUPTURA humorística del siguiente chiste:
-
-CHISTE:
+ANALYZE_CONCEPTS_PROMPT = """CHISTE:
 "{joke_text}"
+"""
+
+ANALYZE_RUPTURE_SYSTEM = """Eres un experto en mecánicas de humor. Analiza la RUPTURA humorística del chiste que te envíen.
 
 La RUPTURA es el mecanismo que rompe la expectativa y crea la sorpresa/risa. Analiza:
 
@@ -265,7 +312,7 @@ La RUPTURA es el mecanismo que rompe la expectativa y crea la sorpresa/risa. Ana
 
 Responde en formato JSON:
 
-{{
+{
   "tipo_ruptura": "tipo principal de ruptura",
   "subtipo_ruptura": "subtipo específico",
   "explicacion_ruptura": "explicación detallada del mecanismo",
@@ -275,7 +322,147 @@ Responde en formato JSON:
   "intensidad_ruptura": "suave|moderada|fuerte - qué tan drástica es",
   "mejoras_posibles": ["cómo podría intensificarse la ruptura"],
   "ejemplos_similares": ["ejemplos de rupturas del mismo tipo"]
-}}
+}
 
 Responde SOLO con JSON.
 """
+
+ANALYZE_RUPTURE_PROMPT = """CHISTE:
+"{joke_text}"
+"""
+
+ANALYZE_COMBINED_SYSTEM = """Eres un experto en comedia stand-up. Haz en una sola respuesta el análisis completo del chiste que te envíen: estructura y scores, concepto, ruptura humorística y tags.
+
+Responde en formato JSON con exactamente estas cuatro secciones:
+
+{
+  "analisis": {
+    "estructura": {
+      "setup": "cita el setup (la preparación)",
+      "punchline": "cita el punchline (el remate)",
+      "twist": "el elemento sorpresa o giro",
+      "callback": "referencia a algo anterior, o cadena vacía"
+    },
+    "tecnicas": ["técnicas cómicas utilizadas"],
+    "puntos_fuertes": ["qué funciona bien y por qué"],
+    "puntos_debiles": ["qué podría mejorar y por qué"],
+    "sugerencias": ["3-5 sugerencias específicas de mejora"],
+    "scores": {"estructura": 7.5, "originalidad": 8.0, "timing": 7.0, "general": 7.5}
+  },
+  "conceptos": {
+    "concepto_principal": "el concepto central del chiste",
+    "tipo_concepto": "simple|compuesto|concreto|abstracto",
+    "explicacion_tipo": "por qué es de este tipo",
+    "mapa_conceptos": {
+      "concepto_inicial": "concepto que presenta el setup",
+      "asociaciones_esperadas": ["asociaciones lógicas/esperadas"],
+      "asociacion_inesperada": "la asociación sorpresa que crea el humor",
+      "conceptos_secundarios": ["otros conceptos que intervienen"],
+      "explicacion": "cómo funciona el mapa de asociaciones"
+    },
+    "ejemplos_similares": ["chistes con estructura conceptual similar"],
+    "potencial_expansion": "cómo expandir o explotar más el concepto"
+  },
+  "ruptura": {
+    "tipo_ruptura": "tipo principal de ruptura",
+    "subtipo_ruptura": "subtipo específico",
+    "explicacion_ruptura": "cómo funciona la ruptura paso a paso",
+    "expectativa_creada": "qué expectativa crea el setup",
+    "momento_ruptura": "en qué punto exacto ocurre la ruptura",
+    "efecto_logrado": "qué efecto humorístico logra",
+    "intensidad_ruptura": "suave|moderada|fuerte",
+    "mejoras_posibles": ["cómo intensificar la ruptura"],
+    "ejemplos_similares": ["rupturas del mismo tipo"]
+  },
+  "tags": {
+    "tema": ["tag1", "tag2"],
+    "tecnica": ["tag1", "tag2"],
+    "audiencia": ["tag1"],
+    "tono": ["tag1"]
+  }
+}
+
+TÉCNICAS CÓMICAS: exageración, incongruencia, wordplay, observacional, autoburla, sarcasmo, timing, callback, regla de tres, absurdo, comparación.
+
+SCORES (0-10): estructura (setup claro, punchline efectivo, twist), originalidad (perspectiva única, sin clichés), timing (ritmo, pausas, tensión), general (promedio ponderado + factor "wow").
+
+TIPO DE CONCEPTO: simple (un concepto directo), compuesto (combina varios), concreto (objetos o situaciones tangibles), abstracto (ideas o emociones).
+
+TIPOS DE RUPTURA: incongruencia, reinterpretación, exageración, deflación, inversión, yuxtaposición, sorpresa, violación de norma.
+
+TAGS: tema (de qué trata), técnica, audiencia (general, adultos, corporativo...), tono (ligero, oscuro, sarcástico, absurdo...). Máximo 3 por categoría.
+
+Responde SOLO con el JSON, sin texto adicional.
+"""
+
+ANALYZE_COMBINED_PROMPT = """CHISTE:
+"{joke_text}"
+"""
+
+_STRING_LIST = {'type': 'array', 'items': {'type': 'string'}}
+_SCORE = {'type': 'number', 'minimum': 0, 'maximum': 10}
+
+# Esquema de cada sección de la respuesta de analyze_combined; una sección
+# que no lo cumpla se pide por separado con su tarea individual
+ANALYZE_COMBINED_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'analisis': {
+            'type': 'object',
+            'required': ['estructura', 'tecnicas', 'puntos_fuertes', 'puntos_debiles',
+                         'sugerencias', 'scores'],
+            'properties': {
+                'estructura': {'type': 'object', 'required': ['setup', 'punchline']},
+                'tecnicas': _STRING_LIST,
+                'puntos_fuertes': _STRING_LIST,
+                'puntos_debiles': _STRING_LIST,
+                'sugerencias': _STRING_LIST,
+                'scores': {
+                    'type': 'object',
+                    'required': ['estructura', 'originalidad', 'timing', 'general'],
+                    'properties': {key: _SCORE for key in
+                                   ('estructura', 'originalidad', 'timing', 'general')}
+                }
+            }
+        },
+        'conceptos': {
+            'type': 'object',
+            'required': ['concepto_principal', 'tipo_concepto', 'explicacion_tipo', 'mapa_conceptos'],
+            'properties': {
+                'concepto_principal': {'type': 'string'},
+                # Mismos valores que el CHECK de analisis_ia.tipo_concepto
+                'tipo_concepto': {'enum': ['simple', 'compuesto', 'concreto', 'abstracto']},
+                'explicacion_tipo': {'type': 'string'},
+                'mapa_conceptos': {'type': 'object'}
+            }
+        },
+        'ruptura': {
+            'type': 'object',
+            'required': ['tipo_ruptura', 'subtipo_ruptura', 'explicacion_ruptura'],
+            'properties': {
+                'tipo_ruptura': {'type': 'string'},
+                'subtipo_ruptura': {'type': 'string'},
+                'explicacion_ruptura': {'type': 'string'}
+            }
+        },
+        'tags': {
+            'type': 'object',
+            'required': ['tema', 'tecnica', 'audiencia', 'tono'],
+            'properties': {key: _STRING_LIST for key in ('tema', 'tecnica', 'audiencia', 'tono')}
+        }
+    }
+}
+
+# Tarea -> (system instruction, template por llamada)
+PROMPT_TASKS = {
+    'analyze_joke': (ANALYZE_JOKE_SYSTEM, ANALYZE_JOKE_PROMPT),
+    'suggest_improvements': (SUGGEST_IMPROVEMENTS_SYSTEM, SUGGEST_IMPROVEMENTS_PROMPT),
+    'generate_variations': (GENERATE_VARIATIONS_SYSTEM, GENERATE_VARIATIONS_PROMPT),
+    'brainstorm_ideas': (BRAINSTORM_IDEAS_SYSTEM, BRAINSTORM_IDEAS_PROMPT),
+    'identify_patterns': (IDENTIFY_PATTERNS_SYSTEM, IDENTIFY_PATTERNS_PROMPT),
+    'merge_patterns': (MERGE_PATTERNS_SYSTEM, MERGE_PATTERNS_PROMPT),
+    'suggest_tags': (TAG_SUGGESTION_SYSTEM, TAG_SUGGESTION_PROMPT),
+    'analyze_concepts': (ANALYZE_CONCEPTS_SYSTEM, ANALYZE_CONCEPTS_PROMPT),
+    'analyze_rupture': (ANALYZE_RUPTURE_SYSTEM, ANALYZE_RUPTURE_PROMPT),
+    'analyze_combined': (ANALYZE_COMBINED_SYSTEM, ANALYZE_COMBINED_PROMPT),
+}
@@ -0,0 +1,24 @@
+"""
+Utilidades para respuestas Server-Sent Events
+"""
+import json
+from typing import Iterable
+
+from flask import Response, stream_with_context
+
+
+def sse_event(event: str, data) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """Respuesta text/event-stream sin buffering intermedio (nginx/Render)"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -0,0 +1,29 @@
+"""
+Normalización de textos de chistes y huella de contenido
+"""
+import hashlib
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Forma canónica del texto: Unicode NFC y espacios colapsados"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+def content_fingerprint(text: str) -> str:
+    """
+    Huella SHA-256 del contenido normalizado
+
+    Dos textos que solo difieren en espacios o en la forma Unicode de los
+    acentos tienen la misma huella.
+    """
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def fold_text(text: str) -> str:
+    """Texto normalizado en minúsculas y sin acentos (para índices de búsqueda)"""
+    decomposed = unicodedata.normalize('NFD', normalize_text(text).lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
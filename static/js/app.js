@@ -57,6 +57,44 @@ async function apiRequest(endpoint, options = {}) {
     }
 }
 
+// Los listados del API vienen por páginas: data + next_cursor (null en la última)
+const PAGE_SIZE = 50;
+
+function pageUrl(endpoint, cursor, limit = PAGE_SIZE) {
+    const separator = endpoint.includes('?') ? '&' : '?';
+    let url = `${endpoint}${separator}limit=${limit}`;
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    return url;
+}
+
+// Recorre todas las páginas de un listado (para los totales del panel)
+async function fetchAllPages(endpoint) {
+    const items = [];
+    let cursor = null;
+    do {
+        const response = await apiRequest(pageUrl(endpoint, cursor, 200));
+        items.push(...(response.data || []));
+        cursor = response.next_cursor;
+    } while (cursor);
+    return items;
+}
+
+// Botón "Cargar más" debajo de un listado; se quita cuando no quedan páginas
+function renderLoadMore(container, cursor, onLoadMore) {
+    const buttonId = `${container.id}LoadMore`;
+    document.getElementById(buttonId)?.remove();
+    if (!cursor) return;
+
+    const button = document.createElement('button');
+    button.id = buttonId;
+    button.className = 'block mx-auto mt-6 px-6 py-2 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300 font-semibold text-sm';
+    button.textContent = '⬇️ Cargar más';
+    button.addEventListener('click', onLoadMore);
+    container.insertAdjacentElement('afterend', button);
+}
+
 // ====================
 // TABS MANAGEMENT
 // ====================
@@ -507,26 +545,30 @@ async function saveAnalisisWizard() {
 // ====================
 
 let bibliotecaData = [];
+let bibliotecaCursor = null;
 let bibliotecaFilters = {
     comediante: '',
     titulo: '',
     concepto: ''
 };
 
-async function loadBiblioteca() {
+// append = true añade la página siguiente a la ya cargada
+async function loadBiblioteca(append = false) {
     try {
         showLoading('Cargando biblioteca...');
 
-        const response = await apiRequest('/api/analisis-chistes/');
+        // Solo el resumen de cada análisis; el detalle se pide al abrirlo
+        const response = await apiRequest(pageUrl('/api/analisis-chistes/?fields=summary', append ? bibliotecaCursor : null));
 
         if (response.success) {
-            bibliotecaData = response.data;
-            displayBiblioteca(bibliotecaData);
+            bibliotecaData = append ? bibliotecaData.concat(response.data) : response.data;
+            bibliotecaCursor = response.next_cursor;
 
             // Update concept filter options
             const conceptos = [...new Set(bibliotecaData.map(a => a.concepto).filter(c => c))];
             const conceptoSelect = document.getElementById('filterBibliotecaConcepto');
             if (conceptoSelect) {
+                const selected = conceptoSelect.value;
                 conceptoSelect.innerHTML = '<option value="">Todos los conceptos</option>';
                 conceptos.forEach(c => {
                     const opt = document.createElement('option');
@@ -534,7 +576,16 @@ async function loadBiblioteca() {
                     opt.textContent = c;
                     conceptoSelect.appendChild(opt);
                 });
+                conceptoSelect.value = append ? selected : '';
             }
+
+            // Al cargar más se mantienen los filtros aplicados
+            if (append) {
+                applyBibliotecaFilters();
+            } else {
+                displayBiblioteca(bibliotecaData);
+            }
+            renderLoadMore(document.getElementById('bibliotecaGrid'), bibliotecaCursor, () => loadBiblioteca(true));
         }
 
         hideLoading();
@@ -622,8 +673,15 @@ function applyBibliotecaFilters() {
     displayBiblioteca(filtered);
 }
 
-function viewBibliotecaItem(id) {
-    const analisis = bibliotecaData.find(a => a.id === id);
+async function viewBibliotecaItem(id) {
+    let analisis;
+    try {
+        const response = await apiRequest(`/api/analisis-chistes/${id}`);
+        analisis = response.data;
+    } catch (error) {
+        showToast('Error al cargar análisis', 'error');
+        return;
+    }
     if (!analisis) return;
 
     const premisaLines = analisis.premisa ? analisis.premisa.split('\n') : [];
@@ -804,6 +862,47 @@ async function deleteBibliotecaItem(id) {
     }
 }
 
+// Petición con respuesta Server-Sent Events: llama a onEvent(evento, datos) por cada evento
+async function apiStream(endpoint, body, onEvent) {
+    const response = await fetch(`${API_URL}${endpoint}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || 'Request failed');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const raw of events) {
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            const payload = data ? JSON.parse(data) : null;
+            if (event === 'error') {
+                throw new Error(payload?.error || 'Stream failed');
+            }
+            onEvent(event, payload);
+        }
+    }
+}
+
 // ====================
 // JOKE FORM
 // ====================
@@ -834,6 +933,16 @@ function initJokeForm() {
         await analyzeJoke(content);
     });
 
+    // Full analysis button (todas las llamadas en paralelo)
+    document.getElementById('analyzeFullBtn').addEventListener('click', async () => {
+        const content = document.getElementById('jokeContent').value.trim();
+        if (!content) {
+            showToast('Escribe un chiste primero', 'error');
+            return;
+        }
+        await analyzeFull(content);
+    });
+
     // Improve button
     document.getElementById('improveBtn').addEventListener('click', async () => {
         const content = document.getElementById('jokeContent').value.trim();
@@ -932,7 +1041,12 @@ function displayAnalysis(analysis) {
     const container = document.getElementById('analysisContent');
     const resultsDiv = document.getElementById('analysisResults');
 
-    const html = `
+    container.innerHTML = analysisHtml(analysis);
+    resultsDiv.classList.remove('hidden');
+}
+
+function analysisHtml(analysis) {
+    return `
         <div class="space-y-4">
             <!-- Scores -->
             <div class="grid grid-cols-2 md:grid-cols-4 gap-3">
@@ -995,9 +1109,6 @@ function displayAnalysis(analysis) {
             </div>
         </div>
     `;
-
-    container.innerHTML = html;
-    resultsDiv.classList.remove('hidden');
 }
 
 async function suggestImprovements(jokeText) {
@@ -1081,7 +1192,12 @@ function displayConceptsAnalysis(concepts) {
     const container = document.getElementById('analysisContent');
     const resultsDiv = document.getElementById('analysisResults');
 
-    const html = `
+    container.innerHTML = conceptsHtml(concepts);
+    resultsDiv.classList.remove('hidden');
+}
+
+function conceptsHtml(concepts) {
+    return `
         <div class="space-y-4">
             <h4 class="font-bold text-lg">🧠 Análisis de Conceptos</h4>
 
@@ -1119,9 +1235,6 @@ function displayConceptsAnalysis(concepts) {
             ` : ''}
         </div>
     `;
-
-    container.innerHTML = html;
-    resultsDiv.classList.remove('hidden');
 }
 
 async function analyzeRupture(jokeText) {
@@ -1150,7 +1263,12 @@ function displayRuptureAnalysis(rupture) {
     const container = document.getElementById('analysisContent');
     const resultsDiv = document.getElementById('analysisResults');
 
-    const html = `
+    container.innerHTML = ruptureHtml(rupture);
+    resultsDiv.classList.remove('hidden');
+}
+
+function ruptureHtml(rupture) {
+    return `
         <div class="space-y-4">
             <h4 class="font-bold text-lg">💥 Análisis de Ruptura</h4>
 
@@ -1192,8 +1310,45 @@ function displayRuptureAnalysis(rupture) {
             ` : ''}
         </div>
     `;
+}
 
-    container.innerHTML = html;
+async function analyzeFull(jokeText) {
+    try {
+        showLoading('Análisis completo con IA...');
+
+        const result = await apiRequest('/api/ai/analyze-full', {
+            method: 'POST',
+            body: JSON.stringify({
+                joke_text: jokeText,
+                save: false
+            })
+        });
+
+        displayFullAnalysis(result.data);
+
+        if (result.errors) {
+            showToast(`Análisis parcial: fallaron ${Object.keys(result.errors).join(', ')}`, 'error');
+        } else {
+            showToast('¡Análisis completo terminado!');
+        }
+
+    } catch (error) {
+        showToast(error.message, 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function displayFullAnalysis(data) {
+    const container = document.getElementById('analysisContent');
+    const resultsDiv = document.getElementById('analysisResults');
+
+    const sections = [];
+    if (data.analysis) sections.push(analysisHtml(data.analysis));
+    if (data.concepts) sections.push(conceptsHtml(data.concepts));
+    if (data.rupture) sections.push(ruptureHtml(data.rupture));
+
+    container.innerHTML = sections.join('<hr class="my-6 border-blue-200">');
     resultsDiv.classList.remove('hidden');
 }
 
@@ -1211,22 +1366,26 @@ function initBrainstorm() {
 }
 
 async function generateIdeas() {
+    const ideas = [];
+
     try {
         showLoading('Generando ideas...');
 
         const topic = document.getElementById('brainstormTopic').value.trim();
         const style = document.getElementById('brainstormStyle').value;
 
-        const result = await apiRequest('/api/ai/brainstorm', {
-            method: 'POST',
-            body: JSON.stringify({
-                topic,
-                style,
-                num_ideas: 5
-            })
+        // Las ideas llegan una a una: se muestran según se generan
+        await apiStream('/api/ai/brainstorm/stream', {
+            topic,
+            style,
+            num_ideas: 5
+        }, (event, idea) => {
+            if (event !== 'item') return;
+            if (ideas.length === 0) hideLoading();
+            ideas.push(idea);
+            displayIdeas(ideas);
         });
 
-        displayIdeas(result.data);
         showToast('¡Ideas generadas!');
 
     } catch (error) {
@@ -1282,23 +1441,32 @@ function initBitacora() {
     });
 }
 
-async function loadBitacoraEntries() {
+let bitacoraEntries = [];
+let bitacoraCursor = null;
+
+// append = true añade la página siguiente a la ya cargada
+async function loadBitacoraEntries(append = false) {
+    const container = document.getElementById('bitacoraList');
     try {
         showLoading('Cargando entradas...');
 
         const filterTipo = document.getElementById('filterTipoBitacora').value;
-        let url = '/api/bitacora/';
+        let url = '/api/bitacora/?fields=summary,contenido';
         if (filterTipo) {
-            url += `?tipo=${filterTipo}`;
+            url += `&tipo=${filterTipo}`;
         }
 
-        const result = await apiRequest(url);
-        displayBitacoraEntries(result.data);
+        const result = await apiRequest(pageUrl(url, append ? bitacoraCursor : null));
+        bitacoraEntries = append ? bitacoraEntries.concat(result.data) : result.data;
+        bitacoraCursor = result.next_cursor;
+        displayBitacoraEntries(bitacoraEntries);
+        renderLoadMore(container, bitacoraCursor, () => loadBitacoraEntries(true));
 
     } catch (error) {
         showToast('Error cargando entradas', 'error');
-        document.getElementById('bitacoraList').innerHTML =
+        container.innerHTML =
             '<p class="text-red-500 text-center py-8">Error cargando entradas</p>';
+        renderLoadMore(container, null);
     } finally {
         hideLoading();
     }
@@ -1418,12 +1586,10 @@ async function loadSystemStats() {
         showLoading('Cargando estadísticas...');
 
         // Get all jokes
-        const jokesResponse = await apiRequest('/api/jokes/');
-        const jokes = jokesResponse.data || [];
+        const jokes = await fetchAllPages('/api/jokes/?fields=calificacion');
 
         // Get all análisis
-        const analisisResponse = await apiRequest('/api/analisis-chistes/');
-        const analisis = analisisResponse.data || [];
+        const analisis = await fetchAllPages('/api/analisis-chistes/?fields=id');
 
         // Calculate stats
         const totalJokes = jokes.filter(j => !j.eliminado).length;
@@ -0,0 +1,109 @@
+"""
+Entrena el clasificador local de tags con las asignaciones de chistes_tags
+
+Evalúa primero sobre una parte de los chistes que el modelo no ve (precisión,
+recall y F1 por tag, acierto por categoría y cobertura al umbral de
+confianza), después entrena con todos y guarda el modelo en
+TAG_CLASSIFIER_PATH. Los workers lo recargan solos al cambiar el fichero.
+
+Uso:
+    python train_tag_classifier.py                 # evaluar, entrenar y guardar
+    python train_tag_classifier.py --report-only   # solo el informe de validación
+    python train_tag_classifier.py --holdout 0.3 --min-examples 5 --json report.json
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+root_dir = Path(__file__).parent
+sys.path.insert(0, str(root_dir))
+
+from src.config import config
+from src.services.tag_classifier import (
+    TAG_CATEGORIES, TagClassifier, evaluate, load_training_data, split, trainable_labels
+)
+
+
+def print_report(report: dict):
+    micro = report['micro']
+    print(f"Ejemplos de validación: {report['examples']}")
+    print(f"Micro  P/R/F1: {micro['precision']:.3f} / {micro['recall']:.3f} / {micro['f1']:.3f}")
+    print(f"Macro F1:      {report['macro_f1']:.3f}")
+    print()
+    print("Acierto del tag más probable por categoría:")
+    for category in TAG_CATEGORIES:
+        value = report['top1_accuracy'][category]
+        print(f"  {category:<10} {'-' if value is None else f'{value:.3f}'}")
+    print()
+    covered = report['covered_micro']
+    print(f"Cobertura con confianza >= {report['threshold']}: {report['coverage']:.1%} "
+          f"de los chistes (micro F1 {covered['f1']:.3f}); el resto iría a Gemini")
+    print()
+    print(f"{'Tag':<28} {'P':>6} {'R':>6} {'F1':>6} {'n':>5}")
+    print("-" * 55)
+    for label, metrics in sorted(report['per_label'].items()):
+        print(f"{label:<28} {metrics['precision']:>6.3f} {metrics['recall']:>6.3f} "
+              f"{metrics['f1']:>6.3f} {metrics['support']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el clasificador local de tags")
+    parser.add_argument('--holdout', type=float, default=0.2, help='Fracción para validación')
+    parser.add_argument('--min-examples', type=int, default=3,
+                        help='Chistes mínimos por tag para aprenderlo')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--dim', type=int, default=config.TAG_CLASSIFIER_DIM)
+    parser.add_argument('--threshold', type=float, default=config.TAG_CLASSIFIER_THRESHOLD)
+    parser.add_argument('--output', default=config.TAG_CLASSIFIER_PATH)
+    parser.add_argument('--report-only', action='store_true', help='No guardar el modelo')
+    parser.add_argument('--json', help='Guardar también el informe en este fichero')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("CLASIFICADOR DE TAGS - MÉTODO COMEDIA")
+    print("=" * 60)
+    print()
+
+    texts, label_sets, vocabulary = load_training_data()
+    labels = trainable_labels(label_sets, args.min_examples)
+    print(f"✅ {len(texts)} chistes con tags, {len(labels)}/{len(vocabulary)} tags "
+          f"con al menos {args.min_examples} ejemplos")
+
+    if not labels or len(texts) < 10:
+        print("❌ No hay datos suficientes: asigna tags a más chistes "
+              "(o acepta sugerencias con /api/ai/tags/accept)")
+        return False
+
+    report = None
+    if args.holdout > 0:
+        (train_texts, train_labels), (test_texts, test_labels) = split(texts, label_sets, args.holdout)
+        model = TagClassifier(labels, dim=args.dim).fit(train_texts, train_labels, epochs=args.epochs)
+        report = evaluate(model, test_texts, test_labels, args.threshold)
+        print()
+        print_report(report)
+
+    if args.json and report:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.report_only:
+        return True
+
+    metadata = {
+        'trained_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'examples': len(texts),
+        'validation': {key: report[key] for key in ('micro', 'macro_f1', 'coverage')}
+        if report else None,
+    }
+    model = TagClassifier(labels, dim=args.dim, metadata=metadata)
+    model.fit(texts, label_sets, epochs=args.epochs)
+    model.save(args.output)
+    print()
+    print(f"💾 Modelo guardado en {args.output}")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)